@@ -9,6 +9,9 @@
 import os
 import tempfile
 import logging
+import uuid
+from itertools import chain
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from typing import List, Dict, Any, Optional, Union
 from io import BytesIO
 from contextlib import contextmanager
@@ -18,6 +21,8 @@ from docx.table import Table
 from docx.shared import Inches, Pt, RGBColor, Cm
 from docx.enum.table import WD_TABLE_ALIGNMENT
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.enum.style import WD_STYLE_TYPE
+from docx.text.paragraph import Paragraph
 from docx.oxml.shared import OxmlElement, qn
 from docx.oxml.ns import nsdecls
 from docx.oxml import parse_xml
@@ -29,10 +34,30 @@ from .template_engine import DocumentTemplateEngine, TemplateRenderer
 from .ai_interface import AISmartInterface
 from .image_processor import ImageProcessor
 from .font_processor import FontProcessor
-from .oss_processor import OSSProcessor
+from .oss_processor import OSSProcessor, oss_boundary
 
 logger = logging.getLogger(__name__)
 
+# 上传结果缓存的最大条目数
+UPLOAD_CACHE_MAXSIZE = 32
+
+# 保留的未取走的后台上传结果数，超出时丢弃最早完成的
+UPLOAD_RESULTS_MAXSIZE = 128
+
+# 后台OSS上传线程池
+_UPLOAD_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="oss-upload")
+
+# smart_execute 失败时的消息前缀
+EXECUTE_FAILED_PREFIX = "执行失败: "
+
+# 对齐方式映射
+ALIGNMENT_MAP = {
+    "left": WD_PARAGRAPH_ALIGNMENT.LEFT,
+    "center": WD_PARAGRAPH_ALIGNMENT.CENTER,
+    "right": WD_PARAGRAPH_ALIGNMENT.RIGHT,
+    "justify": WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+}
+
 class EnhancedDocxProcessor:
     """
     增强版DOCX处理器
@@ -46,6 +71,14 @@ class EnhancedDocxProcessor:
         self.image_processor = ImageProcessor()
         self.font_processor = FontProcessor()
         self.oss_processor = OSSProcessor()
+        # 预先绑定高频调用的OSS方法，省去每次调用时的属性查找
+        self._oss_list = self.oss_processor.list_oss_files
+        self._oss_delete = self.oss_processor.delete_oss_file
+        self._oss_download = self.oss_processor.download_file_from_oss
+        self._oss_download_url = self.oss_processor.download_file_from_url
+        self._pending_uploads: Dict[str, Future] = {}
+        # (文件路径, 修改时间, 大小, 自定义文件名, 是否按内容命名) -> 上传结果
+        self._upload_cache: Dict[tuple, Dict[str, Any]] = {}
         
         # 新增智能组件
         self.intelligent_state_manager = IntelligentStateManager()
@@ -63,6 +96,13 @@ class EnhancedDocxProcessor:
             ]
         )
     
+    def _get_document_for_edit(self):
+        """获取用于修改的当前文档，并标记文档有未保存的修改"""
+        document = self.state_manager.get_current_document()
+        if document:
+            self.state_manager.mark_dirty()
+        return document
+    
     # ==================== 文档生命周期管理 ====================
     
     def create_document(self, file_path: str) -> str:
@@ -71,6 +111,7 @@ class EnhancedDocxProcessor:
             document = Document()
             self.state_manager.set_current_document(file_path, document)
             document.save(file_path)
+            self.state_manager.mark_clean()
             logger.info(f"Document created: {file_path}")
             return f"文档创建成功: {file_path}"
         except Exception as e:
@@ -164,7 +205,7 @@ class EnhancedDocxProcessor:
     ) -> str:
         """添加段落"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -186,15 +227,8 @@ class EnhancedDocxProcessor:
                 )
             
             # 设置对齐
-            if alignment:
-                alignment_map = {
-                    "left": WD_PARAGRAPH_ALIGNMENT.LEFT,
-                    "center": WD_PARAGRAPH_ALIGNMENT.CENTER,
-                    "right": WD_PARAGRAPH_ALIGNMENT.RIGHT,
-                    "justify": WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-                }
-                if alignment in alignment_map:
-                    paragraph.alignment = alignment_map[alignment]
+            if alignment in ALIGNMENT_MAP:
+                paragraph.alignment = ALIGNMENT_MAP[alignment]
             
             return "段落添加成功"
         except Exception as e:
@@ -204,7 +238,7 @@ class EnhancedDocxProcessor:
     def add_heading(self, text: str, level: int) -> str:
         """添加标题"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -220,7 +254,7 @@ class EnhancedDocxProcessor:
     def add_page_break(self) -> str:
         """添加分页符"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -233,7 +267,7 @@ class EnhancedDocxProcessor:
     def delete_paragraph(self, paragraph_index: int) -> str:
         """删除段落"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -254,7 +288,7 @@ class EnhancedDocxProcessor:
     def add_table(self, rows: int, cols: int, data: Optional[List[List[str]]] = None) -> str:
         """添加表格"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -282,7 +316,7 @@ class EnhancedDocxProcessor:
         :param row_index: 插入位置，None表示在末尾添加，0表示在开头插入，1表示在第1行和第2行之间插入
         """
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -361,7 +395,7 @@ class EnhancedDocxProcessor:
     def delete_table_row(self, table_index: int, row_index: int) -> str:
         """删除表格行"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -384,7 +418,7 @@ class EnhancedDocxProcessor:
     def add_table_column(self, table_index: int, column_index: Optional[int] = None, data: Optional[List[str]] = None) -> str:
         """添加表格列"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -437,7 +471,7 @@ class EnhancedDocxProcessor:
     def delete_table_column(self, table_index: int, column_index: int) -> str:
         """删除表格列"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -463,7 +497,7 @@ class EnhancedDocxProcessor:
     def edit_table_cell(self, table_index: int, row_index: int, col_index: int, text: str) -> str:
         """编辑表格单元格"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -495,7 +529,7 @@ class EnhancedDocxProcessor:
     ) -> str:
         """合并表格单元格"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -554,7 +588,7 @@ class EnhancedDocxProcessor:
     def find_and_replace(self, find_text: str, replace_text: str) -> str:
         """查找并替换文本"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -587,7 +621,7 @@ class EnhancedDocxProcessor:
     def add_image(self, image_path: str, width: Optional[str] = None, height: Optional[str] = None, 
                   alignment: str = "left", paragraph_index: Optional[int] = None) -> str:
         """添加图片"""
-        document = self.state_manager.get_current_document()
+        document = self._get_document_for_edit()
         if not document:
             return "没有打开的文档"
         
@@ -595,10 +629,18 @@ class EnhancedDocxProcessor:
             document, image_path, width, height, alignment, paragraph_index
         )
     
+    def add_images(self, entries: List[Dict[str, Any]]) -> str:
+        """批量添加图片"""
+        document = self._get_document_for_edit()
+        if not document:
+            return "没有打开的文档"
+        
+        return "\n".join(self.image_processor.add_images(document, entries))
+    
     def resize_image(self, image_index: int, width: Optional[str] = None, 
                      height: Optional[str] = None, maintain_aspect_ratio: bool = True) -> str:
         """调整图片大小"""
-        document = self.state_manager.get_current_document()
+        document = self._get_document_for_edit()
         if not document:
             return "没有打开的文档"
         
@@ -608,12 +650,20 @@ class EnhancedDocxProcessor:
     
     def delete_image(self, image_index: int) -> str:
         """删除图片"""
-        document = self.state_manager.get_current_document()
+        document = self._get_document_for_edit()
         if not document:
             return "没有打开的文档"
         
         return self.image_processor.delete_image(document, image_index)
     
+    def delete_images(self, image_indices: List[int]) -> str:
+        """批量删除图片"""
+        document = self._get_document_for_edit()
+        if not document:
+            return "没有打开的文档"
+        
+        return self.image_processor.delete_images(document, image_indices)
+    
     def list_images(self) -> str:
         """列出所有图片"""
         document = self.state_manager.get_current_document()
@@ -643,7 +693,7 @@ class EnhancedDocxProcessor:
                                      width: Optional[str] = None, height: Optional[str] = None,
                                      alignment: str = "left", paragraph_index: Optional[int] = None) -> str:
         """移动图片到另一个文档"""
-        source_document = self.state_manager.get_current_document()
+        source_document = self._get_document_for_edit()
         if not source_document:
             return "没有打开的源文档"
         
@@ -694,7 +744,7 @@ class EnhancedDocxProcessor:
                           italic: Optional[bool] = None, underline: Optional[bool] = None,
                           color: Optional[str] = None, alignment: Optional[str] = None) -> str:
         """设置段落字体"""
-        document = self.state_manager.get_current_document()
+        document = self._get_document_for_edit()
         if not document:
             return "没有打开的文档"
         
@@ -707,7 +757,7 @@ class EnhancedDocxProcessor:
                            bold: Optional[bool] = None, italic: Optional[bool] = None,
                            underline: Optional[bool] = None, color: Optional[str] = None) -> str:
         """设置文本范围字体"""
-        document = self.state_manager.get_current_document()
+        document = self._get_document_for_edit()
         if not document:
             return "没有打开的文档"
         
@@ -729,7 +779,7 @@ class EnhancedDocxProcessor:
                         left: Optional[float] = None, right: Optional[float] = None) -> str:
         """设置页边距"""
         try:
-            document = self.state_manager.get_current_document()
+            document = self._get_document_for_edit()
             if not document:
                 return "没有打开的文档"
             
@@ -756,6 +806,8 @@ class EnhancedDocxProcessor:
         """文档上下文管理器，确保文档正确打开和关闭"""
         original_doc = self.state_manager.get_current_document()
         original_path = self.state_manager.get_current_file_path()
+        # 恢复时保留原文档未保存的修改标记，否则之后的上传会跳过保存
+        original_sync_state = self.state_manager.get_sync_state()
         
         try:
             if create_if_not_exists and not os.path.exists(file_path):
@@ -767,7 +819,7 @@ class EnhancedDocxProcessor:
         finally:
             # 恢复原始状态
             if original_doc and original_path:
-                self.state_manager.set_current_document(original_path, original_doc)
+                self.state_manager.set_current_document(original_path, original_doc, original_sync_state)
             else:
                 self.state_manager.clear_state()
     
@@ -787,47 +839,148 @@ class EnhancedDocxProcessor:
     
     # ==================== OSS云存储功能 ====================
     
-    def upload_current_document_to_oss(self, custom_filename: str = None) -> Dict[str, Any]:
-        """上传当前文档到OSS"""
-        try:
-            if not self.state_manager.has_current_document():
-                return {"error": "没有打开的文档"}
-            
-            file_path = self.state_manager.get_current_file_path()
-            if not file_path:
-                return {"error": "当前文档未保存，请先保存文档"}
-            
-            # 先保存文档
+    @oss_boundary("Failed to upload current document to OSS", "上传当前文档失败")
+    def upload_current_document_to_oss(self, custom_filename: str = None,
+                                       preserialized: Optional[bytes] = None,
+                                       content_addressed: bool = False) -> Dict[str, Any]:
+        """
+        上传当前文档到OSS
+        :param custom_filename: 自定义OSS文件名
+        :param preserialized: 已序列化好的文档字节，提供时直接上传，不再重复保存
+        :param content_addressed: 按内容SHA256命名，OSS中已有相同内容时跳过上传
+        """
+        if not self.state_manager.has_current_document():
+            return {"error": "没有打开的文档"}
+        
+        file_path = self.state_manager.get_current_file_path()
+        if not file_path:
+            return {"error": "当前文档未保存，请先保存文档"}
+        
+        if preserialized is not None:
+            return self.oss_processor.upload_bytes_to_oss(preserialized, custom_filename)
+        
+        # 文档未修改且磁盘文件未被改动时直接上传现有文件，不再重新保存
+        if not self.state_manager.is_in_sync_with_disk():
             self.save_document()
-            
-            return self.oss_processor.upload_file_to_oss(file_path, custom_filename)
-        except Exception as e:
-            logger.error(f"Failed to upload current document to OSS: {e}")
-            return {"error": f"上传当前文档失败: {str(e)}"}
+        
+        # 文件未变化时直接返回上一次的上传结果，不再重复上传
+        stat = os.stat(file_path)
+        cache_key = (file_path, stat.st_mtime_ns, stat.st_size, custom_filename, content_addressed)
+        cached = self._upload_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
+        result = self.oss_processor.upload_file_to_oss(file_path, custom_filename, content_addressed)
+        if result.get("success"):
+            if len(self._upload_cache) >= UPLOAD_CACHE_MAXSIZE:
+                self._upload_cache.pop(next(iter(self._upload_cache)))
+            self._upload_cache[cache_key] = result
+        
+        return result
     
-    def upload_file_to_oss(self, file_path: str, custom_filename: str = None) -> Dict[str, Any]:
+    @oss_boundary("Failed to submit document upload to OSS", "提交上传任务失败")
+    def upload_current_document_to_oss_async(self, custom_filename: str = None) -> Dict[str, Any]:
+        """
+        在后台上传当前文档到OSS，立即返回预先确定的文件名和访问链接
+        上传结果通过 wait_for_upload 获取
+        """
+        if not self.state_manager.has_current_document():
+            return {"error": "没有打开的文档"}
+        
+        if not self.state_manager.get_current_file_path():
+            return {"error": "当前文档未保存，请先保存文档"}
+        
+        document_bytes = self._serialize_current_document()
+        filename = custom_filename or self.oss_processor.generate_filename()
+        
+        self._discard_unclaimed_uploads()
+        upload_id = uuid.uuid4().hex
+        self._pending_uploads[upload_id] = _UPLOAD_POOL.submit(
+            self.oss_processor.upload_bytes_to_oss, document_bytes, filename
+        )
+        
+        return {
+            "success": True,
+            "upload_id": upload_id,
+            "filename": filename,
+            "download_url": self.oss_processor.get_download_url(filename),
+            "message": "文档已提交后台上传，可通过 wait_for_upload 获取上传结果"
+        }
+    
+    def _discard_unclaimed_uploads(self):
+        """已完成但一直未通过 wait_for_upload 取走的结果超过上限时，丢弃最早提交的"""
+        finished = [uid for uid, future in self._pending_uploads.items() if future.done()]
+        for uid in finished[:len(finished) - UPLOAD_RESULTS_MAXSIZE + 1]:
+            del self._pending_uploads[uid]
+    
+    def wait_for_upload(self, upload_id: Optional[str] = None,
+                        timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        获取后台上传结果
+        :param upload_id: 上传任务ID，None表示收集所有已提交任务的结果
+        :param timeout: 最长等待秒数，None表示一直等待
+        """
+        if upload_id is not None:
+            future = self._pending_uploads.get(upload_id)
+            if future is None:
+                return {"error": f"上传任务不存在: {upload_id}"}
+            upload_ids = [upload_id]
+        else:
+            upload_ids = list(self._pending_uploads)
+        
+        futures = [self._pending_uploads[uid] for uid in upload_ids]
+        wait(futures, timeout=timeout)
+        
+        results = {}
+        pending = []
+        for uid, future in zip(upload_ids, futures):
+            if not future.done():
+                pending.append(uid)
+                continue
+            del self._pending_uploads[uid]
+            try:
+                results[uid] = future.result()
+            except Exception as e:
+                logger.error(f"Background upload to OSS failed: {e}")
+                results[uid] = {"error": f"后台上传失败: {str(e)}"}
+        
+        if upload_id is not None and not pending:
+            return results[upload_id]
+        
+        return {
+            "success": not pending,
+            "results": results,
+            "pending": pending
+        }
+    
+    def _serialize_current_document(self) -> bytes:
+        """将当前文档序列化一次，写入本地文件并返回同一份字节"""
+        with self.state_manager.batch() as document:
+            buffer = BytesIO()
+            document.save(buffer)
+            document_bytes = buffer.getvalue()
+            
+            with open(self.state_manager.get_current_file_path(), 'wb') as f:
+                f.write(document_bytes)
+            self.state_manager.mark_clean()
+        
+        return document_bytes
+    
+    @oss_boundary("Failed to upload file to OSS", "上传文件失败")
+    def upload_file_to_oss(self, file_path: str, custom_filename: str = None,
+                           content_addressed: bool = False) -> Dict[str, Any]:
         """上传指定文件到OSS"""
-        try:
-            return self.oss_processor.upload_file_to_oss(file_path, custom_filename)
-        except Exception as e:
-            logger.error(f"Failed to upload file to OSS: {e}")
-            return {"error": f"上传文件失败: {str(e)}"}
+        return self.oss_processor.upload_file_to_oss(file_path, custom_filename, content_addressed)
     
+    @oss_boundary("Failed to download file from OSS", "从OSS下载文件失败")
     def download_file_from_oss(self, filename: str, local_path: str = None) -> Dict[str, Any]:
         """从OSS下载文件"""
-        try:
-            return self.oss_processor.download_file_from_oss(filename, local_path)
-        except Exception as e:
-            logger.error(f"Failed to download file from OSS: {e}")
-            return {"error": f"从OSS下载文件失败: {str(e)}"}
+        return self._oss_download(filename, local_path)
     
+    @oss_boundary("Failed to download file from URL", "从URL下载文件失败")
     def download_file_from_url(self, url: str, local_path: str = None) -> Dict[str, Any]:
         """从网络URL下载文件"""
-        try:
-            return self.oss_processor.download_file_from_url(url, local_path)
-        except Exception as e:
-            logger.error(f"Failed to download file from URL: {e}")
-            return {"error": f"从URL下载文件失败: {str(e)}"}
+        return self._oss_download_url(url, local_path)
     
     def open_document_from_url(self, url: str) -> str:
         """从网络URL下载并打开文档"""
@@ -843,45 +996,96 @@ class EnhancedDocxProcessor:
             logger.error(f"Failed to open document from URL: {e}")
             return f"从URL打开文档失败: {str(e)}"
     
-    def list_oss_files(self, prefix: str = "", max_keys: int = 100) -> Dict[str, Any]:
+    @oss_boundary("Failed to list OSS files", "列出OSS文件失败")
+    def list_oss_files(self, prefix: str = "", max_keys: int = 100, use_cache: bool = True,
+                       fetch_metadata: bool = False,
+                       continuation_token: Optional[str] = None) -> Dict[str, Any]:
         """列出OSS中的文件"""
-        try:
-            return self.oss_processor.list_oss_files(prefix, max_keys)
-        except Exception as e:
-            logger.error(f"Failed to list OSS files: {e}")
-            return {"error": f"列出OSS文件失败: {str(e)}"}
+        return self._oss_list(prefix, max_keys, use_cache, fetch_metadata, continuation_token)
     
+    @oss_boundary("Failed to delete OSS file", "删除OSS文件失败")
     def delete_oss_file(self, filename: str) -> Dict[str, Any]:
         """删除OSS中的文件"""
-        try:
-            return self.oss_processor.delete_oss_file(filename)
-        except Exception as e:
-            logger.error(f"Failed to delete OSS file: {e}")
-            return {"error": f"删除OSS文件失败: {str(e)}"}
+        result = self._oss_delete(filename)
+        if result.get("success"):
+            self._invalidate_upload_cache([filename])
+        return result
     
+    def _apply_modifications(self, document: Document, modifications: List[Dict[str, Any]]):
+        """
+        批量应用段落/标题修改
+        先构建全部段落元素，再一次性插入到正文末尾（sectPr之前），
+        结果与逐个调用 add_paragraph / add_heading 相同
+        """
+        body = document.element.body
+        heading_style_ids = {}
+        new_paragraphs = []
+        
+        for modification in modifications:
+            modification_type = modification.get("type")
+            text = modification.get("text", "")
+            p = OxmlElement('w:p')
+            paragraph = Paragraph(p, document._body)
+            
+            if modification_type == "add_paragraph":
+                if text:
+                    run = paragraph.add_run(text)
+                    self.font_processor._apply_run_formatting(
+                        run, None, None, False, False, False, None
+                    )
+            elif modification_type == "add_heading":
+                level = modification.get("level", 1)
+                if level < 1 or level > 9:
+                    continue
+                if text:
+                    paragraph.add_run(text)
+                if level not in heading_style_ids:
+                    try:
+                        heading_style_ids[level] = document.part.get_style_id(
+                            f"Heading {level}", WD_STYLE_TYPE.PARAGRAPH
+                        )
+                    except KeyError:
+                        heading_style_ids[level] = None
+                p.style = heading_style_ids[level]
+            else:
+                continue
+            
+            new_paragraphs.append(p)
+        
+        sect_pr = body.sectPr
+        insert_index = body.index(sect_pr) if sect_pr is not None else len(body)
+        body[insert_index:insert_index] = new_paragraphs
+    
+    @oss_boundary("Failed to delete OSS files", "批量删除OSS文件失败")
+    def delete_oss_files(self, filenames: List[str]) -> Dict[str, Any]:
+        """批量删除OSS中的文件"""
+        result = self.oss_processor.delete_oss_files(filenames)
+        self._invalidate_upload_cache(result.get("deleted", []))
+        return result
+    
+    def _invalidate_upload_cache(self, filenames: List[str]):
+        """移除指向已删除OSS文件的上传结果缓存"""
+        removed = set(filenames)
+        for key in [k for k, v in self._upload_cache.items() if v.get("filename") in removed]:
+            del self._upload_cache[key]
+    
+    @oss_boundary("Failed to process document with OSS upload", "处理文档并上传失败")
     def process_document_with_oss_upload(self, modifications: List[Dict[str, Any]]) -> Dict[str, Any]:
         """处理文档并上传到OSS"""
-        try:
-            if not self.state_manager.has_current_document():
-                return {"error": "没有打开的文档"}
-            
+        if not self.state_manager.has_current_document():
+            return {"error": "没有打开的文档"}
+        
+        with self.state_manager.batch():
             # 应用修改（这里简化处理，实际可以根据需要实现更复杂的修改逻辑）
-            for modification in modifications:
-                if modification.get("type") == "add_paragraph":
-                    self.add_paragraph(modification.get("text", ""))
-                elif modification.get("type") == "add_heading":
-                    self.add_heading(modification.get("text", ""), modification.get("level", 1))
+            self._apply_modifications(self._get_document_for_edit(), modifications)
             
-            # 保存文档
-            self.save_document()
-            
-            # 上传到OSS
-            upload_result = self.upload_current_document_to_oss()
-            
-            return upload_result
-        except Exception as e:
-            logger.error(f"Failed to process document with OSS upload: {e}")
-            return {"error": f"处理文档并上传失败: {str(e)}"}
+            # 只序列化一次，同一份字节既写入本地文件又上传到OSS
+            document_bytes = self._serialize_current_document()
+        
+        # 上传到OSS
+        upload_result = self.upload_current_document_to_oss(preserialized=document_bytes)
+        
+        return upload_result
     
     # ==================== AI智能接口方法 ====================
     
@@ -889,6 +1093,7 @@ class EnhancedDocxProcessor:
         """智能执行 - AI友好的主要接口"""
         try:
             result = self.ai_interface.smart_execute(user_intent, context)
+            suggestions = result.suggestions
             
             if result.success:
                 # 如果建议了具体操作，执行状态转换
@@ -896,9 +1101,9 @@ class EnhancedDocxProcessor:
                     operation = result.data["suggested_operation"]
                     self.intelligent_state_manager.execute_state_transition(operation)
                 
-                return result.message + "\n" + "\n".join([f"- {s}" for s in result.suggestions])
+                return result.message + "\n" + "\n".join(f"- {s}" for s in suggestions)
             else:
-                return f"执行失败: {result.message}\n建议: " + "\n".join([f"- {s}" for s in result.suggestions])
+                return f"{EXECUTE_FAILED_PREFIX}{result.message}\n建议: " + "\n".join(f"- {s}" for s in suggestions)
                 
         except Exception as e:
             logger.error(f"Smart execute failed: {e}")
@@ -912,15 +1117,16 @@ class EnhancedDocxProcessor:
             if not suggestions:
                 return "未找到合适的模板，请尝试更具体的描述"
             
-            result_lines = ["找到以下模板建议:"]
-            for i, suggestion in enumerate(suggestions[:3], 1):
-                result_lines.append(f"{i}. {suggestion.template_name}")
-                result_lines.append(f"   匹配度: {suggestion.match_score:.1%}")
-                result_lines.append(f"   原因: {suggestion.reason}")
-                result_lines.append(f"   预览: {suggestion.preview}")
-                result_lines.append("")
-            
-            return "\n".join(result_lines)
+            return "\n".join(chain(
+                ["找到以下模板建议:"],
+                (
+                    f"{i}. {suggestion.template_name}\n"
+                    f"   匹配度: {suggestion.match_score:.1%}\n"
+                    f"   原因: {suggestion.reason}\n"
+                    f"   预览: {suggestion.preview}\n"
+                    for i, suggestion in enumerate(suggestions[:3], 1)
+                )
+            ))
             
         except Exception as e:
             logger.error(f"Suggest template failed: {e}")
@@ -967,12 +1173,9 @@ class EnhancedDocxProcessor:
             
             # 渲染段落
             for section in document_structure["sections"]:
-                if section["section_type"] == "paragraph":
-                    self._render_paragraph_from_template(document, section)
-                elif section["section_type"] == "heading":
-                    self._render_heading_from_template(document, section)
-                elif section["section_type"] == "table":
-                    self._render_table_from_template(document, section)
+                renderer = self._RENDERERS.get(section["section_type"])
+                if renderer:
+                    renderer(self, document, section)
             
             # 保存文档
             document.save(output_path)
@@ -993,15 +1196,9 @@ class EnhancedDocxProcessor:
         paragraph = document.add_paragraph(content["text"])
         
         # 设置对齐
-        if "alignment" in content:
-            alignment_map = {
-                "left": WD_PARAGRAPH_ALIGNMENT.LEFT,
-                "center": WD_PARAGRAPH_ALIGNMENT.CENTER,
-                "right": WD_PARAGRAPH_ALIGNMENT.RIGHT,
-                "justify": WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-            }
-            if content["alignment"] in alignment_map:
-                paragraph.alignment = alignment_map[content["alignment"]]
+        alignment = content.get("alignment")
+        if alignment in ALIGNMENT_MAP:
+            paragraph.alignment = ALIGNMENT_MAP[alignment]
         
         # 设置字体
         if paragraph.runs:
@@ -1026,20 +1223,29 @@ class EnhancedDocxProcessor:
         table = document.add_table(rows=rows, cols=cols, style=content.get("style", "Table Grid"))
         
         # 填充表头数据
+        # 新建表格每个单元格只有一个空段落，直接在其XML中写入run，
+        # 避免 cell.text 清空重建段落以及逐run设置加粗
         if "data" in content and content["data"]:
+            tr_lst = table._tbl.tr_lst
             for row_data in content["data"]:
-                if row_data["row"] < len(table.rows):
-                    row = table.rows[row_data["row"]]
-                    for i, cell_data in enumerate(row_data["cells"]):
-                        if i < len(row.cells):
-                            cell = row.cells[i]
-                            cell.text = cell_data["text"]
-                            
-                            # 设置单元格格式
-                            if "bold" in cell_data and cell_data["bold"]:
-                                for paragraph in cell.paragraphs:
-                                    for run in paragraph.runs:
-                                        run.bold = True
+                if row_data["row"] < len(tr_lst):
+                    tc_lst = tr_lst[row_data["row"]].tc_lst
+                    for tc, cell_data in zip(tc_lst, row_data["cells"]):
+                        p = tc.p_lst[0]
+                        p.clear_content()
+                        r = p.add_r()
+                        r.text = cell_data["text"]
+                        
+                        # 设置单元格格式
+                        if cell_data.get("bold"):
+                            r.get_or_add_rPr().get_or_add_b()
+    
+    # 模板区块类型 -> 渲染方法
+    _RENDERERS = {
+        "paragraph": _render_paragraph_from_template,
+        "heading": _render_heading_from_template,
+        "table": _render_table_from_template
+    }
     
     def get_available_templates(self, category: str = None) -> str:
         """获取可用模板列表"""
@@ -1049,14 +1255,15 @@ class EnhancedDocxProcessor:
             if not templates:
                 return "未找到可用模板"
             
-            result_lines = ["可用模板列表:"]
-            for template in templates:
-                result_lines.append(f"- {template.metadata.name} ({template.metadata.id})")
-                result_lines.append(f"  分类: {template.metadata.category}")
-                result_lines.append(f"  描述: {template.metadata.description}")
-                result_lines.append("")
-            
-            return "\n".join(result_lines)
+            return "\n".join(chain(
+                ["可用模板列表:"],
+                (
+                    f"- {template.metadata.name} ({template.metadata.id})\n"
+                    f"  分类: {template.metadata.category}\n"
+                    f"  描述: {template.metadata.description}\n"
+                    for template in templates
+                )
+            ))
             
         except Exception as e:
             logger.error(f"Get available templates failed: {e}")
@@ -1068,19 +1275,19 @@ class EnhancedDocxProcessor:
             state_summary = self.intelligent_state_manager.get_current_state_summary()
             stats = self.intelligent_state_manager.get_operation_statistics()
             
-            result_lines = ["当前状态信息:"]
-            result_lines.append(f"全局状态: {state_summary['global']}")
-            result_lines.append(f"内容编辑状态: {state_summary['content']}")
-            result_lines.append(f"表格操作状态: {state_summary['table']}")
-            result_lines.append(f"图片处理状态: {state_summary['image']}")
-            result_lines.append(f"字体处理状态: {state_summary['font']}")
-            result_lines.append("")
-            result_lines.append("操作统计:")
-            result_lines.append(f"总操作数: {stats['total_operations']}")
-            result_lines.append(f"成功操作数: {stats['successful_operations']}")
-            result_lines.append(f"成功率: {stats['success_rate']:.1%}")
-            
-            return "\n".join(result_lines)
+            return (
+                "当前状态信息:\n"
+                f"全局状态: {state_summary['global']}\n"
+                f"内容编辑状态: {state_summary['content']}\n"
+                f"表格操作状态: {state_summary['table']}\n"
+                f"图片处理状态: {state_summary['image']}\n"
+                f"字体处理状态: {state_summary['font']}\n"
+                "\n"
+                "操作统计:\n"
+                f"总操作数: {stats['total_operations']}\n"
+                f"成功操作数: {stats['successful_operations']}\n"
+                f"成功率: {stats['success_rate']:.1%}"
+            )
             
         except Exception as e:
             logger.error(f"Get current state info failed: {e}")
@@ -10,15 +10,156 @@ import os
 import json
 import pickle
 import logging
-from typing import Dict, List, Any, Optional, Union
+import itertools
+import threading
+import weakref
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, defaultdict, deque
+from typing import Deque, Dict, List, Any, Optional, Set, Union
 from dataclasses import dataclass, field, asdict
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from enum import Enum
 import hashlib
+from contextlib import contextmanager
+
+from . import json_utils
+
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# 操作日志文件名及写缓冲区大小
+OPERATIONS_LOG_FILE = "operations.ndjson"
+OPERATIONS_LOG_BUFFER_SIZE = 64 * 1024
+
+# 最大历史记录数
+MAX_HISTORY_SIZE = 1000
+
+# 计算文件哈希时的读缓冲区大小
+FILE_HASH_BUFFER_SIZE = 1 << 20
+
+# 快照压缩级别，以及连续增量快照的最大链长
+SNAPSHOT_COMPRESSION_LEVEL = 3
+SNAPSHOT_DELTA_CHAIN_MAX = 10
+
+# 快照摘要索引文件名
+SNAPSHOT_INDEX_FILE = "index.json"
+
+# 统计文档结构时用到的 WordprocessingML 命名空间
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_WP = "{http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing}"
+_PKG_RELS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+def _main_document_part(docx_zip: zipfile.ZipFile) -> str:
+    """从包关系中找到主文档部件，找不到时使用默认位置"""
+    try:
+        rels = ET.fromstring(docx_zip.read("_rels/.rels"))
+        for rel in rels.iter(f"{_PKG_RELS}Relationship"):
+            if rel.get("Type") == _OFFICE_DOCUMENT_REL:
+                return rel.get("Target").lstrip("/")
+    except KeyError:
+        pass
+    return "word/document.xml"
+
+def _count_document_structure(file_path: str) -> Dict[str, int]:
+    """
+    流式扫描主文档XML统计段落、表格、图片和节的数量，
+    口径与python-docx的 paragraphs/tables/inline_shapes/sections 一致
+    """
+    counts = {"paragraphs_count": 0, "tables_count": 0, "images_count": 0, "sections_count": 0}
+    body_child = [f"{_W}document", f"{_W}body"]
+    
+    with zipfile.ZipFile(file_path) as docx_zip:
+        with docx_zip.open(_main_document_part(docx_zip)) as f:
+            stack: List[str] = []
+            for event, elem in ET.iterparse(f, events=("start", "end")):
+                if event == "end":
+                    stack.pop()
+                    elem.clear()
+                    continue
+                
+                tag = elem.tag
+                if stack == body_child:
+                    # w:body 的直接子元素
+                    if tag == f"{_W}p":
+                        counts["paragraphs_count"] += 1
+                    elif tag == f"{_W}tbl":
+                        counts["tables_count"] += 1
+                    elif tag == f"{_W}sectPr":
+                        counts["sections_count"] += 1
+                elif tag == f"{_W}sectPr" and len(stack) == 4 and stack[2:] == [f"{_W}p", f"{_W}pPr"]:
+                    # 段落属性中的分节符
+                    counts["sections_count"] += 1
+                elif tag == f"{_WP}inline" and stack[-3:] == [f"{_W}p", f"{_W}r", f"{_W}drawing"]:
+                    counts["images_count"] += 1
+                stack.append(tag)
+    
+    return counts
+
+# ==================== 对象池 ====================
+
+class DictPool:
+    """可复用字典的对象池，减少序列化过程中临时字典的分配"""
+    
+    def __init__(self, max_size: int = 2 * MAX_HISTORY_SIZE):
+        self.max_size = max_size
+        self._free: List[Dict[str, Any]] = []
+    
+    def get(self) -> Dict[str, Any]:
+        """取出一个空字典"""
+        try:
+            return self._free.pop()
+        except IndexError:
+            return {}
+    
+    def put(self, d: Dict[str, Any]):
+        """清空字典并放回池中"""
+        d.clear()
+        if len(self._free) < self.max_size:
+            self._free.append(d)
+    
+    @contextmanager
+    def borrowing(self):
+        """提供借用函数，退出时归还所有借出的字典"""
+        borrowed = []
+        
+        def borrow() -> Dict[str, Any]:
+            d = self.get()
+            borrowed.append(d)
+            return d
+        
+        try:
+            yield borrow
+        finally:
+            for d in borrowed:
+                self.put(d)
+
+_DICT_POOL = DictPool()
+
+
+def _checksum_default(obj: Any) -> Any:
+    """快照校验和编码中标准库json无法处理的类型，其余对象转为字符串"""
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset, deque)):
+        return list(obj)
+    return str(obj)
+
 # ==================== 枚举定义 ====================
 
 class OperationType(Enum):
@@ -43,6 +184,10 @@ class OperationStatus(Enum):
     FAILED = "failed"
     CANCELLED = "cancelled"
 
+# 反序列化时按值查找枚举成员，避免逐条调用枚举构造
+_OPERATION_TYPES = {member.value: member for member in OperationType}
+_OPERATION_STATUSES = {member.value: member for member in OperationStatus}
+
 # ==================== 数据结构定义 ====================
 
 @dataclass
@@ -69,7 +214,7 @@ class DocumentState:
     content_hash: str
     structure_info: Dict[str, Any]
     metadata: Dict[str, Any] = field(default_factory=dict)
-    operation_history: List[str] = field(default_factory=list)  # 操作ID列表
+    operation_history: Deque[str] = field(default_factory=lambda: deque(maxlen=MAX_HISTORY_SIZE))  # 操作ID列表
 
 @dataclass
 class SessionState:
@@ -78,7 +223,7 @@ class SessionState:
     start_time: datetime
     last_activity: datetime
     current_document: Optional[str] = None
-    active_operations: List[str] = field(default_factory=list)
+    active_operations: Set[str] = field(default_factory=set)
     completed_operations: List[str] = field(default_factory=list)
     failed_operations: List[str] = field(default_factory=list)
     context: Dict[str, Any] = field(default_factory=dict)
@@ -93,6 +238,15 @@ class StateSnapshot:
     operation_records: Dict[str, OperationRecord]
     checksum: str
 
+@dataclass
+class SnapshotStub:
+    """尚未加载的快照摘要"""
+    snapshot_id: str
+    timestamp: datetime
+    checksum: str
+    documents_count: int
+    operations_count: int
+
 # ==================== 增强版状态管理器 ====================
 
 class EnhancedStateManager:
@@ -105,56 +259,174 @@ class EnhancedStateManager:
         # 状态存储
         self.current_session: Optional[SessionState] = None
         self.document_states: Dict[str, DocumentState] = {}
-        self.operation_records: Dict[str, OperationRecord] = {}
+        self.operation_records: "OrderedDict[str, OperationRecord]" = OrderedDict()
         self.state_snapshots: Dict[str, StateSnapshot] = {}
+        # 启动时只读取快照摘要，完整内容在需要时再加载
+        self._snapshot_stubs: Dict[str, SnapshotStub] = {}
+        
+        # 增量快照：快照ID -> 基准快照ID（完整快照为None）及链长
+        self._snapshot_bases: Dict[str, Optional[str]] = {}
+        self._snapshot_depths: Dict[str, int] = {}
+        # 最近一次写入的快照ID及其各操作记录的序列化结果
+        self._last_snapshot_id: Optional[str] = None
+        self._last_snapshot_records: Dict[str, bytes] = {}
+        
+        # 操作和快照ID：实例创建时格式化一次时间前缀，之后只递增序号
+        self._id_prefix = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        self._id_seq = itertools.count()
         
         # 配置
-        self.max_history_size = 1000  # 最大历史记录数
+        self.max_history_size = MAX_HISTORY_SIZE  # 最大历史记录数
         self.snapshot_interval = 300  # 快照间隔（秒）
         self.auto_save_interval = 60  # 自动保存间隔（秒）
         
+        # 操作记录的追加式日志（每行一条NDJSON记录）
+        self._ops_log_path = self.state_dir / OPERATIONS_LOG_FILE
+        self._ops_log = None
+        self._ops_log_lines = 0
+        
+        # 文件哈希和结构信息缓存：路径 -> ((修改时间, 大小), 结果)
+        self._file_hash_cache: Dict[str, tuple] = {}
+        self._structure_cache: Dict[str, tuple] = {}
+        
+        # 操作日志句柄在压缩时会被替换，与后台刷新线程共用时需要加锁
+        self._ops_log_lock = threading.Lock()
+        
+        # 状态变更只做标记，由后台线程每隔 auto_save_interval 合并写入一次
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        
+        # 写时复制：快照与当前状态共用同一个字典，修改前再复制
+        self._document_states_shared = False
+        self._operation_records_shared = False
+        
+        # 按操作类型划分的操作ID索引，同样按记录时间顺序存放
+        self._type_index: Dict[OperationType, "OrderedDict[str, None]"] = defaultdict(OrderedDict)
+        
         # 加载之前的状态
         self._load_persisted_state()
+        self._rebuild_type_index()
+        self._open_operations_log()
         
         # 创建新会话
         self._create_new_session()
         
+        # 线程只持有弱引用，不阻止管理器被回收
+        self._flusher = threading.Thread(
+            target=EnhancedStateManager._flush_loop,
+            args=(weakref.ref(self), self._stop),
+            name="state-flusher",
+            daemon=True
+        )
+        self._flusher.start()
+        
         logger.info("增强版状态管理器初始化完成")
     
+    @staticmethod
+    def _flush_loop(manager_ref, stop: threading.Event):
+        """后台刷新循环：每个间隔最多写入一次"""
+        while True:
+            manager = manager_ref()
+            if manager is None:
+                return
+            interval = manager.auto_save_interval
+            del manager
+            
+            if stop.wait(interval):
+                return
+            
+            manager = manager_ref()
+            if manager is None:
+                return
+            manager.flush()
+            del manager
+    
+    def flush(self):
+        """有未保存的变更时立即持久化"""
+        if self._dirty.is_set():
+            self._dirty.clear()
+            self._persist_state()
+    
+    def close(self):
+        """停止后台刷新线程并写入剩余的变更"""
+        self._stop.set()
+        self.flush()
+        with self._ops_log_lock:
+            if self._ops_log:
+                self._ops_log.close()
+                self._ops_log = None
+    
     def _load_persisted_state(self):
         """加载持久化的状态"""
         try:
             # 加载会话状态
             session_file = self.state_dir / "current_session.json"
             if session_file.exists():
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    session_data = json.load(f)
-                    self.current_session = self._deserialize_session(session_data)
+                session_data = json_utils.loads(session_file.read_bytes())
+                self.current_session = self._deserialize_session(session_data)
             
             # 加载文档状态
             docs_file = self.state_dir / "document_states.json"
             if docs_file.exists():
-                with open(docs_file, 'r', encoding='utf-8') as f:
-                    docs_data = json.load(f)
-                    for doc_id, doc_data in docs_data.items():
-                        self.document_states[doc_id] = self._deserialize_document_state(doc_data)
+                docs_data = json_utils.loads(docs_file.read_bytes())
+                for doc_id, doc_data in docs_data.items():
+                    self.document_states[doc_id] = self._deserialize_document_state(doc_data)
+            
+            # 加载操作记录（兼容旧版本的整文件JSON）
+            legacy_ops_file = self.state_dir / "operation_records.json"
+            if legacy_ops_file.exists():
+                ops_data = json_utils.loads(legacy_ops_file.read_bytes())
+                for op_id, op_data in ops_data.items():
+                    self.operation_records[op_id] = self._deserialize_operation_record(op_data)
+            
+            self._load_operations_log()
             
-            # 加载操作记录
-            ops_file = self.state_dir / "operation_records.json"
-            if ops_file.exists():
-                with open(ops_file, 'r', encoding='utf-8') as f:
-                    ops_data = json.load(f)
-                    for op_id, op_data in ops_data.items():
-                        self.operation_records[op_id] = self._deserialize_operation_record(op_data)
+            if legacy_ops_file.exists():
+                self.compact_log()
+                legacy_ops_file.unlink()
             
-            # 加载状态快照
+            # 加载状态快照：索引中有摘要的快照延迟加载，其余（旧版本写入的）立即解析
             snapshots_dir = self.state_dir / "snapshots"
             if snapshots_dir.exists():
-                for snapshot_file in snapshots_dir.glob("*.json"):
-                    with open(snapshot_file, 'r', encoding='utf-8') as f:
-                        snapshot_data = json.load(f)
-                        snapshot = self._deserialize_state_snapshot(snapshot_data)
-                        self.state_snapshots[snapshot.snapshot_id] = snapshot
+                index = self._read_snapshot_index()
+                raw_snapshots: Dict[str, Dict[str, Any]] = {}
+                for snapshot_file in snapshots_dir.iterdir():
+                    if not snapshot_file.name.endswith((".json", ".json.zst")):
+                        continue
+                    if snapshot_file.name == SNAPSHOT_INDEX_FILE:
+                        continue
+                    snapshot_id = snapshot_file.name.split(".json")[0]
+                    entry = index.get(snapshot_id)
+                    if entry:
+                        self._snapshot_stubs[snapshot_id] = SnapshotStub(
+                            snapshot_id=snapshot_id,
+                            timestamp=datetime.fromisoformat(entry["timestamp"]),
+                            checksum=entry["checksum"],
+                            documents_count=entry["documents_count"],
+                            operations_count=entry["operations_count"]
+                        )
+                        self._snapshot_bases[snapshot_id] = entry.get("base")
+                        continue
+                    snapshot_data = self._read_snapshot_file(snapshot_file)
+                    raw_snapshots[snapshot_data["snapshot_id"]] = snapshot_data
+                
+                # 还原时会用完整数据替换raw_snapshots中的增量数据，先记下各快照的基准
+                for snapshot_id, snapshot_data in raw_snapshots.items():
+                    delta = snapshot_data.get("operation_records_delta")
+                    self._snapshot_bases[snapshot_id] = delta["base"] if delta else None
+                
+                for snapshot_id in list(raw_snapshots):
+                    try:
+                        snapshot_data = self._resolve_snapshot_data(snapshot_id, raw_snapshots)
+                    except Exception as e:
+                        logger.warning(f"跳过无法还原的快照 {snapshot_id}: {e}")
+                        self._snapshot_bases.pop(snapshot_id, None)
+                        continue
+                    snapshot = self._deserialize_state_snapshot(snapshot_data)
+                    self.state_snapshots[snapshot.snapshot_id] = snapshot
+                
+                if raw_snapshots:
+                    self._write_snapshot_index()
             
             logger.info(f"加载了 {len(self.document_states)} 个文档状态和 {len(self.operation_records)} 个操作记录")
             
@@ -164,31 +436,39 @@ class EnhancedStateManager:
     def _create_new_session(self):
         """创建新会话"""
         if not self.current_session:
-            session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            now = datetime.now()
+            session_id = f"session_{now.strftime('%Y%m%d_%H%M%S')}"
             self.current_session = SessionState(
                 session_id=session_id,
-                start_time=datetime.now(),
-                last_activity=datetime.now()
+                start_time=now,
+                last_activity=now
             )
             logger.info(f"创建新会话: {session_id}")
     
     def record_operation(self, operation_type: OperationType, parameters: Dict[str, Any], 
                         context: Dict[str, Any] = None) -> str:
         """记录操作"""
-        operation_id = f"{operation_type.value}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        operation_id = f"{operation_type.value}_{self._id_prefix}_{next(self._id_seq)}"
+        now = datetime.now()
         
         operation = OperationRecord(
             operation_id=operation_id,
             operation_type=operation_type,
-            timestamp=datetime.now(),
+            timestamp=now,
             status=OperationStatus.PENDING,
             parameters=parameters,
             context=context or {}
         )
         
+        self._own_operation_records()
         self.operation_records[operation_id] = operation
-        self.current_session.active_operations.append(operation_id)
-        self.current_session.last_activity = datetime.now()
+        self.operation_records.move_to_end(operation_id)
+        self._type_index[operation_type][operation_id] = None
+        self._evict_old_operations()
+        self.current_session.active_operations.add(operation_id)
+        self.current_session.last_activity = now
+        self._append_operation_to_log(operation)
+        self._dirty.set()
         
         logger.info(f"记录操作: {operation_id} - {operation_type.value}")
         return operation_id
@@ -209,15 +489,15 @@ class EnhancedStateManager:
         
         # 更新会话状态
         if status == OperationStatus.COMPLETED:
-            if operation_id in self.current_session.active_operations:
-                self.current_session.active_operations.remove(operation_id)
+            self.current_session.active_operations.discard(operation_id)
             self.current_session.completed_operations.append(operation_id)
         elif status == OperationStatus.FAILED:
-            if operation_id in self.current_session.active_operations:
-                self.current_session.active_operations.remove(operation_id)
+            self.current_session.active_operations.discard(operation_id)
             self.current_session.failed_operations.append(operation_id)
         
         self.current_session.last_activity = datetime.now()
+        self._append_operation_to_log(operation)
+        self._dirty.set()
         
         logger.info(f"更新操作状态: {operation_id} - {status.value}")
     
@@ -227,61 +507,63 @@ class EnhancedStateManager:
             document_id = self._generate_document_id(file_path)
         
         # 创建或更新文档状态
+        now = datetime.now()
         if document_id not in self.document_states:
+            self._own_document_states()
             self.document_states[document_id] = DocumentState(
                 document_id=document_id,
                 file_path=file_path,
-                last_modified=datetime.now(),
+                last_modified=now,
                 content_hash=self._calculate_file_hash(file_path),
-                structure_info=self._analyze_document_structure(file_path)
+                structure_info=self._analyze_document_structure(file_path),
+                operation_history=deque(maxlen=self.max_history_size)
             )
         else:
             # 更新现有文档状态
             doc_state = self.document_states[document_id]
             doc_state.file_path = file_path
-            doc_state.last_modified = datetime.now()
+            doc_state.last_modified = now
             doc_state.content_hash = self._calculate_file_hash(file_path)
             doc_state.structure_info = self._analyze_document_structure(file_path)
         
         self.current_session.current_document = document_id
-        self.current_session.last_activity = datetime.now()
+        self.current_session.last_activity = now
+        self._dirty.set()
         
         logger.info(f"设置当前文档: {document_id} - {file_path}")
     
     def add_operation_to_document(self, document_id: str, operation_id: str):
         """将操作添加到文档历史"""
         if document_id in self.document_states:
+            # deque设置了maxlen，超出上限时自动丢弃最旧的记录
             self.document_states[document_id].operation_history.append(operation_id)
-            # 限制历史记录大小
-            if len(self.document_states[document_id].operation_history) > self.max_history_size:
-                self.document_states[document_id].operation_history = \
-                    self.document_states[document_id].operation_history[-self.max_history_size:]
+            self._dirty.set()
     
     def get_operation_history(self, document_id: str = None, operation_type: OperationType = None, 
                              limit: int = 50) -> List[OperationRecord]:
         """获取操作历史"""
-        operations = []
-        
+        # 操作记录和文档历史都按记录时间顺序存放，倒序遍历即为最新的在前，无需排序
         if document_id:
             # 获取特定文档的操作历史
-            if document_id in self.document_states:
-                operation_ids = self.document_states[document_id].operation_history
-                for op_id in operation_ids:
-                    if op_id in self.operation_records:
-                        operations.append(self.operation_records[op_id])
+            if document_id not in self.document_states:
+                return []
+            operation_ids = reversed(self.document_states[document_id].operation_history)
+        elif operation_type:
+            # 直接使用类型索引，不必扫描其他类型的记录
+            operation_ids = reversed(self._type_index.get(operation_type, {}))
         else:
             # 获取所有操作
-            operations = list(self.operation_records.values())
+            operation_ids = reversed(self.operation_records)
         
-        # 按操作类型过滤
-        if operation_type:
-            operations = [op for op in operations if op.operation_type == operation_type]
+        operations = (self.operation_records[op_id] for op_id in operation_ids
+                      if op_id in self.operation_records)
         
-        # 按时间排序（最新的在前）
-        operations.sort(key=lambda x: x.timestamp, reverse=True)
+        # 按操作类型过滤
+        if operation_type and document_id:
+            operations = (op for op in operations if op.operation_type == operation_type)
         
-        # 限制返回数量
-        return operations[:limit]
+        # 只取到所需数量即停止
+        return list(itertools.islice(operations, limit))
     
     def get_document_state(self, document_id: str) -> Optional[DocumentState]:
         """获取文档状态"""
@@ -306,16 +588,19 @@ class EnhancedStateManager:
     
     def create_state_snapshot(self, description: str = "") -> str:
         """创建状态快照"""
-        snapshot_id = f"snapshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        snapshot_id = f"snapshot_{self._id_prefix}_{next(self._id_seq)}"
         
         snapshot = StateSnapshot(
             snapshot_id=snapshot_id,
             timestamp=datetime.now(),
             session_state=self.current_session,
-            document_states=self.document_states.copy(),
-            operation_records=self.operation_records.copy(),
+            document_states=self.document_states,
+            operation_records=self.operation_records,
             checksum=""
         )
+        # 快照直接引用当前字典，之后第一次增删条目时才复制
+        self._document_states_shared = True
+        self._operation_records_shared = True
         
         # 计算校验和
         snapshot.checksum = self._calculate_snapshot_checksum(snapshot)
@@ -328,14 +613,27 @@ class EnhancedStateManager:
         logger.info(f"创建状态快照: {snapshot_id}")
         return snapshot_id
     
+    def get_snapshot(self, snapshot_id: str) -> Optional[StateSnapshot]:
+        """获取快照，尚未加载的快照在此时读取并解析"""
+        if snapshot_id in self.state_snapshots:
+            return self.state_snapshots[snapshot_id]
+        if snapshot_id not in self._snapshot_stubs:
+            return None
+        
+        snapshot_data = self._resolve_snapshot_data(snapshot_id, {})
+        snapshot = self._deserialize_state_snapshot(snapshot_data)
+        self.state_snapshots[snapshot_id] = snapshot
+        del self._snapshot_stubs[snapshot_id]
+        return snapshot
+    
     def restore_from_snapshot(self, snapshot_id: str) -> bool:
         """从快照恢复状态"""
-        if snapshot_id not in self.state_snapshots:
+        if snapshot_id not in self.state_snapshots and snapshot_id not in self._snapshot_stubs:
             logger.error(f"快照不存在: {snapshot_id}")
             return False
         
         try:
-            snapshot = self.state_snapshots[snapshot_id]
+            snapshot = self.get_snapshot(snapshot_id)
             
             # 验证校验和
             if not self._verify_snapshot_checksum(snapshot):
@@ -344,10 +642,14 @@ class EnhancedStateManager:
             
             # 恢复状态
             self.current_session = snapshot.session_state
-            self.document_states = snapshot.document_states.copy()
-            self.operation_records = snapshot.operation_records.copy()
+            self.document_states = snapshot.document_states
+            self.operation_records = snapshot.operation_records
+            self._document_states_shared = True
+            self._operation_records_shared = True
+            self._rebuild_type_index()
             
             # 保存恢复的状态
+            self.compact_log()
             self._persist_state()
             
             logger.info(f"从快照恢复状态成功: {snapshot_id}")
@@ -360,13 +662,13 @@ class EnhancedStateManager:
     def get_available_snapshots(self) -> List[Dict[str, Any]]:
         """获取可用的快照列表"""
         snapshots = []
-        for snapshot in self.state_snapshots.values():
+        for stub in self._snapshot_stubs_all():
             snapshots.append({
-                "snapshot_id": snapshot.snapshot_id,
-                "timestamp": snapshot.timestamp.isoformat(),
-                "checksum": snapshot.checksum,
-                "documents_count": len(snapshot.document_states),
-                "operations_count": len(snapshot.operation_records)
+                "snapshot_id": stub.snapshot_id,
+                "timestamp": stub.timestamp.isoformat(),
+                "checksum": stub.checksum,
+                "documents_count": stub.documents_count,
+                "operations_count": stub.operations_count
             })
         
         # 按时间排序（最新的在前）
@@ -377,25 +679,51 @@ class EnhancedStateManager:
         """清理旧数据"""
         cutoff_date = datetime.now() - timedelta(days=days_to_keep)
         
-        # 清理旧的操作记录
-        old_operations = [
-            op_id for op_id, op in self.operation_records.items()
-            if op.timestamp < cutoff_date
-        ]
+        # 清理旧的操作记录（按记录时间顺序存放，遇到第一条未过期的即可停止）
+        old_operations = []
+        for op_id, op in self.operation_records.items():
+            if op.timestamp >= cutoff_date:
+                break
+            old_operations.append(op_id)
+        if old_operations:
+            self._own_operation_records()
         for op_id in old_operations:
-            del self.operation_records[op_id]
+            op = self.operation_records.pop(op_id)
+            self._type_index[op.operation_type].pop(op_id, None)
+        if old_operations:
+            self.compact_log()
+            self._dirty.set()
         
         # 清理旧的快照
         old_snapshots = [
-            snap_id for snap_id, snap in self.state_snapshots.items()
-            if snap.timestamp < cutoff_date
+            stub.snapshot_id for stub in self._snapshot_stubs_all()
+            if stub.timestamp < cutoff_date
         ]
+        
+        # 基准快照将被删除的增量快照先改写为完整快照
+        removed = set(old_snapshots)
+        raw_snapshots: Dict[str, Dict[str, Any]] = {}
+        for snap_id, base_id in list(self._snapshot_bases.items()):
+            if base_id in removed and snap_id not in removed:
+                snapshot_data = self._resolve_snapshot_data(snap_id, raw_snapshots)
+                self._write_snapshot_data(snap_id, snapshot_data)
+                self._snapshot_bases[snap_id] = None
+                self._snapshot_depths[snap_id] = 0
+        
         for snap_id in old_snapshots:
-            del self.state_snapshots[snap_id]
+            self.state_snapshots.pop(snap_id, None)
+            self._snapshot_stubs.pop(snap_id, None)
+            self._snapshot_bases.pop(snap_id, None)
+            self._snapshot_depths.pop(snap_id, None)
+            if snap_id == self._last_snapshot_id:
+                self._last_snapshot_id = None
+                self._last_snapshot_records = {}
             # 删除快照文件
-            snapshot_file = self.state_dir / "snapshots" / f"{snap_id}.json"
-            if snapshot_file.exists():
+            snapshot_file = self._snapshot_path(snap_id)
+            if snapshot_file:
                 snapshot_file.unlink()
+        if old_snapshots:
+            self._write_snapshot_index()
         
         logger.info(f"清理了 {len(old_operations)} 个旧操作记录和 {len(old_snapshots)} 个旧快照")
     
@@ -403,87 +731,269 @@ class EnhancedStateManager:
         """生成文档ID"""
         return hashlib.md5(file_path.encode()).hexdigest()[:16]
     
+    def _file_stat_key(self, file_path: str) -> Optional[tuple]:
+        """获取文件的 (修改时间, 大小)，文件不存在时返回None"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
     def _calculate_file_hash(self, file_path: str) -> str:
-        """计算文件哈希值"""
-        if not os.path.exists(file_path):
+        """计算文件哈希值，文件未变化时直接返回缓存结果"""
+        stat_key = self._file_stat_key(file_path)
+        if stat_key is None:
             return ""
         
+        cached = self._file_hash_cache.get(file_path)
+        if cached and cached[0] == stat_key:
+            return cached[1]
+        
         try:
-            with open(file_path, 'rb') as f:
-                content = f.read()
-                return hashlib.md5(content).hexdigest()
+            with open(file_path, 'rb', buffering=FILE_HASH_BUFFER_SIZE) as f:
+                file_hash = self._digest_file(f).hexdigest()[:32]
         except Exception:
             return ""
+        
+        self._file_hash_cache[file_path] = (stat_key, file_hash)
+        return file_hash
+    
+    def _digest_file(self, f):
+        """分块读取文件并计算摘要，有blake3时优先使用"""
+        hasher = blake3.blake3() if BLAKE3_AVAILABLE else hashlib.blake2b()
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, lambda: hasher)
+        
+        buffer = bytearray(FILE_HASH_BUFFER_SIZE)
+        view = memoryview(buffer)
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            hasher.update(view[:size])
+        return hasher
     
     def _analyze_document_structure(self, file_path: str) -> Dict[str, Any]:
-        """分析文档结构"""
-        if not os.path.exists(file_path):
+        """分析文档结构，文件未变化时直接返回缓存结果"""
+        stat_key = self._file_stat_key(file_path)
+        if stat_key is None:
             return {}
         
+        cached = self._structure_cache.get(file_path)
+        if cached and cached[0] == stat_key:
+            return dict(cached[1])
+        
         try:
-            from docx import Document
-            doc = Document(file_path)
+            # 只需要计数，直接扫描XML，不构建python-docx的对象树
+            structure = _count_document_structure(file_path)
+            structure["last_modified"] = os.path.getmtime(file_path)
             
-            structure = {
-                "paragraphs_count": len(doc.paragraphs),
-                "tables_count": len(doc.tables),
-                "images_count": len(doc.inline_shapes),
-                "sections_count": len(doc.sections),
-                "last_modified": os.path.getmtime(file_path)
-            }
-            
-            return structure
+            self._structure_cache[file_path] = (stat_key, structure)
+            return dict(structure)
         except Exception as e:
             logger.error(f"分析文档结构失败: {e}")
             return {}
     
     def _calculate_snapshot_checksum(self, snapshot: StateSnapshot) -> str:
-        """计算快照校验和"""
+        """
+        计算快照校验和：逐条序列化并增量哈希，不构造整个快照的中间结构
+        
+        校验和必须与是否安装orjson无关，因此固定使用标准库json编码（与json_utils的回退输出相同），
+        不使用json_utils.dumps；旧版本的md5校验和由_verify_snapshot_checksum兼容
+        """
+        hasher = hashlib.blake2b(digest_size=16)
+        buffer = _DICT_POOL.get()
+        
+        # 外层按ID排序；记录本身按字段声明顺序序列化，嵌套字典的键顺序在JSON往返后保持不变，无需再排序
+        def update(key: str, data: Dict[str, Any]):
+            hasher.update(key.encode("utf-8"))
+            hasher.update(b"\x00")
+            hasher.update(json.dumps(data, ensure_ascii=False, default=_checksum_default).encode("utf-8"))
+            data.clear()
+        
+        try:
+            update("session_state", self._serialize_session(snapshot.session_state, buffer))
+            for doc_id in sorted(snapshot.document_states):
+                update(doc_id, self._serialize_document_state(snapshot.document_states[doc_id], buffer))
+            for op_id in sorted(snapshot.operation_records):
+                update(op_id, self._serialize_operation_record(snapshot.operation_records[op_id], buffer))
+        finally:
+            _DICT_POOL.put(buffer)
+        
+        return hasher.hexdigest()
+    
+    def _calculate_legacy_snapshot_checksum(self, snapshot: StateSnapshot) -> str:
+        """按旧版本的方式（标准库json + str）计算快照校验和"""
         data = {
             "session_state": asdict(snapshot.session_state),
             "document_states": {k: asdict(v) for k, v in snapshot.document_states.items()},
             "operation_records": {k: asdict(v) for k, v in snapshot.operation_records.items()}
         }
         
-        data_str = json.dumps(data, sort_keys=True, default=str)
+        data_str = json.dumps(data, sort_keys=True,
+                              default=lambda o: list(o) if isinstance(o, deque) else str(o))
         return hashlib.md5(data_str.encode()).hexdigest()
     
     def _verify_snapshot_checksum(self, snapshot: StateSnapshot) -> bool:
         """验证快照校验和"""
         calculated_checksum = self._calculate_snapshot_checksum(snapshot)
-        return calculated_checksum == snapshot.checksum
+        if calculated_checksum == snapshot.checksum:
+            return True
+        # 兼容旧版本保存的快照
+        return self._calculate_legacy_snapshot_checksum(snapshot) == snapshot.checksum
     
     def _save_snapshot_to_file(self, snapshot: StateSnapshot):
         """保存快照到文件"""
         snapshots_dir = self.state_dir / "snapshots"
         snapshots_dir.mkdir(exist_ok=True)
         
-        snapshot_file = snapshots_dir / f"{snapshot.snapshot_id}.json"
+        with _DICT_POOL.borrowing() as borrow:
+            records = {k: self._serialize_operation_record(v, borrow())
+                       for k, v in snapshot.operation_records.items()}
+            record_bytes = {k: json_utils.dumps(v) for k, v in records.items()}
+            
+            snapshot_data = {
+                "snapshot_id": snapshot.snapshot_id,
+                "timestamp": snapshot.timestamp,
+                "session_state": self._serialize_session(snapshot.session_state, borrow()),
+                "document_states": {k: self._serialize_document_state(v, borrow())
+                                    for k, v in snapshot.document_states.items()},
+                "checksum": snapshot.checksum
+            }
+            
+            # 与上一个快照相比只保存新增、变化和删除的操作记录
+            base_id = self._last_snapshot_id
+            if (base_id in self.state_snapshots and base_id != snapshot.snapshot_id
+                    and self._snapshot_depths.get(base_id, 0) < SNAPSHOT_DELTA_CHAIN_MAX):
+                previous = self._last_snapshot_records
+                snapshot_data["operation_records_delta"] = {
+                    "base": base_id,
+                    "added": {k: v for k, v in records.items() if previous.get(k) != record_bytes[k]},
+                    "removed": [k for k in previous if k not in records]
+                }
+                self._snapshot_depths[snapshot.snapshot_id] = self._snapshot_depths.get(base_id, 0) + 1
+            else:
+                base_id = None
+                snapshot_data["operation_records"] = records
+                self._snapshot_depths[snapshot.snapshot_id] = 0
+            
+            self._write_snapshot_data(snapshot.snapshot_id, snapshot_data)
         
-        snapshot_data = {
-            "snapshot_id": snapshot.snapshot_id,
-            "timestamp": snapshot.timestamp.isoformat(),
-            "session_state": self._serialize_session(snapshot.session_state),
-            "document_states": {k: self._serialize_document_state(v) for k, v in snapshot.document_states.items()},
-            "operation_records": {k: self._serialize_operation_record(v) for k, v in snapshot.operation_records.items()},
-            "checksum": snapshot.checksum
-        }
+        self._snapshot_bases[snapshot.snapshot_id] = base_id
+        self._last_snapshot_id = snapshot.snapshot_id
+        self._last_snapshot_records = record_bytes
+        self._write_snapshot_index()
+    
+    def _snapshot_stubs_all(self) -> List[SnapshotStub]:
+        """所有快照（已加载和未加载）的摘要"""
+        stubs = list(self._snapshot_stubs.values())
+        for snapshot in self.state_snapshots.values():
+            stubs.append(SnapshotStub(
+                snapshot_id=snapshot.snapshot_id,
+                timestamp=snapshot.timestamp,
+                checksum=snapshot.checksum,
+                documents_count=len(snapshot.document_states),
+                operations_count=len(snapshot.operation_records)
+            ))
+        return stubs
+    
+    def _read_snapshot_index(self) -> Dict[str, Dict[str, Any]]:
+        """读取快照摘要索引"""
+        index_file = self.state_dir / "snapshots" / SNAPSHOT_INDEX_FILE
+        if not index_file.exists():
+            return {}
+        try:
+            return json_utils.loads(index_file.read_bytes())
+        except Exception as e:
+            logger.warning(f"读取快照索引失败: {e}")
+            return {}
+    
+    def _write_snapshot_index(self):
+        """写入快照摘要索引"""
+        index = {}
+        for stub in self._snapshot_stubs_all():
+            entry = asdict(stub)
+            del entry["snapshot_id"]
+            entry["base"] = self._snapshot_bases.get(stub.snapshot_id)
+            index[stub.snapshot_id] = entry
         
-        with open(snapshot_file, 'w', encoding='utf-8') as f:
-            json.dump(snapshot_data, f, ensure_ascii=False, indent=2)
+        index_file = self.state_dir / "snapshots" / SNAPSHOT_INDEX_FILE
+        self._write_files_atomic([(index_file, json_utils.dumps(index, indent=True))])
     
-    def _serialize_session(self, session: SessionState) -> Dict[str, Any]:
-        """序列化会话状态"""
-        return {
-            "session_id": session.session_id,
-            "start_time": session.start_time.isoformat(),
-            "last_activity": session.last_activity.isoformat(),
-            "current_document": session.current_document,
-            "active_operations": session.active_operations,
-            "completed_operations": session.completed_operations,
-            "failed_operations": session.failed_operations,
-            "context": session.context
-        }
+    def _snapshot_path(self, snapshot_id: str) -> Optional[Path]:
+        """获取快照文件路径，兼容压缩和未压缩两种格式"""
+        snapshots_dir = self.state_dir / "snapshots"
+        for suffix in (".json.zst", ".json"):
+            path = snapshots_dir / f"{snapshot_id}{suffix}"
+            if path.exists():
+                return path
+        return None
+    
+    def _write_snapshot_data(self, snapshot_id: str, snapshot_data: Dict[str, Any]):
+        """写入快照文件，有zstandard时压缩保存"""
+        snapshots_dir = self.state_dir / "snapshots"
+        existing = self._snapshot_path(snapshot_id)
+        
+        if ZSTD_AVAILABLE:
+            data = json_utils.dumps(snapshot_data)
+            data = zstandard.ZstdCompressor(level=SNAPSHOT_COMPRESSION_LEVEL).compress(data)
+            snapshot_file = snapshots_dir / f"{snapshot_id}.json.zst"
+        else:
+            data = json_utils.dumps(snapshot_data, indent=True)
+            snapshot_file = snapshots_dir / f"{snapshot_id}.json"
+        
+        self._write_files_atomic([(snapshot_file, data)])
+        if existing and existing != snapshot_file:
+            existing.unlink()
+    
+    def _read_snapshot_file(self, snapshot_file: Path) -> Dict[str, Any]:
+        """读取快照文件"""
+        data = snapshot_file.read_bytes()
+        if snapshot_file.name.endswith(".zst"):
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("读取压缩快照需要安装zstandard库: pip install zstandard")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return json_utils.loads(data)
+    
+    def _resolve_snapshot_data(self, snapshot_id: str,
+                               raw_snapshots: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """沿增量链还原出包含完整操作记录的快照数据，结果写回raw_snapshots"""
+        if snapshot_id not in raw_snapshots:
+            snapshot_file = self._snapshot_path(snapshot_id)
+            if not snapshot_file:
+                raise FileNotFoundError(f"快照文件不存在: {snapshot_id}")
+            raw_snapshots[snapshot_id] = self._read_snapshot_file(snapshot_file)
+        
+        snapshot_data = raw_snapshots[snapshot_id]
+        delta = snapshot_data.get("operation_records_delta")
+        if delta is None:
+            return snapshot_data
+        
+        base_data = self._resolve_snapshot_data(delta["base"], raw_snapshots)
+        records = dict(base_data["operation_records"])
+        for op_id in delta["removed"]:
+            records.pop(op_id, None)
+        records.update(delta["added"])
+        
+        snapshot_data = {k: v for k, v in snapshot_data.items() if k != "operation_records_delta"}
+        snapshot_data["operation_records"] = records
+        raw_snapshots[snapshot_id] = snapshot_data
+        self._snapshot_depths[snapshot_id] = self._snapshot_depths.get(delta["base"], 0) + 1
+        return snapshot_data
+    
+    def _serialize_session(self, session: SessionState,
+                           out: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """序列化会话状态，out为预先分配的字典"""
+        data = {} if out is None else out
+        data["session_id"] = session.session_id
+        data["start_time"] = session.start_time
+        data["last_activity"] = session.last_activity
+        data["current_document"] = session.current_document
+        data["active_operations"] = sorted(session.active_operations)
+        data["completed_operations"] = session.completed_operations
+        data["failed_operations"] = session.failed_operations
+        data["context"] = session.context
+        return data
     
     def _deserialize_session(self, data: Dict[str, Any]) -> SessionState:
         """反序列化会话状态"""
@@ -492,23 +1002,24 @@ class EnhancedStateManager:
             start_time=datetime.fromisoformat(data["start_time"]),
             last_activity=datetime.fromisoformat(data["last_activity"]),
             current_document=data.get("current_document"),
-            active_operations=data.get("active_operations", []),
+            active_operations=set(data.get("active_operations", [])),
             completed_operations=data.get("completed_operations", []),
             failed_operations=data.get("failed_operations", []),
             context=data.get("context", {})
         )
     
-    def _serialize_document_state(self, doc_state: DocumentState) -> Dict[str, Any]:
-        """序列化文档状态"""
-        return {
-            "document_id": doc_state.document_id,
-            "file_path": doc_state.file_path,
-            "last_modified": doc_state.last_modified.isoformat(),
-            "content_hash": doc_state.content_hash,
-            "structure_info": doc_state.structure_info,
-            "metadata": doc_state.metadata,
-            "operation_history": doc_state.operation_history
-        }
+    def _serialize_document_state(self, doc_state: DocumentState,
+                                  out: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """序列化文档状态，out为预先分配的字典"""
+        data = {} if out is None else out
+        data["document_id"] = doc_state.document_id
+        data["file_path"] = doc_state.file_path
+        data["last_modified"] = doc_state.last_modified
+        data["content_hash"] = doc_state.content_hash
+        data["structure_info"] = doc_state.structure_info
+        data["metadata"] = doc_state.metadata
+        data["operation_history"] = list(doc_state.operation_history)
+        return data
     
     def _deserialize_document_state(self, data: Dict[str, Any]) -> DocumentState:
         """反序列化文档状态"""
@@ -519,32 +1030,33 @@ class EnhancedStateManager:
             content_hash=data["content_hash"],
             structure_info=data.get("structure_info", {}),
             metadata=data.get("metadata", {}),
-            operation_history=data.get("operation_history", [])
+            operation_history=deque(data.get("operation_history", []), maxlen=MAX_HISTORY_SIZE)
         )
     
-    def _serialize_operation_record(self, op_record: OperationRecord) -> Dict[str, Any]:
-        """序列化操作记录"""
-        return {
-            "operation_id": op_record.operation_id,
-            "operation_type": op_record.operation_type.value,
-            "timestamp": op_record.timestamp.isoformat(),
-            "status": op_record.status.value,
-            "parameters": op_record.parameters,
-            "result": op_record.result,
-            "error_message": op_record.error_message,
-            "execution_time": op_record.execution_time,
-            "context": op_record.context,
-            "dependencies": op_record.dependencies,
-            "rollback_data": op_record.rollback_data
-        }
+    def _serialize_operation_record(self, op_record: OperationRecord,
+                                    out: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """序列化操作记录，out为预先分配的字典"""
+        data = {} if out is None else out
+        data["operation_id"] = op_record.operation_id
+        data["operation_type"] = op_record.operation_type.value
+        data["timestamp"] = op_record.timestamp
+        data["status"] = op_record.status.value
+        data["parameters"] = op_record.parameters
+        data["result"] = op_record.result
+        data["error_message"] = op_record.error_message
+        data["execution_time"] = op_record.execution_time
+        data["context"] = op_record.context
+        data["dependencies"] = op_record.dependencies
+        data["rollback_data"] = op_record.rollback_data
+        return data
     
     def _deserialize_operation_record(self, data: Dict[str, Any]) -> OperationRecord:
         """反序列化操作记录"""
         return OperationRecord(
             operation_id=data["operation_id"],
-            operation_type=OperationType(data["operation_type"]),
+            operation_type=_OPERATION_TYPES[data["operation_type"]],
             timestamp=datetime.fromisoformat(data["timestamp"]),
-            status=OperationStatus(data["status"]),
+            status=_OPERATION_STATUSES[data["status"]],
             parameters=data.get("parameters", {}),
             result=data.get("result"),
             error_message=data.get("error_message"),
@@ -561,38 +1073,181 @@ class EnhancedStateManager:
             timestamp=datetime.fromisoformat(data["timestamp"]),
             session_state=self._deserialize_session(data["session_state"]),
             document_states={k: self._deserialize_document_state(v) for k, v in data["document_states"].items()},
-            operation_records={k: self._deserialize_operation_record(v) for k, v in data["operation_records"].items()},
+            operation_records=OrderedDict(
+                (k, self._deserialize_operation_record(v)) for k, v in data["operation_records"].items()
+            ),
             checksum=data["checksum"]
         )
     
+    def _write_files_atomic(self, files: List[tuple]):
+        """
+        原子地写入一组文件：全部写入临时文件并落盘后再逐个替换，
+        写入中途崩溃不会留下损坏或新旧混杂的文件
+        
+        Parameters:
+        - files: (路径, 字节数据) 列表
+        """
+        tmp_files = []
+        try:
+            for path, data in files:
+                tmp_path = path.with_name(path.name + ".tmp")
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                tmp_files.append((tmp_path, path))
+        except Exception:
+            for tmp_path, _ in tmp_files:
+                tmp_path.unlink()
+            raise
+        
+        for tmp_path, path in tmp_files:
+            os.replace(tmp_path, path)
+    
     def _persist_state(self):
         """持久化状态"""
         try:
-            # 保存会话状态
-            session_file = self.state_dir / "current_session.json"
-            with open(session_file, 'w', encoding='utf-8') as f:
-                json.dump(self._serialize_session(self.current_session), f, ensure_ascii=False, indent=2)
+            # 可能在后台线程中执行，先复制引用再遍历
+            session = self.current_session
+            document_states = dict(self.document_states)
             
-            # 保存文档状态
-            docs_file = self.state_dir / "document_states.json"
-            docs_data = {k: self._serialize_document_state(v) for k, v in self.document_states.items()}
-            with open(docs_file, 'w', encoding='utf-8') as f:
-                json.dump(docs_data, f, ensure_ascii=False, indent=2)
+            with _DICT_POOL.borrowing() as borrow:
+                # 会话状态
+                session_data = json_utils.dumps(self._serialize_session(session, borrow()), indent=True)
+                # 文档状态
+                docs_data = {k: self._serialize_document_state(v, borrow()) for k, v in document_states.items()}
+                docs_bytes = json_utils.dumps(docs_data, indent=True)
+            
+            self._write_files_atomic([
+                (self.state_dir / "current_session.json", session_data),
+                (self.state_dir / "document_states.json", docs_bytes),
+            ])
             
-            # 保存操作记录
-            ops_file = self.state_dir / "operation_records.json"
-            ops_data = {k: self._serialize_operation_record(v) for k, v in self.operation_records.items()}
-            with open(ops_file, 'w', encoding='utf-8') as f:
-                json.dump(ops_data, f, ensure_ascii=False, indent=2)
+            # 操作记录已逐条追加到日志，这里只需刷新缓冲区并落盘，日志膨胀时再压缩
+            if self._ops_log_lines > 2 * len(self.operation_records):
+                self.compact_log()
+            else:
+                with self._ops_log_lock:
+                    if self._ops_log:
+                        self._ops_log.flush()
+                        os.fsync(self._ops_log.fileno())
             
             logger.debug("状态持久化完成")
             
         except Exception as e:
             logger.error(f"状态持久化失败: {e}")
     
+    def _load_operations_log(self):
+        """逐行读取操作日志，同一操作ID以后出现的记录为准"""
+        if not self._ops_log_path.exists():
+            return
+        
+        with open(self._ops_log_path, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    op_record = self._deserialize_operation_record(json_utils.loads(line))
+                except Exception as e:
+                    # 进程异常退出时最后一行可能不完整
+                    logger.warning(f"跳过无法解析的操作日志记录: {e}")
+                    continue
+                self.operation_records[op_record.operation_id] = op_record
+                self._ops_log_lines += 1
+        
+        self._evict_old_operations()
+    
+    def _evict_old_operations(self):
+        """超出最大历史记录数时丢弃最旧的操作记录"""
+        if len(self.operation_records) > self.max_history_size:
+            self._own_operation_records()
+        while len(self.operation_records) > self.max_history_size:
+            op_id, op = self.operation_records.popitem(last=False)
+            self._type_index[op.operation_type].pop(op_id, None)
+    
+    def _own_document_states(self):
+        """文档状态字典被快照引用时，先复制一份再修改"""
+        if self._document_states_shared:
+            self.document_states = dict(self.document_states)
+            self._document_states_shared = False
+    
+    def _own_operation_records(self):
+        """操作记录字典被快照引用时，先复制一份再修改"""
+        if self._operation_records_shared:
+            self.operation_records = OrderedDict(self.operation_records)
+            self._operation_records_shared = False
+    
+    def _rebuild_type_index(self):
+        """根据当前操作记录重建类型索引"""
+        self._type_index.clear()
+        for op_id, op in self.operation_records.items():
+            self._type_index[op.operation_type][op_id] = None
+    
+    def _open_operations_log(self):
+        """以追加模式打开操作日志"""
+        self._ops_log = open(self._ops_log_path, 'ab', buffering=OPERATIONS_LOG_BUFFER_SIZE)
+    
+    def _append_operation_to_log(self, op_record: OperationRecord):
+        """将操作记录的最新状态追加到日志"""
+        if not self._ops_log:
+            return
+        try:
+            with _DICT_POOL.borrowing() as borrow:
+                line = json_utils.dumps(self._serialize_operation_record(op_record, borrow()))
+            with self._ops_log_lock:
+                if self._ops_log:
+                    self._ops_log.write(line + b"\n")
+                    self._ops_log_lines += 1
+        except Exception as e:
+            logger.error(f"写入操作日志失败: {e}")
+    
+    def compact_log(self):
+        """用当前的操作记录重写操作日志，去掉已过期和被覆盖的记录"""
+        with self._ops_log_lock:
+            self._compact_log_locked()
+    
+    def _compact_log_locked(self):
+        """在持有操作日志锁的情况下重写操作日志"""
+        tmp_path = self._ops_log_path.with_suffix(".ndjson.tmp")
+        lines = 0
+        # 每条记录序列化完即写出，整个压缩过程复用同一个字典
+        buffer = _DICT_POOL.get()
+        try:
+            with open(tmp_path, 'wb') as f:
+                for op_record in list(self.operation_records.values()):
+                    try:
+                        f.write(json_utils.dumps(self._serialize_operation_record(op_record, buffer)) + b"\n")
+                        lines += 1
+                    except Exception as e:
+                        logger.error(f"写入操作日志失败: {e}")
+                    buffer.clear()
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            _DICT_POOL.put(buffer)
+        
+        reopen = self._ops_log is not None
+        if reopen:
+            self._ops_log.close()
+        os.replace(tmp_path, self._ops_log_path)
+        self._ops_log_lines = lines
+        if reopen:
+            self._open_operations_log()
+        
+        logger.debug(f"操作日志压缩完成，保留 {lines} 条记录")
+    
     def __del__(self):
         """析构函数，确保状态被保存"""
+        try:
+            self._stop.set()
+        except Exception:
+            pass
         try:
             self._persist_state()
         except Exception:
             pass
+        try:
+            if self._ops_log:
+                self._ops_log.close()
+        except Exception:
+            pass
@@ -7,12 +7,43 @@
 """
 
 import os
+import re
 import logging
+import functools
 from pathlib import Path
 from typing import Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# 文件名中不允许出现的字符
+INVALID_FILENAME_CHARS = '<>:"|?*'
+_INVALID_FILENAME_RE = re.compile(f"[{re.escape(INVALID_FILENAME_CHARS)}]")
+
+@functools.lru_cache(maxsize=1)
+def _desktop_dir() -> Path:
+    """用户桌面目录"""
+    return Path.home() / "Desktop"
+
+@functools.lru_cache(maxsize=1024)
+def _resolve_cached(cwd: str, file_path: str) -> Path:
+    """解析为绝对路径，相对路径的结果取决于当前工作目录，因此一并作为缓存键"""
+    return Path(cwd, file_path).resolve()
+
+def _resolve(file_path: str) -> Path:
+    """解析为绝对路径，重复的路径不再访问文件系统"""
+    return _resolve_cached(os.getcwd(), str(file_path))
+
+# 本进程中已创建或确认存在过的目录
+_KNOWN_DIRS = set()
+
+def _ensure_dir(directory: Path):
+    """确保目录存在；已知目录只检查是否仍存在，运行期间被删除时重新创建"""
+    key = str(directory)
+    if key in _KNOWN_DIRS and directory.is_dir():
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    _KNOWN_DIRS.add(key)
+
 def normalize_file_path(file_path: str, default_extension: str = ".docx") -> str:
     """
     标准化文件路径处理
@@ -30,14 +61,14 @@ def normalize_file_path(file_path: str, default_extension: str = ".docx") -> str
         
         # 如果是相对路径，转换为绝对路径
         if not path.is_absolute():
-            path = path.resolve()
+            path = _resolve(file_path)
         
         # 确保有正确的扩展名
         if not path.suffix.lower() == default_extension.lower():
             path = path.with_suffix(default_extension)
         
         # 确保目录存在
-        path.parent.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(path.parent)
         
         normalized_path = str(path)
         logger.info(f"Path normalized: '{file_path}' -> '{normalized_path}'")
@@ -71,20 +102,17 @@ def validate_file_path(file_path: str) -> Tuple[bool, str]:
         
         # 检查目录是否可写
         parent_dir = path.parent
-        if not parent_dir.exists():
-            try:
-                parent_dir.mkdir(parents=True, exist_ok=True)
-            except PermissionError:
-                return False, f"没有权限创建目录: {parent_dir}"
+        try:
+            _ensure_dir(parent_dir)
+        except PermissionError:
+            return False, f"没有权限创建目录: {parent_dir}"
         
         if not os.access(parent_dir, os.W_OK):
             return False, f"没有写入权限: {parent_dir}"
         
         # 检查文件名是否有效
-        filename = path.name
-        invalid_chars = '<>:"|?*'
-        if any(char in filename for char in invalid_chars):
-            return False, f"文件名包含无效字符: {invalid_chars}"
+        if _INVALID_FILENAME_RE.search(path.name):
+            return False, f"文件名包含无效字符: {INVALID_FILENAME_CHARS}"
         
         return True, ""
         
@@ -128,8 +156,7 @@ def ensure_file_directory(file_path: str) -> bool:
     - 是否成功创建目录
     """
     try:
-        path = Path(file_path)
-        path.parent.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(Path(file_path).parent)
         return True
     except Exception as e:
         logger.error(f"Failed to create directory for {file_path}: {e}")
@@ -146,7 +173,7 @@ def get_relative_to_desktop(file_path: str) -> str:
     - 相对于桌面的路径
     """
     try:
-        desktop = Path.home() / "Desktop"
+        desktop = _desktop_dir()
         path = Path(file_path)
         
         if not path.is_absolute():
@@ -174,7 +201,7 @@ def get_file_info(file_path: str) -> dict:
         
         info = {
             "original_path": file_path,
-            "absolute_path": str(path.resolve()),
+            "absolute_path": str(_resolve(file_path)),
             "directory": str(path.parent),
             "filename": path.name,
             "extension": path.suffix,
@@ -7,8 +7,11 @@
 """
 
 import os
+import io
 import logging
-from typing import Optional
+import pkgutil
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
 from docx import Document
 
 from .enhanced_docx_processor import EnhancedDocxProcessor
@@ -16,6 +19,17 @@ from .file_path_utils import get_safe_file_path, get_file_info, validate_file_pa
 
 logger = logging.getLogger(__name__)
 
+# python-docx默认模板，读入内存一次，新建文档时不再从磁盘读取
+_DEFAULT_TEMPLATE_BYTES = pkgutil.get_data('docx', 'templates/default.docx')
+
+# 调试信息中用到的目录，进程启动后不会变化
+_HOME = os.path.expanduser('~')
+_DESKTOP = os.path.join(_HOME, 'Desktop')
+_TMPDIR = tempfile.gettempdir()
+
+# 文档写盘线程，后台保存请求按提交顺序依次写入
+_SAVE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="docx-save")
+
 class FixedDocxProcessor(EnhancedDocxProcessor):
     """修复版DOCX处理器，解决文件保存问题"""
     
@@ -23,20 +37,62 @@ class FixedDocxProcessor(EnhancedDocxProcessor):
         super().__init__()
         logger.info("FixedDocxProcessor initialized with file save fixes")
     
+    def _serialize_document(self, document) -> memoryview:
+        """把文档序列化到内存"""
+        buffer = io.BytesIO()
+        document.save(buffer)
+        return buffer.getbuffer()
+    
+    def _write_bytes(self, path: str, data: memoryview) -> int:
+        """
+        直接通过文件描述符写入，一次写不完时继续写剩余部分
+        
+        Returns:
+        - 写入后通过已打开的文件描述符取得的文件大小
+        """
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+            return os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+    
+    def _write_document(self, document, path: str) -> int:
+        """
+        先把文档序列化到内存，再交给保存线程写入文件，返回文件大小
+        
+        所有写盘都经过同一个保存线程，同步保存不会与尚未完成的后台保存同时写同一个文件
+        """
+        return self._write_in_save_thread(path, self._serialize_document(document))
+    
+    def _write_in_save_thread(self, path: str, data: memoryview) -> int:
+        """在保存线程中写入并等待完成，排在之前提交的后台保存之后"""
+        return _SAVE_POOL.submit(self._write_bytes, path, data).result()
+    
+    def _serialize_current_document(self) -> bytes:
+        """将当前文档序列化一次，经保存线程写入本地文件并返回同一份字节"""
+        with self.state_manager.batch() as document:
+            data = self._serialize_document(document)
+            self._write_in_save_thread(self.state_manager.get_current_file_path(), data)
+            self.state_manager.mark_clean()
+        
+        return data.tobytes()
+    
     def create_document(self, file_path: str) -> str:
         """创建新文档 - 修复版"""
         try:
-            # 获取当前工作目录信息
-            current_dir = os.getcwd()
-            logger.info(f"Current working directory: {current_dir}")
-            
-            # 获取文件信息
-            file_info = get_file_info(file_path)
-            logger.info(f"File info: {file_info}")
+            # 诊断信息只在开启DEBUG日志时收集
+            debug_enabled = logger.isEnabledFor(logging.DEBUG)
+            if debug_enabled:
+                logger.debug("Current working directory: %s", os.getcwd())
+                logger.debug("File info: %s", get_file_info(file_path))
             
             # 获取安全的文件路径
             safe_path = get_safe_file_path(file_path, ".docx")
-            logger.info(f"Safe path: {safe_path}")
+            if debug_enabled:
+                logger.debug("Safe path: %s", safe_path)
             
             # 验证路径
             is_valid, error_msg = validate_file_path(safe_path)
@@ -44,18 +100,16 @@ class FixedDocxProcessor(EnhancedDocxProcessor):
                 return f"文件路径无效: {error_msg}"
             
             # 创建文档
-            document = Document()
+            document = Document(io.BytesIO(_DEFAULT_TEMPLATE_BYTES))
             
             # 设置当前文档
             self.state_manager.set_current_document(safe_path, document)
             
-            # 保存文档
-            document.save(safe_path)
-            
-            # 验证文件是否真的保存成功
-            if os.path.exists(safe_path):
-                file_size = os.path.getsize(safe_path)
-                logger.info(f"Document successfully created: {safe_path} (size: {file_size} bytes)")
+            # 保存文档，文件大小在写入的同一个文件描述符上取得
+            file_size = self._write_document(document, safe_path)
+            if file_size:
+                self.state_manager.mark_clean()
+                logger.info("Document successfully created: %s (size: %s bytes)", safe_path, file_size)
                 return f"文档创建成功: {safe_path} (大小: {file_size} 字节)"
             else:
                 logger.error(f"File was not created despite successful save call: {safe_path}")
@@ -73,7 +127,7 @@ class FixedDocxProcessor(EnhancedDocxProcessor):
             
             # 获取安全的文件路径
             safe_path = get_safe_file_path(new_file_path, ".docx")
-            logger.info(f"Saving document as: {safe_path}")
+            logger.debug("Saving document as: %s", safe_path)
             
             # 验证路径
             is_valid, error_msg = validate_file_path(safe_path)
@@ -84,15 +138,13 @@ class FixedDocxProcessor(EnhancedDocxProcessor):
             document = self.state_manager.get_current_document()
             
             # 保存文档
-            document.save(safe_path)
+            file_size = self._write_document(document, safe_path)
             
             # 更新状态管理器
             self.state_manager.set_current_document(safe_path, document)
             
-            # 验证文件是否真的保存成功
-            if os.path.exists(safe_path):
-                file_size = os.path.getsize(safe_path)
-                logger.info(f"Document successfully saved as: {safe_path} (size: {file_size} bytes)")
+            if file_size:
+                logger.info("Document successfully saved as: %s (size: %s bytes)", safe_path, file_size)
                 return f"文档另存为成功: {safe_path} (大小: {file_size} 字节)"
             else:
                 logger.error(f"File was not saved despite successful save call: {safe_path}")
@@ -112,18 +164,16 @@ class FixedDocxProcessor(EnhancedDocxProcessor):
             if not current_path:
                 return "当前文档未设置保存路径"
             
-            logger.info(f"Saving document to: {current_path}")
+            logger.debug("Saving document to: %s", current_path)
             
             # 获取当前文档
             document = self.state_manager.get_current_document()
             
             # 保存文档
-            document.save(current_path)
-            
-            # 验证文件是否真的保存成功
-            if os.path.exists(current_path):
-                file_size = os.path.getsize(current_path)
-                logger.info(f"Document successfully saved: {current_path} (size: {file_size} bytes)")
+            file_size = self._write_document(document, current_path)
+            if file_size:
+                self.state_manager.mark_clean()
+                logger.info("Document successfully saved: %s (size: %s bytes)", current_path, file_size)
                 return f"文档保存成功: {current_path} (大小: {file_size} 字节)"
             else:
                 logger.error(f"File was not saved despite successful save call: {current_path}")
@@ -133,31 +183,68 @@ class FixedDocxProcessor(EnhancedDocxProcessor):
             logger.error(f"Failed to save document: {e}")
             return f"保存文档失败: {str(e)}"
     
-    def get_debug_info(self) -> str:
-        """获取调试信息"""
+    def save_document_async(self) -> Future:
+        """
+        在后台保存当前文档：文档在调用线程中序列化，写盘交给保存线程
+        
+        Returns:
+        - 结果为保存消息字符串的Future
+        """
+        future = Future()
         try:
-            info = []
+            if not self.state_manager.has_current_document():
+                future.set_result("没有打开的文档")
+                return future
             
-            # 工作目录信息
-            info.append(f"当前工作目录: {os.getcwd()}")
-            info.append(f"用户主目录: {os.path.expanduser('~')}")
-            info.append(f"桌面目录: {os.path.join(os.path.expanduser('~'), 'Desktop')}")
+            current_path = self.state_manager.get_current_file_path()
+            if not current_path:
+                future.set_result("当前文档未设置保存路径")
+                return future
             
+            # 序列化时记录修改计数，写盘后据此判断期间是否又有修改
+            with self.state_manager.batch() as document:
+                generation = self.state_manager.get_edit_generation()
+                data = self._serialize_document(document)
+        except Exception as e:
+            logger.error(f"Failed to save document: {e}")
+            future.set_result(f"保存文档失败: {str(e)}")
+            return future
+        
+        return _SAVE_POOL.submit(self._finish_background_save, current_path, data, document, generation)
+    
+    def _finish_background_save(self, path: str, data: memoryview, document, generation: int) -> str:
+        """保存线程中写入文档并检查结果，序列化之后没有新的修改时标记为已保存"""
+        try:
+            file_size = self._write_bytes(path, data)
+            if file_size:
+                self.state_manager.mark_clean_if_unchanged(path, document, generation)
+                logger.info("Document successfully saved: %s (size: %s bytes)", path, file_size)
+                return f"文档保存成功: {path} (大小: {file_size} 字节)"
+            logger.error(f"File was not saved despite successful save call: {path}")
+            return f"文档保存失败: 文件未成功保存到 {path}"
+        except Exception as e:
+            logger.error(f"Failed to save document: {e}")
+            return f"保存文档失败: {str(e)}"
+    
+    def get_debug_info(self) -> str:
+        """获取调试信息"""
+        try:
             # 当前文档信息
             if self.state_manager.has_current_document():
                 current_path = self.state_manager.get_current_file_path()
-                info.append(f"当前文档路径: {current_path}")
+                document_info = (f"当前文档路径: {current_path}",)
                 if current_path:
-                    file_info = get_file_info(current_path)
-                    info.append(f"文件信息: {file_info}")
+                    document_info += (f"文件信息: {get_file_info(current_path)}",)
             else:
-                info.append("当前没有打开的文档")
-            
-            # 临时目录信息
-            import tempfile
-            info.append(f"临时目录: {tempfile.gettempdir()}")
-            
-            return "\n".join(info)
+                document_info = ("当前没有打开的文档",)
+            
+            return "\n".join((
+                f"当前工作目录: {os.getcwd()}",
+                f"用户主目录: {_HOME}",
+                f"桌面目录: {_DESKTOP}",
+                *document_info,
+                f"临时目录: {_TMPDIR}",
+            ))
             
         except Exception as e:
             return f"获取调试信息失败: {str(e)}"
@@ -7,14 +7,58 @@
 """
 
 import logging
+from bisect import bisect_left
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Optional, List, Union, Dict, Any
 from docx import Document
 from docx.shared import Pt, RGBColor
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.oxml.ns import qn
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT, WD_UNDERLINE
+from docx.oxml.ns import nsmap, qn
+from docx.styles import BabelFish
+from lxml import etree
 
 logger = logging.getLogger(__name__)
 
+# 中文字体属性的限定名
+_QN_EAST_ASIA = qn('w:eastAsia')
+
+# 对齐方式名称到枚举值的映射
+_ALIGNMENT_MAP = MappingProxyType({
+    "left": WD_PARAGRAPH_ALIGNMENT.LEFT,
+    "center": WD_PARAGRAPH_ALIGNMENT.CENTER,
+    "right": WD_PARAGRAPH_ALIGNMENT.RIGHT,
+    "justify": WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+})
+
+
+# 按名称查找样式，名称作为XPath变量传入，无需转义
+_FIND_STYLE_BY_NAME = etree.XPath(
+    'w:style[w:name/@w:val=$name]', namespaces={'w': nsmap['w']}
+)
+
+
+# 段落中直接包含的run元素，与paragraph.runs范围一致
+_PARAGRAPH_RUNS = etree.XPath('./w:r', namespaces={'w': nsmap['w']})
+
+
+def _style_exists(document: Document, style_name: str) -> bool:
+    """按样式名称查找样式是否存在，由lxml的XPath完成匹配，不逐个构造样式对象"""
+    return bool(_FIND_STYLE_BY_NAME(document.styles.element, name=BabelFish.ui2internal(style_name)))
+
+
+@lru_cache(maxsize=512)
+def _parse_rgb(color: Optional[str]) -> Optional[RGBColor]:
+    """解析#RRGGBB格式的颜色，格式无效时返回None"""
+    if not (color and color.startswith('#') and len(color) == 7):
+        return None
+    try:
+        r, g, b = bytes.fromhex(color[1:])
+        return RGBColor(r, g, b)
+    except ValueError:
+        return None
+
 class FontProcessor:
     """字体处理器，提供文本格式化的所有操作"""
     
@@ -48,31 +92,31 @@ class FontProcessor:
         - 操作结果消息
         """
         try:
-            if paragraph_index < 0 or paragraph_index >= len(document.paragraphs):
-                return f"段落索引超出范围: {paragraph_index}，文档共有 {len(document.paragraphs)} 个段落"
+            paragraphs = document.paragraphs
+            if paragraph_index < 0 or paragraph_index >= len(paragraphs):
+                return f"段落索引超出范围: {paragraph_index}，文档共有 {len(paragraphs)} 个段落"
             
-            paragraph = document.paragraphs[paragraph_index]
+            paragraph = paragraphs[paragraph_index]
             
             # 设置段落对齐
             if alignment:
-                alignment_map = {
-                    "left": WD_PARAGRAPH_ALIGNMENT.LEFT,
-                    "center": WD_PARAGRAPH_ALIGNMENT.CENTER,
-                    "right": WD_PARAGRAPH_ALIGNMENT.RIGHT,
-                    "justify": WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-                }
-                if alignment in alignment_map:
-                    paragraph.alignment = alignment_map[alignment]
-            
-            # 如果段落没有runs，创建一个
-            if not paragraph.runs:
-                run = paragraph.add_run(paragraph.text)
-                paragraph.clear()
-            
-            # 对所有runs应用格式
-            for run in paragraph.runs:
-                FontProcessor._apply_run_formatting(
-                    run, font_name, font_size, bold, italic, underline, color
+                if alignment in _ALIGNMENT_MAP:
+                    paragraph.alignment = _ALIGNMENT_MAP[alignment]
+            
+            # 只设置了对齐方式时不需要改动runs
+            has_font_change = any(
+                value is not None
+                for value in (font_name, font_size, bold, italic, underline, color)
+            )
+            if has_font_change:
+                # 如果段落没有runs，创建一个
+                if not paragraph.runs:
+                    run = paragraph.add_run(paragraph.text)
+                    paragraph.clear()
+                
+                # 对所有runs应用格式
+                FontProcessor._apply_paragraph_runs_formatting(
+                    paragraph, font_name, font_size, bold, italic, underline, color
                 )
             
             return f"段落 {paragraph_index} 字体样式已更新"
@@ -108,10 +152,11 @@ class FontProcessor:
         - 操作结果消息
         """
         try:
-            if paragraph_index < 0 or paragraph_index >= len(document.paragraphs):
+            paragraphs = document.paragraphs
+            if paragraph_index < 0 or paragraph_index >= len(paragraphs):
                 return f"段落索引超出范围: {paragraph_index}"
             
-            paragraph = document.paragraphs[paragraph_index]
+            paragraph = paragraphs[paragraph_index]
             text = paragraph.text
             
             if start_pos < 0 or start_pos >= len(text):
@@ -120,13 +165,34 @@ class FontProcessor:
             if end_pos <= start_pos or end_pos > len(text):
                 return f"结束位置无效: {end_pos}"
             
+            # 没有要设置的格式时，重建段落只会丢掉其余runs的格式
+            if (font_name is None and font_size is None and bold is None
+                    and italic is None and underline is None and color is None):
+                return f"段落 {paragraph_index} 无内容变更"
+            
+            # 范围恰好落在run边界上时，直接修改对应runs的格式，无需重建段落
+            runs = paragraph.runs
+            offsets = [0]
+            for run in runs:
+                offsets.append(offsets[-1] + len(run.text))
+            if offsets[-1] == len(text):
+                first = bisect_left(offsets, start_pos)
+                last = bisect_left(offsets, end_pos)
+                if (first < len(offsets) and offsets[first] == start_pos
+                        and last < len(offsets) and offsets[last] == end_pos):
+                    for run in runs[first:last]:
+                        FontProcessor._apply_run_formatting(
+                            run, font_name, font_size, bold, italic, underline, color
+                        )
+                    return f"段落 {paragraph_index} 位置 {start_pos}-{end_pos} 字体样式已更新"
+            
             # 分割文本并重新构建runs
             before_text = text[:start_pos]
             target_text = text[start_pos:end_pos]
             after_text = text[end_pos:]
             
             # 保存原始格式
-            original_format = FontProcessor._get_run_format(paragraph.runs[0]) if paragraph.runs else {}
+            original_format = FontProcessor._get_run_format(runs[0]) if runs else {}
             
             # 清除所有runs并重新添加
             paragraph.clear()
@@ -179,23 +245,22 @@ class FontProcessor:
         - 操作结果消息
         """
         try:
-            if paragraph_index < 0 or paragraph_index >= len(document.paragraphs):
+            paragraphs = document.paragraphs
+            if paragraph_index < 0 or paragraph_index >= len(paragraphs):
                 return f"段落索引超出范围: {paragraph_index}"
             
             if level < 1 or level > 9:
                 return f"标题级别必须在1-9之间: {level}"
             
-            paragraph = document.paragraphs[paragraph_index]
+            paragraph = paragraphs[paragraph_index]
             
             # 设置标题样式
             paragraph.style = document.styles[f'Heading {level}']
             
             # 应用自定义格式
-            if paragraph.runs:
-                for run in paragraph.runs:
-                    FontProcessor._apply_run_formatting(
-                        run, font_name, font_size, None, None, None, color
-                    )
+            FontProcessor._apply_paragraph_runs_formatting(
+                paragraph, font_name, font_size, None, None, None, color
+            )
             
             return f"段落 {paragraph_index} 已设置为 {level} 级标题"
             
@@ -222,17 +287,24 @@ class FontProcessor:
         """
         try:
             # 检查样式是否存在
-            available_styles = [style.name for style in document.styles]
-            if style_name not in available_styles:
+            style_map = {style.name: style for style in document.styles}
+            target_style = style_map.get(style_name)
+            if target_style is None:
+                available_styles = list(style_map)
                 return f"样式不存在: {style_name}，可用样式: {', '.join(available_styles[:10])}"
             
+            # 样式对象到styleId的解析只做一次，循环中直接写入段落的pStyle
+            # 默认段落样式解析为None，与paragraph.style的赋值行为一致
+            target_style_id = document.part.get_style_id(target_style, WD_STYLE_TYPE.PARAGRAPH)
+            
+            paragraphs = document.paragraphs
             applied_count = 0
             errors = []
             
             for idx in paragraph_indices:
                 try:
-                    if 0 <= idx < len(document.paragraphs):
-                        document.paragraphs[idx].style = document.styles[style_name]
+                    if 0 <= idx < len(paragraphs):
+                        paragraphs[idx]._p.style = target_style_id
                         applied_count += 1
                     else:
                         errors.append(f"索引 {idx} 超出范围")
@@ -278,12 +350,10 @@ class FontProcessor:
         """
         try:
             # 检查样式是否已存在
-            existing_styles = [style.name for style in document.styles]
-            if style_name in existing_styles:
+            if _style_exists(document, style_name):
                 return f"样式已存在: {style_name}"
             
             # 创建新样式
-            from docx.enum.style import WD_STYLE_TYPE
             style = document.styles.add_style(style_name, WD_STYLE_TYPE.PARAGRAPH)
             
             # 设置字体
@@ -294,27 +364,16 @@ class FontProcessor:
             font.italic = italic
             
             # 设置颜色
-            if color and color.startswith('#'):
-                try:
-                    r = int(color[1:3], 16)
-                    g = int(color[3:5], 16)
-                    b = int(color[5:7], 16)
-                    font.color.rgb = RGBColor(r, g, b)
-                except ValueError:
-                    pass
+            rgb = _parse_rgb(color)
+            if rgb is not None:
+                font.color.rgb = rgb
             
             # 设置对齐
-            alignment_map = {
-                "left": WD_PARAGRAPH_ALIGNMENT.LEFT,
-                "center": WD_PARAGRAPH_ALIGNMENT.CENTER,
-                "right": WD_PARAGRAPH_ALIGNMENT.RIGHT,
-                "justify": WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-            }
-            if alignment in alignment_map:
-                style.paragraph_format.alignment = alignment_map[alignment]
+            if alignment in _ALIGNMENT_MAP:
+                style.paragraph_format.alignment = _ALIGNMENT_MAP[alignment]
             
             # 设置中文字体
-            style.font._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
+            style.font._element.rPr.rFonts.set(_QN_EAST_ASIA, font_name)
             
             return f"自定义样式 '{style_name}' 创建成功"
             
@@ -335,10 +394,11 @@ class FontProcessor:
         - 字体信息字符串
         """
         try:
-            if paragraph_index < 0 or paragraph_index >= len(document.paragraphs):
+            paragraphs = document.paragraphs
+            if paragraph_index < 0 or paragraph_index >= len(paragraphs):
                 return f"段落索引超出范围: {paragraph_index}"
             
-            paragraph = document.paragraphs[paragraph_index]
+            paragraph = paragraphs[paragraph_index]
             
             if not paragraph.runs:
                 return f"段落 {paragraph_index} 没有文本内容"
@@ -347,7 +407,7 @@ class FontProcessor:
             run = paragraph.runs[0]
             font = run.font
             
-            info = [
+            return "\n".join((
                 f"段落 {paragraph_index} 字体信息:",
                 f"  字体名称: {font.name or '默认'}",
                 f"  字体大小: {font.size.pt if font.size else '默认'}磅",
@@ -356,10 +416,8 @@ class FontProcessor:
                 f"  下划线: {'是' if font.underline else '否'}",
                 f"  颜色: {font.color.rgb if font.color.rgb else '默认'}",
                 f"  样式: {paragraph.style.name}",
-                f"  对齐: {paragraph.alignment}"
-            ]
-            
-            return "\n".join(info)
+                f"  对齐: {paragraph.alignment}",
+            ))
             
         except Exception as e:
             logger.error(f"获取字体信息失败: {e}")
@@ -376,12 +434,16 @@ class FontProcessor:
         color: Optional[str]
     ):
         """应用run格式"""
+        if (font_name is None and font_size is None and bold is None
+                and italic is None and underline is None and color is None):
+            return
+        
         font = run.font
         
         if font_name:
             font.name = font_name
             # 设置中文字体
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), font_name)
+            run._element.rPr.rFonts.set(_QN_EAST_ASIA, font_name)
         
         if font_size:
             font.size = Pt(font_size)
@@ -395,14 +457,48 @@ class FontProcessor:
         if underline is not None:
             font.underline = underline
         
-        if color and color.startswith('#') and len(color) == 7:
-            try:
-                r = int(color[1:3], 16)
-                g = int(color[3:5], 16)
-                b = int(color[5:7], 16)
-                font.color.rgb = RGBColor(r, g, b)
-            except ValueError:
-                pass
+        if color:
+            rgb = _parse_rgb(color)
+            if rgb is not None:
+                font.color.rgb = rgb
+    
+    @staticmethod
+    def _apply_paragraph_runs_formatting(
+        paragraph,
+        font_name: Optional[str],
+        font_size: Optional[int],
+        bold: Optional[bool],
+        italic: Optional[bool],
+        underline: Optional[bool],
+        color: Optional[str]
+    ):
+        """一次遍历段落的run元素，直接在w:rPr上设置格式，效果与逐个调用_apply_run_formatting相同"""
+        if (font_name is None and font_size is None and bold is None
+                and italic is None and underline is None and color is None):
+            return
+        
+        size = Pt(font_size) if font_size else None
+        rgb = _parse_rgb(color) if color else None
+        if underline is not None:
+            underline = WD_UNDERLINE.SINGLE if underline else WD_UNDERLINE.NONE
+        
+        for r in _PARAGRAPH_RUNS(paragraph._p):
+            rPr = r.get_or_add_rPr()
+            if font_name:
+                rPr.rFonts_ascii = font_name
+                rPr.rFonts_hAnsi = font_name
+                rPr.get_or_add_rFonts().set(_QN_EAST_ASIA, font_name)
+            if size is not None:
+                rPr.sz_val = size
+            if bold is not None:
+                rPr._set_bool_val("b", bold)
+            if italic is not None:
+                rPr._set_bool_val("i", italic)
+            if underline is not None:
+                rPr.u_val = underline
+            if rgb is not None:
+                rPr._remove_color()
+                rPr.get_or_add_color().val = rgb
     
     @staticmethod
     def _get_run_format(run) -> Dict[str, Any]:
@@ -414,7 +510,7 @@ class FontProcessor:
             "bold": font.bold,
             "italic": font.italic,
             "underline": font.underline,
-            "color": font.color.rgb if font.color.rgb else None
+            "color": f"#{font.color.rgb}" if font.color.rgb else None
         }
     
     @staticmethod
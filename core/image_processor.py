@@ -6,25 +6,281 @@
 负责文档中图片的插入、删除、缩放和定位操作
 """
 
+import io
 import os
 import logging
-from typing import Optional, Tuple, Union
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from weakref import WeakKeyDictionary
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from docx import Document
-from docx.shared import Inches, Cm, Pt
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.image.image import Image
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
 from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
-import shutil
+from docx.oxml.ns import nsmap, qn
+from docx.oxml.shape import CT_Inline
+from docx.text.paragraph import Paragraph
+from lxml import etree
 
 logger = logging.getLogger(__name__)
 
+# 按(路径, 大小, 修改时间)缓存的图片文件SHA-1数量上限
+FILE_DIGEST_CACHE_SIZE = 512
+
+# 图片相关XPath用到的命名空间
+_NS = {prefix: nsmap[prefix] for prefix in ('w', 'a', 'pic', 'wp', 'r')}
+
+# 预编译的XPath表达式，避免每次调用时重新解析
+# 正文段落中直接包含图片的run，按文档顺序返回，与遍历document.paragraphs及其runs的结果一致
+_IMAGE_RUNS_XPATH = etree.XPath('./w:p/w:r[.//a:blip]', namespaces=_NS)
+_COUNT_IMAGE_RUNS_XPATH = etree.XPath('count(./w:p/w:r[.//a:blip])', namespaces=_NS)
+# 上述每个图片run中的第一个wp:extent
+_IMAGE_EXTENTS_XPATH = etree.XPath(
+    './w:p/w:r[.//a:blip]/descendant::wp:extent[1]', namespaces=_NS
+)
+
+# 在单个run内查找元素时用iter()按标签遍历，找到第一个即停止
+_W_P = qn('w:p')
+_PIC_PIC = qn('pic:pic')
+_A_BLIP = qn('a:blip')
+_W_DRAWING = qn('w:drawing')
+_WP_EXTENT = qn('wp:extent')
+_EMBED_ATTR = qn('r:embed')
+
+# 各长度单位对应的EMU数
+_EMU_PER_INCH = 914400
+_EMU_PER_CM = 360000
+_EMU_PER_PT = 12700
+_EMU_PER_PX_96DPI = 9525  # 假设96 DPI
+
+# 尺寸字符串的单位后缀，无后缀时当作英寸
+_SIZE_UNITS = (
+    ('cm', _EMU_PER_CM),
+    ('in', _EMU_PER_INCH),
+    ('"', _EMU_PER_INCH),
+    ('pt', _EMU_PER_PT),
+    ('px', _EMU_PER_PX_96DPI),
+)
+
+
+# 图片段落对齐方式
+_ALIGNMENT_MAP = {
+    "left": WD_PARAGRAPH_ALIGNMENT.LEFT,
+    "center": WD_PARAGRAPH_ALIGNMENT.CENTER,
+    "right": WD_PARAGRAPH_ALIGNMENT.RIGHT
+}
+
+# 图片内容类型到文件扩展名的映射
+_CT_TO_EXT = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/pjpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/bmp': '.bmp',
+    'image/x-ms-bmp': '.bmp',
+    'image/tiff': '.tiff',
+}
+
+# 文档根元素 -> (正文子元素数量, 图片run列表)，文档释放后自动清除
+_IMAGE_CACHE: "WeakKeyDictionary[etree._Element, Tuple[int, List[Tuple[etree._Element, etree._Element]]]]" = WeakKeyDictionary()
+
+
+def _iter_image_runs(document: Document) -> List[Tuple[etree._Element, etree._Element]]:
+    """
+    找出文档中所有图片run，返回(段落元素, run元素)列表
+    
+    结果按文档缓存，正文子元素数量不变且缓存的元素仍在原位置时直接复用，
+    返回的列表不可修改
+    """
+    body = document.element.body
+    cached = _IMAGE_CACHE.get(document.element)
+    if cached is not None:
+        child_count, image_runs = cached
+        if child_count == len(body) and all(
+            r.getparent() is p and p.getparent() is body for p, r in image_runs
+        ):
+            return image_runs
+    
+    image_runs = [(r.getparent(), r) for r in _IMAGE_RUNS_XPATH(body)]
+    _IMAGE_CACHE[document.element] = (len(body), image_runs)
+    return image_runs
+
+
+def _ext_for(content_type: str) -> str:
+    """根据图片部件的内容类型确定文件扩展名，未知类型返回.bin"""
+    return _CT_TO_EXT.get(content_type.split(';', 1)[0].strip().lower(), '.bin')
+
+
+def _size_to_emu(size: Union[str, float, int]) -> int:
+    """
+    解析尺寸为EMU整数
+    
+    Parameters:
+    - size: 尺寸字符串("5cm", "2in", "72pt", "96px")或数值(英寸)
+    
+    Returns:
+    - EMU数值
+    """
+    if isinstance(size, (int, float)):
+        return round(size * _EMU_PER_INCH)
+    return _size_str_to_emu(str(size))
+
+
+@lru_cache(maxsize=256)
+def _size_str_to_emu(size_str: str) -> int:
+    """解析带单位的尺寸字符串，按单位直接换算为EMU；常用尺寸会被反复传入，结果按字符串缓存"""
+    size_str = size_str.lower().strip()
+    
+    for suffix, emu_per_unit in _SIZE_UNITS:
+        if size_str.endswith(suffix):
+            return round(float(size_str[:-len(suffix)]) * emu_per_unit)
+    # 默认当作英寸
+    return round(float(size_str) * _EMU_PER_INCH)
+
+
+def _write_image_file(path: str, data: bytes):
+    """图片数据已完整在内存中，不经过Python缓冲层，直接以尽量少的write调用写入文件"""
+    view = memoryview(data)
+    with open(path, 'wb', buffering=0) as f:
+        while view:
+            view = view[f.write(view):]
+
+
+def _stat_image(image_path: str) -> Tuple[Optional[os.stat_result], Optional[str]]:
+    """
+    获取图片文件状态，一次系统调用同时完成存在性检查
+    
+    Returns:
+    - (文件状态, None)，文件不存在或为空时返回(None, 错误消息)
+    """
+    try:
+        st = os.stat(image_path)
+    except OSError:
+        return None, f"图片文件不存在: {image_path}"
+    if not st.st_size:
+        return None, f"图片文件为空: {image_path}"
+    return st, None
+
+
+def _read_stream(stream: BinaryIO) -> bytes:
+    """读取文件对象中的全部图片数据"""
+    stream.seek(0)
+    return stream.read()
+
+
+def _invalidate_image_cache(document: Document):
+    """文档中的图片有增删时清除缓存"""
+    _IMAGE_CACHE.pop(document.element, None)
+
+
+class ImageCache:
+    """
+    图片部件缓存
+    
+    python-docx每次添加图片都会读取并哈希图片文件，再逐个计算包中已有图片的SHA-1来查找重复，
+    添加N张图片的开销随N平方增长。这里为每个包维护SHA-1到图片部件的映射，并按
+    (路径, 大小, 修改时间)缓存文件的SHA-1，同一文件未变化时无需再次读取
+    """
+    
+    def __init__(self, max_file_digests: int = FILE_DIGEST_CACHE_SIZE):
+        self._lock = threading.Lock()
+        # 包 -> (SHA-1到图片部件的映射, 已登记部件的id集合)
+        self._packages: "WeakKeyDictionary[Any, Tuple[Dict[str, Any], set]]" = WeakKeyDictionary()
+        self._file_digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._max_file_digests = max_file_digests
+    
+    def _package_parts(self, package) -> Dict[str, Any]:
+        """返回包的SHA-1映射，登记通过其他途径新加入包的图片部件"""
+        entry = self._packages.get(package)
+        if entry is None:
+            entry = ({}, set())
+            self._packages[package] = entry
+        by_sha1, known = entry
+        if len(known) != len(package.image_parts):
+            for image_part in package.image_parts:
+                if id(image_part) not in known:
+                    known.add(id(image_part))
+                    by_sha1.setdefault(image_part.sha1, image_part)
+        return by_sha1
+    
+    def _add_part(self, package, by_sha1: Dict[str, Any], image: Image):
+        """查找或新建图片部件并登记到映射中"""
+        image_part = by_sha1.get(image.sha1)
+        if image_part is None:
+            image_part = package.image_parts._add_image_part(image)
+            by_sha1[image.sha1] = image_part
+            self._packages[package][1].add(id(image_part))
+        return image_part
+    
+    def get_or_add(self, document: Document, image: Union[str, bytes], st: Optional[os.stat_result] = None):
+        """
+        返回文档包中与图片内容相同的图片部件，不存在时新建
+        
+        Parameters:
+        - document: docx文档对象
+        - image: 图片文件路径或图片数据
+        - st: 调用方已取得的图片文件状态，None时重新获取
+        
+        Returns:
+        - 图片部件
+        """
+        package = document.part.package
+        with self._lock:
+            by_sha1 = self._package_parts(package)
+            
+            if isinstance(image, bytes):
+                return self._add_part(package, by_sha1, Image.from_blob(image))
+            
+            if st is None:
+                st = os.stat(image)
+            key = (image, st.st_size, st.st_mtime_ns)
+            digest = self._file_digests.get(key)
+            if digest is not None:
+                self._file_digests.move_to_end(key)
+                image_part = by_sha1.get(digest)
+                if image_part is not None:
+                    return image_part
+            
+            loaded = Image.from_file(image)
+            self._file_digests[key] = loaded.sha1
+            if len(self._file_digests) > self._max_file_digests:
+                self._file_digests.popitem(last=False)
+            return self._add_part(package, by_sha1, loaded)
+
+
+_IMAGE_PART_CACHE = ImageCache()
+
+
+def _add_picture(document: Document, run, image: Union[str, bytes], width=None, height=None,
+                 shape_id=None, st: Optional[os.stat_result] = None):
+    """
+    通过图片部件缓存向run中添加图片，效果与run.add_picture相同
+    
+    Parameters:
+    - shape_id: 形状ID，None时扫描文档取下一个可用ID
+    - st: 图片文件状态，传给ImageCache.get_or_add
+    """
+    part = document.part
+    image_part = _IMAGE_PART_CACHE.get_or_add(document, image, st)
+    rId = part.relate_to(image_part, RT.IMAGE)
+    # 尺寸为0时与未指定相同，按图片原始尺寸及宽高比处理
+    cx, cy = image_part.image.scaled_dimensions(width or None, height or None)
+    if shape_id is None:
+        shape_id = part.next_id
+    inline = CT_Inline.new_pic_inline(shape_id, rId, image_part.image.filename, cx, cy)
+    run._r.add_drawing(inline)
+
+
 class ImageProcessor:
     """图片处理器，提供图片相关的所有操作"""
     
     @staticmethod
     def add_image(
         document: Document,
-        image_path: str,
+        image_path: Union[str, BinaryIO],
         width: Optional[Union[float, str]] = None,
         height: Optional[Union[float, str]] = None,
         alignment: str = "left",
@@ -35,7 +291,7 @@ class ImageProcessor:
         
         Parameters:
         - document: docx文档对象
-        - image_path: 图片文件路径
+        - image_path: 图片文件路径，或包含图片数据的文件对象
         - width: 图片宽度，支持数字(英寸)或字符串("5cm", "2in")
         - height: 图片高度，支持数字(英寸)或字符串("5cm", "2in")
         - alignment: 对齐方式 ("left", "center", "right")
@@ -45,57 +301,132 @@ class ImageProcessor:
         - 操作结果消息
         """
         try:
-            if not os.path.exists(image_path):
-                return f"图片文件不存在: {image_path}"
+            st = None
+            if isinstance(image_path, str):
+                st, error = _stat_image(image_path)
+                if error:
+                    return error
+                image_name = os.path.basename(image_path)
+            else:
+                image_name = os.path.basename(getattr(image_path, "name", "") or "图片数据")
             
             # 确定插入位置
             if paragraph_index is not None:
-                if paragraph_index < 0 or paragraph_index > len(document.paragraphs):
+                # 只取一次正文段落元素，不构造段落对象
+                paragraph_elements = list(document.element.body.iterchildren(_W_P))
+                if paragraph_index < 0 or paragraph_index > len(paragraph_elements):
                     return f"段落索引超出范围: {paragraph_index}"
                 
                 # 在指定位置插入新段落
-                if paragraph_index == len(document.paragraphs):
+                if paragraph_index == len(paragraph_elements):
                     paragraph = document.add_paragraph()
                 else:
-                    # 在指定段落前插入
-                    p = document.paragraphs[paragraph_index]._element
+                    # 在指定段落前插入，直接包装新插入的段落元素
                     new_p = OxmlElement("w:p")
-                    p.addprevious(new_p)
-                    paragraph = document.paragraphs[paragraph_index]
+                    paragraph_elements[paragraph_index].addprevious(new_p)
+                    paragraph = Paragraph(new_p, document._body)
             else:
                 paragraph = document.add_paragraph()
             
             # 设置段落对齐
-            alignment_map = {
-                "left": WD_PARAGRAPH_ALIGNMENT.LEFT,
-                "center": WD_PARAGRAPH_ALIGNMENT.CENTER,
-                "right": WD_PARAGRAPH_ALIGNMENT.RIGHT
-            }
-            paragraph.alignment = alignment_map.get(alignment, WD_PARAGRAPH_ALIGNMENT.LEFT)
+            paragraph.alignment = _ALIGNMENT_MAP.get(alignment, WD_PARAGRAPH_ALIGNMENT.LEFT)
             
-            # 添加图片
-            run = paragraph.runs[0] if paragraph.runs else paragraph.add_run()
+            # 添加图片，目标段落总是新建的空段落，直接添加run
+            run = paragraph.add_run()
             
             # 解析尺寸参数
-            width_inches = ImageProcessor._parse_size(width) if width else None
-            height_inches = ImageProcessor._parse_size(height) if height else None
+            width_emu = _size_to_emu(width) if width else None
+            height_emu = _size_to_emu(height) if height else None
             
             # 插入图片
-            if width_inches and height_inches:
-                run.add_picture(image_path, width=Inches(width_inches), height=Inches(height_inches))
-            elif width_inches:
-                run.add_picture(image_path, width=Inches(width_inches))
-            elif height_inches:
-                run.add_picture(image_path, height=Inches(height_inches))
-            else:
-                run.add_picture(image_path)
+            image = image_path if isinstance(image_path, str) else _read_stream(image_path)
+            _add_picture(
+                document, run, image,
+                width_emu,
+                height_emu,
+                st=st
+            )
             
-            return f"图片已添加: {os.path.basename(image_path)}"
+            _invalidate_image_cache(document)
+            return f"图片已添加: {image_name}"
             
         except Exception as e:
             logger.error(f"添加图片失败: {e}")
             return f"添加图片失败: {str(e)}"
     
+    @staticmethod
+    def add_images(document: Document, entries: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量向文档末尾添加图片
+        
+        图片部件经ImageCache查找，形状ID只扫描一次文档后递增分配，
+        新段落全部生成后再一起插入正文
+        
+        Parameters:
+        - document: docx文档对象
+        - entries: 图片列表，每项为包含image_path及可选width、height、alignment的字典，
+          各字段含义同add_image
+        
+        Returns:
+        - 每张图片的操作结果消息
+        """
+        results = []
+        new_paragraphs = []
+        
+        try:
+            shape_id = document.part.next_id
+        except Exception as e:
+            logger.error(f"批量添加图片失败: {e}")
+            return [f"添加图片失败: {str(e)}"] * len(entries)
+        
+        for entry in entries:
+            image_path = entry.get("image_path")
+            try:
+                if not isinstance(image_path, str):
+                    results.append(f"图片文件不存在: {image_path}")
+                    continue
+                st, error = _stat_image(image_path)
+                if error:
+                    results.append(error)
+                    continue
+                
+                # 解析尺寸参数
+                width, height = entry.get("width"), entry.get("height")
+                width_emu = _size_to_emu(width) if width else None
+                height_emu = _size_to_emu(height) if height else None
+                
+                paragraph = Paragraph(OxmlElement("w:p"), document._body)
+                paragraph.alignment = _ALIGNMENT_MAP.get(
+                    entry.get("alignment", "left"), WD_PARAGRAPH_ALIGNMENT.LEFT
+                )
+                _add_picture(
+                    document, paragraph.add_run(), image_path,
+                    width_emu,
+                    height_emu,
+                    shape_id,
+                    st
+                )
+                shape_id += 1
+                new_paragraphs.append(paragraph._p)
+                results.append(f"图片已添加: {os.path.basename(image_path)}")
+                
+            except Exception as e:
+                logger.error(f"添加图片失败: {e}")
+                results.append(f"添加图片失败: {str(e)}")
+        
+        if new_paragraphs:
+            # 与document.add_paragraph一致，插入到节属性之前
+            body = document.element.body
+            sectPr = body.sectPr
+            if sectPr is not None:
+                for p in new_paragraphs:
+                    sectPr.addprevious(p)
+            else:
+                body.extend(new_paragraphs)
+            _invalidate_image_cache(document)
+        
+        return results
+    
     @staticmethod
     def extract_image_to_local(
         document: Document,
@@ -117,11 +448,7 @@ class ImageProcessor:
         """
         try:
             # 查找所有图片
-            image_runs = []
-            for paragraph in document.paragraphs:
-                for run in paragraph.runs:
-                    if run._element.xpath('.//a:blip'):
-                        image_runs.append((paragraph, run))
+            image_runs = _iter_image_runs(document)
             
             if not image_runs:
                 return "文档中没有找到图片"
@@ -133,13 +460,13 @@ class ImageProcessor:
             os.makedirs(output_dir, exist_ok=True)
             
             # 获取图片数据
-            paragraph, run = image_runs[image_index]
+            _, run_element = image_runs[image_index]
             
             # 从run中提取图片
-            for shape in run._element.xpath('.//pic:pic'):
+            for shape in run_element.iter(_PIC_PIC):
                 # 获取图片关系ID
-                blip = shape.xpath('.//a:blip')[0]
-                r_embed = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
+                blip = next(shape.iter(_A_BLIP))
+                r_embed = blip.get(_EMBED_ATTR)
                 
                 if r_embed:
                     # 获取图片数据
@@ -147,19 +474,7 @@ class ImageProcessor:
                     image_data = image_part.blob
                     
                     # 确定文件扩展名
-                    content_type = image_part.content_type
-                    if 'jpeg' in content_type or 'jpg' in content_type:
-                        ext = '.jpg'
-                    elif 'png' in content_type:
-                        ext = '.png'
-                    elif 'gif' in content_type:
-                        ext = '.gif'
-                    elif 'bmp' in content_type:
-                        ext = '.bmp'
-                    elif 'tiff' in content_type:
-                        ext = '.tiff'
-                    else:
-                        ext = '.bin'
+                    ext = _ext_for(image_part.content_type)
                     
                     # 生成文件名
                     if filename is None:
@@ -169,8 +484,7 @@ class ImageProcessor:
                     
                     # 保存图片
                     output_path = os.path.join(output_dir, filename)
-                    with open(output_path, 'wb') as f:
-                        f.write(image_data)
+                    _write_image_file(output_path, image_data)
                     
                     return f"图片已提取到: {output_path}"
             
@@ -188,6 +502,9 @@ class ImageProcessor:
         """
         将文档中的所有图片提取到本地文件夹
         
+        只提取正文中仍被引用的图片，文件名中的序号与extract_image_to_local等方法的图片索引一致；
+        同一图片在文档中多次出现时只在第一次出现的索引处提取一次
+        
         Parameters:
         - document: docx文档对象
         - output_dir: 输出目录
@@ -197,11 +514,7 @@ class ImageProcessor:
         """
         try:
             # 查找所有图片
-            image_runs = []
-            for paragraph in document.paragraphs:
-                for run in paragraph.runs:
-                    if run._element.xpath('.//a:blip'):
-                        image_runs.append((paragraph, run))
+            image_runs = _iter_image_runs(document)
             
             if not image_runs:
                 return "文档中没有找到图片"
@@ -209,42 +522,33 @@ class ImageProcessor:
             # 创建输出目录
             os.makedirs(output_dir, exist_ok=True)
             
+            related_parts = document.part.related_parts
+            extracted_parts = set()
             extracted_count = 0
             
             # 提取每张图片
-            for img_idx, (paragraph, run) in enumerate(image_runs):
-                for shape in run._element.xpath('.//pic:pic'):
-                    blip = shape.xpath('.//a:blip')[0]
-                    r_embed = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
-                    
-                    if r_embed:
-                        image_part = document.part.related_parts[r_embed]
-                        image_data = image_part.blob
-                        
-                        # 确定文件扩展名
-                        content_type = image_part.content_type
-                        if 'jpeg' in content_type or 'jpg' in content_type:
-                            ext = '.jpg'
-                        elif 'png' in content_type:
-                            ext = '.png'
-                        elif 'gif' in content_type:
-                            ext = '.gif'
-                        elif 'bmp' in content_type:
-                            ext = '.bmp'
-                        elif 'tiff' in content_type:
-                            ext = '.tiff'
-                        else:
-                            ext = '.bin'
-                        
-                        # 生成文件名
-                        filename = f"extracted_image_{img_idx}{ext}"
-                        output_path = os.path.join(output_dir, filename)
-                        
-                        # 保存图片
-                        with open(output_path, 'wb') as f:
-                            f.write(image_data)
-                        
-                        extracted_count += 1
+            for img_idx, (_, run_element) in enumerate(image_runs):
+                blip = next(run_element.iter(_A_BLIP))
+                r_embed = blip.get(_EMBED_ATTR)
+                if not r_embed:
+                    continue
+                
+                image_part = related_parts[r_embed]
+                if image_part in extracted_parts:
+                    continue
+                extracted_parts.add(image_part)
+                
+                # 确定文件扩展名
+                ext = _ext_for(image_part.content_type)
+                
+                # 生成文件名
+                filename = f"extracted_image_{img_idx}{ext}"
+                output_path = os.path.join(output_dir, filename)
+                
+                # 保存图片
+                _write_image_file(output_path, image_part.blob)
+                
+                extracted_count += 1
             
             return f"成功提取 {extracted_count} 张图片到: {output_dir}"
             
@@ -279,11 +583,7 @@ class ImageProcessor:
         """
         try:
             # 从源文档中提取图片
-            image_runs = []
-            for paragraph in source_document.paragraphs:
-                for run in paragraph.runs:
-                    if run._element.xpath('.//a:blip'):
-                        image_runs.append((paragraph, run))
+            image_runs = _iter_image_runs(source_document)
             
             if not image_runs:
                 return "源文档中没有找到图片"
@@ -292,54 +592,25 @@ class ImageProcessor:
                 return f"图片索引超出范围: {image_index}，源文档中共有 {len(image_runs)} 张图片"
             
             # 获取图片数据
-            paragraph, run = image_runs[image_index]
+            _, run_element = image_runs[image_index]
             
             # 从run中提取图片
-            for shape in run._element.xpath('.//pic:pic'):
-                blip = shape.xpath('.//a:blip')[0]
-                r_embed = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
+            for shape in run_element.iter(_PIC_PIC):
+                blip = next(shape.iter(_A_BLIP))
+                r_embed = blip.get(_EMBED_ATTR)
                 
                 if r_embed:
                     image_part = source_document.part.related_parts[r_embed]
                     image_data = image_part.blob
                     
                     # 确定文件扩展名
-                    content_type = image_part.content_type
-                    if 'jpeg' in content_type or 'jpg' in content_type:
-                        ext = '.jpg'
-                    elif 'png' in content_type:
-                        ext = '.png'
-                    elif 'gif' in content_type:
-                        ext = '.gif'
-                    elif 'bmp' in content_type:
-                        ext = '.bmp'
-                    elif 'tiff' in content_type:
-                        ext = '.tiff'
-                    else:
-                        ext = '.bin'
-                    
-                    # 创建临时文件
-                    import tempfile
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as temp_file:
-                        temp_file.write(image_data)
-                        temp_path = temp_file.name
+                    ext = _ext_for(image_part.content_type)
                     
-                    try:
-                        # 将图片添加到目标文档
-                        result = ImageProcessor.add_image(
-                            target_document, temp_path, width, height, alignment, paragraph_index
-                        )
-                        
-                        # 清理临时文件
-                        os.unlink(temp_path)
-                        
-                        return f"图片移动成功: {result}"
-                        
-                    except Exception as e:
-                        # 清理临时文件
-                        if os.path.exists(temp_path):
-                            os.unlink(temp_path)
-                        raise e
+                    # 将图片添加到目标文档
+                    result = ImageProcessor._copy_image_bytes_to_document(
+                        target_document, image_data, ext, width, height, alignment, paragraph_index
+                    )
+                    return f"图片移动成功: {result}"
             
             return "无法提取图片数据"
             
@@ -374,11 +645,7 @@ class ImageProcessor:
         """
         try:
             # 从源文档中提取图片
-            image_runs = []
-            for paragraph in source_document.paragraphs:
-                for run in paragraph.runs:
-                    if run._element.xpath('.//a:blip'):
-                        image_runs.append((paragraph, run))
+            image_runs = _iter_image_runs(source_document)
             
             if not image_runs:
                 return "源文档中没有找到图片"
@@ -387,54 +654,25 @@ class ImageProcessor:
                 return f"图片索引超出范围: {image_index}，源文档中共有 {len(image_runs)} 张图片"
             
             # 获取图片数据
-            paragraph, run = image_runs[image_index]
+            _, run_element = image_runs[image_index]
             
             # 从run中提取图片
-            for shape in run._element.xpath('.//pic:pic'):
-                blip = shape.xpath('.//a:blip')[0]
-                r_embed = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
+            for shape in run_element.iter(_PIC_PIC):
+                blip = next(shape.iter(_A_BLIP))
+                r_embed = blip.get(_EMBED_ATTR)
                 
                 if r_embed:
                     image_part = source_document.part.related_parts[r_embed]
                     image_data = image_part.blob
                     
                     # 确定文件扩展名
-                    content_type = image_part.content_type
-                    if 'jpeg' in content_type or 'jpg' in content_type:
-                        ext = '.jpg'
-                    elif 'png' in content_type:
-                        ext = '.png'
-                    elif 'gif' in content_type:
-                        ext = '.gif'
-                    elif 'bmp' in content_type:
-                        ext = '.bmp'
-                    elif 'tiff' in content_type:
-                        ext = '.tiff'
-                    else:
-                        ext = '.bin'
+                    ext = _ext_for(image_part.content_type)
                     
-                    # 创建临时文件
-                    import tempfile
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as temp_file:
-                        temp_file.write(image_data)
-                        temp_path = temp_file.name
-                    
-                    try:
-                        # 将图片添加到目标文档
-                        result = ImageProcessor.add_image(
-                            target_document, temp_path, width, height, alignment, paragraph_index
-                        )
-                        
-                        # 清理临时文件
-                        os.unlink(temp_path)
-                        
-                        return f"图片复制成功: {result}"
-                        
-                    except Exception as e:
-                        # 清理临时文件
-                        if os.path.exists(temp_path):
-                            os.unlink(temp_path)
-                        raise e
+                    # 将图片添加到目标文档
+                    result = ImageProcessor._copy_image_bytes_to_document(
+                        target_document, image_data, ext, width, height, alignment, paragraph_index
+                    )
+                    return f"图片复制成功: {result}"
             
             return "无法提取图片数据"
             
@@ -442,6 +680,26 @@ class ImageProcessor:
             logger.error(f"复制图片失败: {e}")
             return f"复制图片失败: {str(e)}"
     
+    @staticmethod
+    def _copy_image_bytes_to_document(
+        target_document: Document,
+        image_data: bytes,
+        ext: str,
+        width: Optional[Union[float, str]],
+        height: Optional[Union[float, str]],
+        alignment: str,
+        paragraph_index: Optional[int]
+    ) -> str:
+        """把图片数据直接从内存添加到目标文档，不经过临时文件"""
+        # 不直接把源文档的ImagePart关联到目标文档：两个包中的部件名（如/word/media/image1.png）
+        # 可能相同，保存时会产生重复的zip条目。BytesIO(bytes)读取时不复制数据，
+        # python-docx按SHA-1在目标包中查找相同图片，已有时复用原部件
+        stream = io.BytesIO(image_data)
+        stream.name = f"image{ext}"
+        return ImageProcessor.add_image(
+            target_document, stream, width, height, alignment, paragraph_index
+        )
+    
     @staticmethod
     def resize_image(
         document: Document,
@@ -465,11 +723,7 @@ class ImageProcessor:
         """
         try:
             # 查找所有图片
-            images = []
-            for paragraph in document.paragraphs:
-                for run in paragraph.runs:
-                    if run._element.xpath('.//a:blip'):
-                        images.append(run)
+            images = [run_element for _, run_element in _iter_image_runs(document)]
             
             if not images:
                 return "文档中没有找到图片"
@@ -477,34 +731,32 @@ class ImageProcessor:
             if image_index < 0 or image_index >= len(images):
                 return f"图片索引超出范围: {image_index}，文档中共有 {len(images)} 张图片"
             
-            run = images[image_index]
+            run_element = images[image_index]
             
             # 获取图片元素
-            drawing = run._element.xpath('.//w:drawing')[0]
-            extent = drawing.xpath('.//wp:extent')[0]
+            drawing = next(run_element.iter(_W_DRAWING))
+            extent = next(drawing.iter(_WP_EXTENT))
             
             # 解析新尺寸
             width_emu = None
             height_emu = None
             
             if width:
-                width_inches = ImageProcessor._parse_size(width)
-                width_emu = int(width_inches * 914400)  # 转换为EMU单位
+                width_emu = _size_to_emu(width)
             
             if height:
-                height_inches = ImageProcessor._parse_size(height)
-                height_emu = int(height_inches * 914400)
+                height_emu = _size_to_emu(height)
             
             # 如果需要保持宽高比且只指定了一个尺寸
             if maintain_aspect_ratio:
                 current_width = int(extent.get('cx'))
                 current_height = int(extent.get('cy'))
-                aspect_ratio = current_width / current_height
                 
+                # 整数运算按比例换算，结果不受浮点舍入影响
                 if width_emu and not height_emu:
-                    height_emu = int(width_emu / aspect_ratio)
+                    height_emu = width_emu * current_height // current_width
                 elif height_emu and not width_emu:
-                    width_emu = int(height_emu * aspect_ratio)
+                    width_emu = height_emu * current_width // current_height
             
             # 应用新尺寸
             if width_emu:
@@ -532,11 +784,7 @@ class ImageProcessor:
         """
         try:
             # 查找所有图片
-            image_runs = []
-            for paragraph in document.paragraphs:
-                for run in paragraph.runs:
-                    if run._element.xpath('.//a:blip'):
-                        image_runs.append((paragraph, run))
+            image_runs = _iter_image_runs(document)
             
             if not image_runs:
                 return "文档中没有找到图片"
@@ -544,15 +792,15 @@ class ImageProcessor:
             if image_index < 0 or image_index >= len(image_runs):
                 return f"图片索引超出范围: {image_index}，文档中共有 {len(image_runs)} 张图片"
             
-            paragraph, run = image_runs[image_index]
+            p_element, run_element = image_runs[image_index]
             
             # 删除包含图片的run
-            paragraph._element.remove(run._element)
+            p_element.remove(run_element)
+            _invalidate_image_cache(document)
             
             # 如果段落变空，删除段落
-            if not paragraph.runs:
-                p = paragraph._element
-                p.getparent().remove(p)
+            if p_element.find(qn('w:r')) is None:
+                p_element.getparent().remove(p_element)
             
             return f"图片 {image_index} 已删除"
             
@@ -561,71 +809,110 @@ class ImageProcessor:
             return f"删除图片失败: {str(e)}"
     
     @staticmethod
-    def list_images(document: Document) -> str:
+    def delete_images(document: Document, image_indices: Iterable[int]) -> str:
         """
-        列出文档中的所有图片信息
+        批量删除图片
+        
+        只查找一次图片，按索引从大到小删除，删除前面的图片不影响后面的索引
         
         Parameters:
         - document: docx文档对象
+        - image_indices: 图片索引列表，按删除前的编号
         
         Returns:
-        - 图片信息列表
+        - 操作结果消息
         """
         try:
-            images_info = []
-            image_count = 0
-            
-            for para_idx, paragraph in enumerate(document.paragraphs):
-                for run_idx, run in enumerate(paragraph.runs):
-                    if run._element.xpath('.//a:blip'):
-                        # 获取图片尺寸
-                        drawing = run._element.xpath('.//w:drawing')[0]
-                        extent = drawing.xpath('.//wp:extent')[0]
-                        
-                        width_emu = int(extent.get('cx'))
-                        height_emu = int(extent.get('cy'))
-                        width_inches = width_emu / 914400
-                        height_inches = height_emu / 914400
-                        
-                        images_info.append(f"图片 {image_count}: 段落 {para_idx}, 尺寸 {width_inches:.2f}\" x {height_inches:.2f}\"")
-                        image_count += 1
+            image_runs = _iter_image_runs(document)
             
-            if not images_info:
-                return "文档中没有图片"
+            if not image_runs:
+                return "文档中没有找到图片"
+            
+            indices = set(image_indices)
+            targets = sorted((i for i in indices if 0 <= i < len(image_runs)), reverse=True)
+            invalid = sorted(indices.difference(targets))
             
-            return f"文档中共有 {image_count} 张图片:\n" + "\n".join(images_info)
+            for i in targets:
+                p_element, run_element = image_runs[i]
+                p_element.remove(run_element)
+                
+                # 如果段落变空，删除段落
+                if p_element.find(qn('w:r')) is None:
+                    p_element.getparent().remove(p_element)
+            
+            if targets:
+                _invalidate_image_cache(document)
+            
+            result = f"已删除 {len(targets)} 张图片"
+            if invalid:
+                result += f"，以下索引超出范围: {', '.join(map(str, invalid))}"
+            return result
             
         except Exception as e:
-            logger.error(f"列出图片失败: {e}")
-            return f"列出图片失败: {str(e)}"
+            logger.error(f"批量删除图片失败: {e}")
+            return f"批量删除图片失败: {str(e)}"
     
     @staticmethod
-    def _parse_size(size_str: Union[str, float, int]) -> float:
+    def list_images_lazy(document: Document) -> Iterator[str]:
         """
-        解析尺寸字符串为英寸数值
+        逐条生成文档中的图片信息，调用方只需要前几条时不必处理全部图片
         
         Parameters:
-        - size_str: 尺寸字符串或数值
+        - document: docx文档对象
         
         Returns:
-        - 英寸数值
+        - 图片信息字符串的迭代器
         """
-        if isinstance(size_str, (int, float)):
-            return float(size_str)
-        
-        size_str = str(size_str).lower().strip()
-        
-        if size_str.endswith('cm'):
-            return float(size_str[:-2]) / 2.54
-        elif size_str.endswith('in') or size_str.endswith('"'):
-            return float(size_str.rstrip('in"'))
-        elif size_str.endswith('pt'):
-            return float(size_str[:-2]) / 72
-        elif size_str.endswith('px'):
-            return float(size_str[:-2]) / 96  # 假设96 DPI
-        else:
-            # 默认当作英寸
-            return float(size_str)
+        # 图片和段落都按文档顺序出现，段落序号随图片向前推进，无需预先建立完整映射
+        paragraphs = document.element.body.iterchildren(_W_P)
+        para_idx = -1
+        p_element = None
+        
+        for image_idx, extent in enumerate(_IMAGE_EXTENTS_XPATH(document.element.body)):
+            image_p = next(extent.iterancestors(_W_P))
+            while p_element is not image_p:
+                p_element = next(paragraphs)
+                para_idx += 1
+            
+            width_inches = int(extent.get('cx')) / _EMU_PER_INCH
+            height_inches = int(extent.get('cy')) / _EMU_PER_INCH
+            yield f"图片 {image_idx}: 段落 {para_idx}, 尺寸 {width_inches:.2f}\" x {height_inches:.2f}\""
+    
+    @staticmethod
+    def count_images(document: Document) -> int:
+        """
+        统计文档中的图片数量，不生成图片信息
+        
+        Parameters:
+        - document: docx文档对象
+        
+        Returns:
+        - 图片数量
+        """
+        return int(_COUNT_IMAGE_RUNS_XPATH(document.element.body))
+    
+    @staticmethod
+    def list_images(document: Document) -> str:
+        """
+        列出文档中的所有图片信息
+        
+        Parameters:
+        - document: docx文档对象
+        
+        Returns:
+        - 图片信息列表
+        """
+        try:
+            images_info = list(ImageProcessor.list_images_lazy(document))
+            
+            if not images_info:
+                return "文档中没有图片"
+            
+            return f"文档中共有 {len(images_info)} 张图片:\n" + "\n".join(images_info)
+            
+        except Exception as e:
+            logger.error(f"列出图片失败: {e}")
+            return f"列出图片失败: {str(e)}"
     
     @staticmethod
     def set_image_position(
@@ -650,11 +937,7 @@ class ImageProcessor:
         """
         try:
             # 查找图片
-            image_runs = []
-            for paragraph in document.paragraphs:
-                for run in paragraph.runs:
-                    if run._element.xpath('.//a:blip'):
-                        image_runs.append((paragraph, run))
+            image_runs = _iter_image_runs(document)
             
             if not image_runs:
                 return "文档中没有找到图片"
@@ -662,16 +945,11 @@ class ImageProcessor:
             if image_index < 0 or image_index >= len(image_runs):
                 return f"图片索引超出范围: {image_index}"
             
-            paragraph, run = image_runs[image_index]
+            paragraph = Paragraph(image_runs[image_index][0], document._body)
             
             # 设置段落对齐（用于内联图片）
             if position_type == "inline" and horizontal_position:
-                alignment_map = {
-                    "left": WD_PARAGRAPH_ALIGNMENT.LEFT,
-                    "center": WD_PARAGRAPH_ALIGNMENT.CENTER,
-                    "right": WD_PARAGRAPH_ALIGNMENT.RIGHT
-                }
-                paragraph.alignment = alignment_map.get(horizontal_position, WD_PARAGRAPH_ALIGNMENT.LEFT)
+                paragraph.alignment = _ALIGNMENT_MAP.get(horizontal_position, WD_PARAGRAPH_ALIGNMENT.LEFT)
             
             return f"图片 {image_index} 位置已设置为 {position_type}"
             
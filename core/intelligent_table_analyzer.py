@@ -8,30 +8,275 @@
 import json
 import logging
 import re
-from typing import Dict, List, Optional, Any, Tuple, Set
-from dataclasses import dataclass, asdict
+import sys
+from typing import Dict, List, NamedTuple, Optional, Any, Tuple, Set
+from dataclasses import dataclass, field
 from pathlib import Path
 from docx import Document
 from docx.table import Table
+from docx.oxml.ns import nsmap, qn
+from docx.oxml.simpletypes import ST_Merge
+from lxml import etree
 import difflib
+from functools import lru_cache
+from types import MappingProxyType
+
+try:
+    from rapidfuzz import fuzz, process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
-@dataclass
-class CellPosition:
-    """单元格位置信息"""
+# 相似度匹配阈值，相似度超过该值视为同一字段
+SIMILARITY_THRESHOLD = 0.8
+
+
+def _similarity(text1: str, text2: str) -> float:
+    """计算两个字符串的相似度 (0.0-1.0)，优先使用rapidfuzz，未安装时回退到difflib"""
+    if RAPIDFUZZ_AVAILABLE:
+        return fuzz.ratio(text1, text2) / 100.0
+    return difflib.SequenceMatcher(None, text1, text2).ratio()
+
+
+def _similarity_upper_bound(length1: int, length2: int) -> float:
+    """
+    按长度估计相似度上界：相似度为 2×匹配字符数/(两串长度之和)，匹配字符数不超过较短串的长度，
+    长度相差悬殊时无需构造SequenceMatcher即可排除
+    """
+    return 2.0 * min(length1, length2) / (length1 + length2)
+
+
+# 清理文本时删除的换行字符
+_LINE_BREAKS = str.maketrans('', '', '\n\r')
+
+
+def _clean_text(text: str) -> str:
+    """去除首尾空白和所有换行字符，一次translate代替两次replace"""
+    return text.strip().translate(_LINE_BREAKS)
+
+
+def _containment_confidence(text: str, patterns: List[str]) -> float:
+    """按模式顺序取第一个与文本精确匹配(1.0)或包含匹配(0.9)的模式的置信度，都不匹配返回0.0"""
+    for pattern in patterns:
+        if text == pattern:
+            return 1.0
+        if pattern in text or text in pattern:
+            return 0.9
+    return 0.0
+
+
+def _build_pattern_index(field_patterns: Dict[str, List[str]]) -> Tuple[List[str], List[Tuple[str, int]], Dict[str, Tuple[int, float]]]:
+    """
+    展开字段模式为查找表，字段类型的优先级即其在field_patterns中的顺序
+    
+    Args:
+        field_patterns: 字段类型 -> 模式列表
+        
+    Returns:
+        (字段类型列表, 按优先级排列的(模式, 优先级)列表,
+         模式的所有子串 -> (包含该子串的模式的最高优先级, 该字段类型下的置信度))
+    """
+    field_types = list(field_patterns)
+    pattern_ranks = []
+    substring_ranks = {}
+    for rank, field_type in enumerate(field_types):
+        for pattern in field_patterns[field_type]:
+            pattern_ranks.append((pattern, rank))
+            for start in range(len(pattern)):
+                for end in range(start + 1, len(pattern) + 1):
+                    substring_ranks.setdefault(pattern[start:end], rank)
+    
+    substring_matches = {
+        text: (rank, _containment_confidence(text, field_patterns[field_types[rank]]))
+        for text, rank in substring_ranks.items()
+    }
+    return field_types, pattern_ranks, substring_matches
+
+
+# 常见字段名模式，字段类型按优先级排列；识别结果按文本缓存，因此不可修改
+FIELD_PATTERNS = MappingProxyType({
+    '姓名': ['姓名', '姓  名', '学生姓名', '学生名字', 'name'],
+    '学号': ['学号', '学  号', '学生学号', 'student_id', '学籍号'],
+    '学院': ['学院', '所在学院', '就读学院', '学院名称', 'department'],
+    '专业': ['专业', '专业名称', '所学专业', '专业班别', '专业、班别', 'major'],
+    '班级': ['班级', '班别', '班级名称', 'class'],
+    '实习单位': ['实习单位', '实习公司', '实习企业', '单位名称', 'internship_company'],
+    '实习时间': ['实习时间', '实习期间', '实习日期', '时间', 'internship_period'],
+    '指导教师': ['指导教师', '指导老师', '导师', 'supervisor'],
+    '联系方式': ['联系方式', '联系电话', '手机号码', 'phone'],
+    '地址': ['地址', '家庭地址', '通讯地址', 'address'],
+    '成绩': ['成绩', '分数', '得分', 'grade', 'score'],
+    '评价': ['评价', '评语', '评价内容', 'evaluation'],
+    '日期': ['日期', '时间', '年月日', 'date'],
+    '签名': ['签名', '签字', 'signature'],
+    '盖章': ['盖章', '印章', 'stamp']
+})
+_FIELD_TYPES, _PATTERN_RANKS, _SUBSTRING_MATCHES = _build_pattern_index(FIELD_PATTERNS)
+_ALL_PATTERNS = [pattern for pattern, _ in _PATTERN_RANKS]
+# 相似度匹配时按优先级遍历的(模式, 模式长度, 优先级)，长度预先算好用于上界剪枝
+_PATTERN_LENGTHS = [(pattern, len(pattern), rank) for pattern, rank in _PATTERN_RANKS]
+# 模式 -> 该模式所包含的所有模式（含自身）中的最高优先级
+_CONTAINED_RANKS = {
+    pattern: min(rank for other, rank in _PATTERN_RANKS if other in pattern)
+    for pattern in _ALL_PATTERNS
+}
+# 所有模式合并为一个正则，零宽先行断言让每个位置都尝试匹配，同一位置优先匹配最长的模式；
+# 同一位置开始的较短模式必然包含在最长模式中，其优先级已计入_CONTAINED_RANKS
+_PATTERN_RE = re.compile(
+    '(?=(%s))' % '|'.join(map(re.escape, sorted(_CONTAINED_RANKS, key=len, reverse=True)))
+)
+
+
+@lru_cache(maxsize=4096)
+def _classify_clean_text(clean_text: str) -> Tuple[Optional[str], float]:
+    """
+    按清理后的文本识别字段类型并计算置信度，表格中的字段名常重复出现，结果按文本缓存
+    
+    精确或包含匹配成功时不再做相似度计算；结果与先调用_identify_field_type、
+    再调用_calculate_field_confidence相同
+    """
+    # 检查是否匹配已知字段模式（精确匹配或包含匹配），多个字段类型匹配时取优先级最高的
+    # 文本本身是某个模式的子串时直接查表
+    best_rank, confidence = _SUBSTRING_MATCHES.get(clean_text, (len(_FIELD_TYPES), 0.0))
+    
+    # 模式是文本的子串，一次正则扫描找出文本中出现的所有模式；
+    # 优先级高于查表结果时，文本不等于该类型的任何模式
+    for match in _PATTERN_RE.finditer(clean_text):
+        rank = _CONTAINED_RANKS[match.group(1)]
+        if rank < best_rank:
+            best_rank, confidence = rank, 0.9
+    
+    if best_rank < len(_FIELD_TYPES):
+        return _FIELD_TYPES[best_rank], confidence
+    
+    field_type = _fuzzy_field_type(clean_text)
+    if field_type is None:
+        return None, 0.0
+    return field_type, max(_similarity(clean_text, pattern) for pattern in FIELD_PATTERNS[field_type])
+
+
+def _fuzzy_field_type(clean_text: str) -> Optional[str]:
+    """相似度匹配字段类型，取相似度超过阈值的模式中优先级最高的，仅在精确和包含匹配都失败时使用"""
+    if RAPIDFUZZ_AVAILABLE:
+        # 一次调用比较所有模式，score_cutoff包含阈值本身，需再按严格大于筛选
+        matches = process.extract(
+            clean_text, _ALL_PATTERNS, scorer=fuzz.ratio,
+            score_cutoff=SIMILARITY_THRESHOLD * 100, limit=None
+        )
+        indices = [index for _, score, index in matches if score > SIMILARITY_THRESHOLD * 100]
+        return _FIELD_TYPES[_PATTERN_RANKS[min(indices)][1]] if indices else None
+    
+    text_length = len(clean_text)
+    for pattern, pattern_length, rank in _PATTERN_LENGTHS:
+        if _similarity_upper_bound(text_length, pattern_length) <= SIMILARITY_THRESHOLD:
+            continue
+        if difflib.SequenceMatcher(None, clean_text, pattern).ratio() > SIMILARITY_THRESHOLD:
+            return _FIELD_TYPES[rank]
+    
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _field_confidence(clean_text: str, field_type: str) -> float:
+    """按清理后的文本计算字段识别置信度，结果按(文本, 字段类型)缓存"""
+    patterns = FIELD_PATTERNS.get(field_type, [])
+    
+    text_length = len(clean_text)
+    max_confidence = 0.0
+    for pattern in patterns:
+        if clean_text == pattern:
+            return 1.0  # 完全匹配
+        # 不相等时只有较短的一方可能是另一方的子串，先比较长度再做子串查找
+        pattern_length = len(pattern)
+        if (pattern_length < text_length and pattern in clean_text) or \
+                (text_length < pattern_length and clean_text in pattern):
+            return 0.9  # 包含匹配
+        else:
+            max_confidence = max(max_confidence, _similarity(clean_text, pattern))
+    
+    return max_confidence
+
+
+# 判断可填充时检查的相邻方向 (行偏移, 列偏移)：左（优先检查左侧字段）、右、上、下
+_NEIGHBOR_DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+# 表格各行中的单元格，按行从左到右、从上到下
+_TABLE_CELLS_XPATH = etree.XPath('./w:tr/w:tc', namespaces={'w': nsmap['w']})
+_W_P = qn('w:p')
+
+
+def _table_cell_texts(tbl, column_count: int) -> List[str]:
+    """
+    直接在XML上按布局网格提取表格每个位置的单元格文本，结果与按table._cells逐个读取cell.text.strip()相同
+    
+    合并单元格覆盖的每个网格位置给出相同文本，每个w:tc只提取一次，不创建单元格和段落对象
+    
+    Args:
+        tbl: 表格的w:tbl元素
+        column_count: 网格列数
+        
+    Returns:
+        按行展开的单元格文本列表
+    """
+    texts = []
+    for tc in _TABLE_CELLS_XPATH(tbl):
+        if tc.vMerge == ST_Merge.CONTINUE:
+            # 纵向合并的后续单元格取正上方网格位置的文本
+            for _ in range(tc.grid_span):
+                texts.append(texts[-column_count])
+        else:
+            text = '\n'.join(p.text for p in tc.iterchildren(_W_P)).strip()
+            texts.extend([text] * tc.grid_span)
+    return texts
+
+
+# 填充规则的AI判断指导，按目标单元格是否已有内容取用
+_RIGHT_FILL_GUIDANCE = {
+    False: '右侧单元格为空，可以直接填充',
+    True: '右侧单元格已有内容，AI需要判断是否覆盖现有内容',
+}
+_BELOW_FILL_GUIDANCE = {
+    False: '下方单元格为空，可以直接填充',
+    True: '下方单元格已有内容，AI需要判断是否覆盖现有内容',
+}
+
+
+# 给AI的填写说明，内容固定；只保存不可变的元组，每次分析结果中另建列表和字典，调用方修改结果不会影响之后的分析
+_AI_USAGE_RULES = (
+    '1. 有内容的格子不可以填',
+    '2. 字段名右侧的格子通常填充该字段的数据',
+    '3. 字段名下方的格子也可能填充数据',
+    '4. 优先使用右侧填充规则',
+    '5. 返回格式: {"数据内容": (表格索引, 行索引, 列索引)}'
+)
+_AI_EXAMPLE_FORMAT = (
+    ('张三', (1, 1, 3)),
+    ('2023001234', (1, 2, 3)),
+    ('计算机学院', (1, 1, 5))
+)
+
+
+# 每个表格会创建行数×列数个单元格信息对象，Python 3.10+使用__slots__减少内存占用和属性访问开销
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+class CellPosition(NamedTuple):
+    """单元格位置信息，本身即(表格索引, 行索引, 列索引)元组"""
     table_index: int  # 表格索引
     row_index: int    # 行索引
     col_index: int    # 列索引
     
     def __str__(self):
-        return f"(表格{table_index}, 行{row_index}, 列{col_index})"
+        return f"(表格{self.table_index}, 行{self.row_index}, 列{self.col_index})"
     
     def to_tuple(self) -> Tuple[int, int, int]:
-        """转换为元组格式"""
-        return (self.table_index, self.row_index, self.col_index)
+        """转换为元组格式，位置不可变，直接返回自身"""
+        return self
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class CellInfo:
     """单元格详细信息"""
     position: CellPosition
@@ -41,11 +286,48 @@ class CellInfo:
     is_fillable: bool = False
     field_type: Optional[str] = None  # 字段类型：姓名、学号、学院等
     confidence: float = 0.0  # 识别置信度
-    adjacent_fields: List[str] = None  # 相邻字段信息
+    adjacent_fields: List[str] = field(default_factory=list)  # 相邻字段信息
+
+def _mark_fillable(cells: List[List[CellInfo]]) -> List[CellPosition]:
+    """
+    标记每个单元格是否可填充
+    
+    - 字段名不可填充（让AI自己判断是否修改）
+    - 有内容但不是字段名的单元格允许填充（AI可以判断是否修改）
+    - 空单元格在左、右、上、下任一相邻单元格为字段名时可填充，相邻字段名按此顺序记入adjacent_fields
+    
+    先取出字段名标记网格，邻格检查只读布尔值，只有空单元格需要检查邻格
+    
+    Args:
+        cells: 所有单元格信息 (二维数组: [行][列])，须已完成字段识别
+        
+    Returns:
+        可填充的空单元格位置，按行优先顺序
+    """
+    is_field = [[cell.is_field_name for cell in row] for row in cells]
+    n_rows = len(cells)
+    empty_positions = []
     
-    def __post_init__(self):
-        if self.adjacent_fields is None:
-            self.adjacent_fields = []
+    for row_idx, row in enumerate(cells):
+        field_row = is_field[row_idx]
+        for col_idx, cell in enumerate(row):
+            if field_row[col_idx]:
+                cell.is_fillable = False
+            elif not cell.is_empty:
+                cell.is_fillable = True
+            else:
+                for dr, dc in _NEIGHBOR_DIRECTIONS:
+                    adj_row = row_idx + dr
+                    adj_col = col_idx + dc
+                    if (0 <= adj_row < n_rows and 0 <= adj_col < len(is_field[adj_row])
+                            and is_field[adj_row][adj_col]):
+                        cell.adjacent_fields.append(cells[adj_row][adj_col].text)
+                cell.is_fillable = bool(cell.adjacent_fields)
+                if cell.is_fillable:
+                    empty_positions.append(cell.position)
+    
+    return empty_positions
+
 
 @dataclass
 class TableAnalysisResult:
@@ -65,23 +347,7 @@ class IntelligentTableAnalyzer:
     
     def __init__(self):
         # 常见字段名模式
-        self.field_patterns = {
-            '姓名': ['姓名', '姓  名', '学生姓名', '学生名字', 'name'],
-            '学号': ['学号', '学  号', '学生学号', 'student_id', '学籍号'],
-            '学院': ['学院', '所在学院', '就读学院', '学院名称', 'department'],
-            '专业': ['专业', '专业名称', '所学专业', '专业班别', '专业、班别', 'major'],
-            '班级': ['班级', '班别', '班级名称', 'class'],
-            '实习单位': ['实习单位', '实习公司', '实习企业', '单位名称', 'internship_company'],
-            '实习时间': ['实习时间', '实习期间', '实习日期', '时间', 'internship_period'],
-            '指导教师': ['指导教师', '指导老师', '导师', 'supervisor'],
-            '联系方式': ['联系方式', '联系电话', '手机号码', 'phone'],
-            '地址': ['地址', '家庭地址', '通讯地址', 'address'],
-            '成绩': ['成绩', '分数', '得分', 'grade', 'score'],
-            '评价': ['评价', '评语', '评价内容', 'evaluation'],
-            '日期': ['日期', '时间', '年月日', 'date'],
-            '签名': ['签名', '签字', 'signature'],
-            '盖章': ['盖章', '印章', 'stamp']
-        }
+        self.field_patterns = FIELD_PATTERNS
         
         # 填充规则模板
         self.fill_rule_templates = [
@@ -123,9 +389,11 @@ class IntelligentTableAnalyzer:
         """
         try:
             doc = Document(file_path)
+            # doc.tables每次访问都会重新扫描文档正文，只取一次
+            tables = doc.tables
             results = {
                 'file_path': file_path,
-                'total_tables': len(doc.tables),
+                'total_tables': len(tables),
                 'tables': {},
                 'global_field_map': {},
                 'global_empty_positions': [],
@@ -133,8 +401,8 @@ class IntelligentTableAnalyzer:
             }
             
             # 分析每个表格
-            for table_idx in range(len(doc.tables)):
-                table_result = self.analyze_table(doc, table_idx)
+            for table_idx, table in enumerate(tables):
+                table_result = self.analyze_table(table, table_idx)
                 results['tables'][f'table_{table_idx}'] = table_result
                 
                 # 合并全局信息
@@ -155,34 +423,35 @@ class IntelligentTableAnalyzer:
             logger.error(f"文档分析失败: {e}")
             return {'error': str(e)}
     
-    def analyze_table(self, doc: Document, table_index: int) -> TableAnalysisResult:
+    def analyze_table(self, table: Table, table_index: int) -> TableAnalysisResult:
         """
         分析单个表格
         
         Args:
-            doc: 文档对象
-            table_index: 表格索引
+            table: 表格对象
+            table_index: 表格在文档中的索引，用于单元格坐标
             
         Returns:
             表格分析结果
         """
         try:
-            table = doc.tables[table_index]
             rows = len(table.rows)
             columns = len(table.columns) if table.rows else 0
             
+            # table.cell()每次调用都会重新解析整个表格的单元格网格，这里一次提取全部文本
+            cell_texts = _table_cell_texts(table._tbl, columns)
+            
             # 提取所有单元格信息
             cells = []
             field_positions = {}
-            empty_positions = []
-            fillable_positions = []
+            field_types = set()
             
             for row_idx in range(rows):
                 row_cells = []
+                row_start = row_idx * columns
                 for col_idx in range(columns):
                     position = CellPosition(table_index, row_idx, col_idx)
-                    cell = table.cell(row_idx, col_idx)
-                    cell_text = cell.text.strip()
+                    cell_text = cell_texts[row_start + col_idx]
                     
                     # 创建单元格信息
                     cell_info = CellInfo(
@@ -191,30 +460,31 @@ class IntelligentTableAnalyzer:
                         is_empty=len(cell_text) == 0
                     )
                     
-                    # 分析是否为字段名
-                    field_type = self._identify_field_type(cell_text)
+                    # 分析是否为字段名，单元格文本已去除首尾空白，只需去掉换行
+                    if cell_text:
+                        field_type, confidence = _classify_clean_text(cell_text.translate(_LINE_BREAKS))
+                    else:
+                        field_type, confidence = None, 0.0
                     if field_type:
                         cell_info.is_field_name = True
                         cell_info.field_type = field_type
-                        cell_info.confidence = self._calculate_field_confidence(cell_text, field_type)
+                        cell_info.confidence = confidence
                         field_positions[cell_text] = position
-                    
-                    # 分析是否可填充
-                    cell_info.is_fillable = self._is_fillable_position(cell_info, cells, row_idx, col_idx)
-                    
-                    if cell_info.is_empty and cell_info.is_fillable:
-                        empty_positions.append(position)
-                        fillable_positions.append(position)
+                        field_types.add(field_type)
                     
                     row_cells.append(cell_info)
                 cells.append(row_cells)
             
+            # 分析是否可填充：所有单元格识别完成后再判断，四个方向的相邻单元格都已可用
+            empty_positions = _mark_fillable(cells)
+            fillable_positions = list(empty_positions)
+            
             # 生成填充规则
             fill_rules = self._generate_fill_rules(cells, field_positions)
             
             # 创建分析摘要
             analysis_summary = self._create_analysis_summary(
-                rows, columns, field_positions, empty_positions, fill_rules
+                rows, columns, field_positions, empty_positions, fill_rules, field_types
             )
             
             return TableAnalysisResult(
@@ -233,113 +503,45 @@ class IntelligentTableAnalyzer:
             logger.error(f"表格{table_index}分析失败: {e}")
             raise
     
-    def _identify_field_type(self, text: str) -> Optional[str]:
+    def _classify(self, text: str) -> Tuple[Optional[str], float]:
         """
-        识别文本是否为字段名，并返回字段类型
+        识别文本是否为字段名，一次匹配同时返回字段类型和置信度
         
         Args:
             text: 单元格文本
             
         Returns:
-            字段类型，如果不是字段名则返回None
+            (字段类型, 置信度)，如果不是字段名则返回(None, 0.0)
         """
-        if not text or len(text.strip()) == 0:
-            return None
-        
-        # 清理文本
-        clean_text = text.strip().replace('\n', '').replace('\r', '')
-        
-        # 检查是否匹配已知字段模式
-        for field_type, patterns in self.field_patterns.items():
-            for pattern in patterns:
-                # 精确匹配
-                if clean_text == pattern:
-                    return field_type
-                
-                # 包含匹配
-                if pattern in clean_text or clean_text in pattern:
-                    return field_type
-        
-        # 使用相似度匹配
-        for field_type, patterns in self.field_patterns.items():
-            for pattern in patterns:
-                similarity = difflib.SequenceMatcher(None, clean_text, pattern).ratio()
-                if similarity > 0.8:  # 80%相似度阈值
-                    return field_type
-        
-        return None
+        clean_text = _clean_text(text) if text else ''
+        if not clean_text:
+            return None, 0.0
+        return _classify_clean_text(clean_text)
     
-    def _calculate_field_confidence(self, text: str, field_type: str) -> float:
+    def _identify_field_type(self, text: str) -> Optional[str]:
         """
-        计算字段识别置信度
+        识别文本是否为字段名，并返回字段类型
         
         Args:
             text: 单元格文本
-            field_type: 识别的字段类型
             
         Returns:
-            置信度分数 (0.0-1.0)
+            字段类型，如果不是字段名则返回None
         """
-        clean_text = text.strip().replace('\n', '').replace('\r', '')
-        patterns = self.field_patterns.get(field_type, [])
-        
-        max_confidence = 0.0
-        for pattern in patterns:
-            if clean_text == pattern:
-                return 1.0  # 完全匹配
-            elif pattern in clean_text or clean_text in pattern:
-                return 0.9  # 包含匹配
-            else:
-                similarity = difflib.SequenceMatcher(None, clean_text, pattern).ratio()
-                max_confidence = max(max_confidence, similarity)
-        
-        return max_confidence
+        return self._classify(text)[0]
     
-    def _is_fillable_position(self, cell_info: CellInfo, cells: List[List[CellInfo]], 
-                            row_idx: int, col_idx: int) -> bool:
+    def _calculate_field_confidence(self, text: str, field_type: str) -> float:
         """
-        判断位置是否可填充
+        计算字段识别置信度
         
         Args:
-            cell_info: 当前单元格信息
-            cells: 所有单元格信息 (二维数组: [行][列])
-            row_idx: 行索引 (相对于当前表格)
-            col_idx: 列索引 (相对于当前表格)
+            text: 单元格文本
+            field_type: 识别的字段类型
             
         Returns:
-            是否可填充
+            置信度分数 (0.0-1.0)
         """
-        # 如果单元格是字段名，则不可填充（让AI自己判断是否修改）
-        if cell_info.is_field_name:
-            return False
-        
-        # 如果单元格为空，则检查是否有相邻字段来决定是否可填充
-        if cell_info.is_empty:
-            # 检查相邻单元格是否有字段名
-            has_adjacent_field = False
-            directions = [
-                (0, -1),  # 左 - 优先检查左侧字段
-                (0, 1),   # 右
-                (-1, 0),  # 上
-                (1, 0),   # 下
-            ]
-            
-            for dr, dc in directions:
-                adj_row = row_idx + dr
-                adj_col = col_idx + dc
-                
-                # 检查边界 - 使用二维坐标系统
-                if (0 <= adj_row < len(cells) and 
-                    0 <= adj_col < len(cells[adj_row])):
-                    adj_cell = cells[adj_row][adj_col]
-                    if adj_cell.is_field_name:
-                        has_adjacent_field = True
-                        cell_info.adjacent_fields.append(adj_cell.text)
-            
-            return has_adjacent_field
-        
-        # 如果单元格有内容但不是字段名，则允许填充（AI可以判断是否修改）
-        return True
+        return _field_confidence(_clean_text(text), field_type)
     
     def _generate_fill_rules(self, cells: List[List[CellInfo]], 
                            field_positions: Dict[str, CellPosition]) -> List[Dict[str, Any]]:
@@ -354,64 +556,72 @@ class IntelligentTableAnalyzer:
             填充规则列表
         """
         rules = []
-        used_positions = set()  # 记录已使用的填充位置，避免重复
+        n_rows = len(cells)
+        n_cols = len(cells[0]) if cells else 0
+        # 记录已使用的填充位置（按 行*列数+列 索引），避免重复；同一次调用只涉及一个表格
+        used_positions = bytearray(n_rows * n_cols)
         
         for field_name, position in field_positions.items():
+            table_idx = position.table_index
             row_idx = position.row_index
             col_idx = position.col_index
+            row = cells[row_idx]
             
             # 优先检查右侧是否可以填充
-            if col_idx + 1 < len(cells[row_idx]):
-                right_cell = cells[row_idx][col_idx + 1]
-                right_pos = (position.table_index, row_idx, col_idx + 1)
+            if col_idx + 1 < len(row):
+                right_cell = row[col_idx + 1]
+                right_pos = (table_idx, row_idx, col_idx + 1)
+                right_key = row_idx * n_cols + col_idx + 1
                 
                 # 如果右侧单元格可填充且未被使用
-                if right_cell.is_fillable and right_pos not in used_positions:
+                if right_cell.is_fillable and not used_positions[right_key]:
                     # 检查右侧单元格是否已有内容
                     has_content = not right_cell.is_empty
                     confidence = 0.9 if not has_content else 0.7  # 有内容时降低置信度
                     
                     rules.append({
                         'field_name': field_name,
-                        'field_position': position.to_tuple(),
+                        'field_position': (table_idx, row_idx, col_idx),
                         'fill_position': right_pos,
                         'rule_type': 'field_right',
                         'description': f'字段"{field_name}"右侧填充',
                         'confidence': confidence,
                         'has_existing_content': has_content,
-                        'ai_guidance': f'右侧单元格{"已有内容" if has_content else "为空"}，{"AI需要判断是否覆盖现有内容" if has_content else "可以直接填充"}'
+                        'ai_guidance': _RIGHT_FILL_GUIDANCE[has_content]
                     })
-                    used_positions.add(right_pos)
+                    used_positions[right_key] = 1
                     continue  # 优先使用右侧填充，跳过下方填充
             
             # 如果右侧不可用，检查下方是否可以填充
-            if row_idx + 1 < len(cells):
+            if row_idx + 1 < n_rows:
                 below_cell = cells[row_idx + 1][col_idx]
-                below_pos = (position.table_index, row_idx + 1, col_idx)
+                below_pos = (table_idx, row_idx + 1, col_idx)
+                below_key = (row_idx + 1) * n_cols + col_idx
                 
-                if below_cell.is_fillable and below_pos not in used_positions:
+                if below_cell.is_fillable and not used_positions[below_key]:
                     # 检查下方单元格是否已有内容
                     has_content = not below_cell.is_empty
                     confidence = 0.8 if not has_content else 0.6  # 有内容时降低置信度
                     
                     rules.append({
                         'field_name': field_name,
-                        'field_position': position.to_tuple(),
+                        'field_position': (table_idx, row_idx, col_idx),
                         'fill_position': below_pos,
                         'rule_type': 'field_below',
                         'description': f'字段"{field_name}"下方填充',
                         'confidence': confidence,
                         'has_existing_content': has_content,
-                        'ai_guidance': f'下方单元格{"已有内容" if has_content else "为空"}，{"AI需要判断是否覆盖现有内容" if has_content else "可以直接填充"}'
+                        'ai_guidance': _BELOW_FILL_GUIDANCE[has_content]
                     })
-                    used_positions.add(below_pos)
+                    used_positions[below_key] = 1
         
         return rules
     
     def _create_analysis_summary(self, rows: int, columns: int, 
                                field_positions: Dict[str, CellPosition],
                                empty_positions: List[CellPosition],
-                               fill_rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+                               fill_rules: List[Dict[str, Any]],
+                               field_types: Set[str]) -> Dict[str, Any]:
         """
         创建分析摘要
         
@@ -421,6 +631,7 @@ class IntelligentTableAnalyzer:
             field_positions: 字段位置
             empty_positions: 空位
             fill_rules: 填充规则
+            field_types: 识别单元格时已得到的字段类型集合
             
         Returns:
             分析摘要
@@ -429,9 +640,9 @@ class IntelligentTableAnalyzer:
             'table_size': f'{rows}行 x {columns}列',
             'field_count': len(field_positions),
             'empty_count': len(empty_positions),
-            'fillable_count': len([pos for pos in empty_positions]),
+            'fillable_count': len(empty_positions),
             'rule_count': len(fill_rules),
-            'field_types': list(set(self._identify_field_type(field) for field in field_positions.keys())),
+            'field_types': list(field_types),
             'coverage_ratio': len(fill_rules) / max(len(field_positions), 1)
         }
     
@@ -445,46 +656,28 @@ class IntelligentTableAnalyzer:
         Returns:
             AI友好的格式
         """
-        # 创建简化的字段映射
-        field_map = {}
-        for field_name, position_tuple in results['global_field_map'].items():
-            field_map[field_name] = position_tuple
-        
-        # 创建空位列表
-        empty_positions = results['global_empty_positions']
-        
-        # 创建填充规则摘要
-        fill_rules_summary = []
-        for table_key, table_data in results['tables'].items():
-            for rule in table_data.fill_rules:
-                fill_rules_summary.append({
-                    'field': rule['field_name'],
-                    'fill_position': rule['fill_position'],
-                    'rule_type': rule['rule_type'],
-                    'confidence': rule['confidence']
-                })
+        fill_rules_summary = [
+            {
+                'field': rule['field_name'],
+                'fill_position': rule['fill_position'],
+                'rule_type': rule['rule_type'],
+                'confidence': rule['confidence']
+            }
+            for table_data in results['tables'].values()
+            for rule in table_data.fill_rules
+        ]
         
         return {
             'document_info': {
                 'file_path': results['file_path'],
                 'total_tables': results['total_tables']
             },
-            'field_positions': field_map,
-            'empty_positions': empty_positions,
+            'field_positions': results['global_field_map'],
+            'empty_positions': results['global_empty_positions'],
             'fill_rules': fill_rules_summary,
             'ai_instructions': {
-                'usage_rules': [
-                    '1. 有内容的格子不可以填',
-                    '2. 字段名右侧的格子通常填充该字段的数据',
-                    '3. 字段名下方的格子也可能填充数据',
-                    '4. 优先使用右侧填充规则',
-                    '5. 返回格式: {"数据内容": (表格索引, 行索引, 列索引)}'
-                ],
-                'example_format': {
-                    '张三': (1, 1, 3),
-                    '2023001234': (1, 2, 3),
-                    '计算机学院': (1, 1, 5)
-                }
+                'usage_rules': list(_AI_USAGE_RULES),
+                'example_format': dict(_AI_EXAMPLE_FORMAT)
             }
         }
 
@@ -566,8 +759,8 @@ class IntelligentTableAnalyzer:
             return 0.0
         
         # 清理字段名
-        f1 = field1.replace('\n', '').replace('\r', '').strip()
-        f2 = field2.replace('\n', '').replace('\r', '').strip()
+        f1 = _clean_text(field1)
+        f2 = _clean_text(field2)
         
         # 完全匹配
         if f1 == f2:
@@ -577,5 +770,5 @@ class IntelligentTableAnalyzer:
         if f1 in f2 or f2 in f1:
             return 0.9
         
-        # 使用difflib计算相似度
-        return difflib.SequenceMatcher(None, f1, f2).ratio()
+        # 计算编辑相似度
+        return _similarity(f1, f2)
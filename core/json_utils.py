@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+JSON序列化工具
+优先使用orjson，未安装时回退到标准库json
+"""
+
+import json
+from collections import deque
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _default(obj: Any) -> Any:
+    """标准库json无法处理的类型，与orjson的行为保持一致"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset, deque)):
+        return list(obj)
+    if isinstance(obj, tuple):
+        # orjson不处理tuple子类（如NamedTuple），按标准库json的方式输出为数组
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(data: Any, indent: bool = False, sort_keys: bool = False,
+          default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """
+    序列化为UTF-8编码的JSON字节串
+
+    Parameters:
+    - data: 要序列化的数据，可包含datetime、Enum
+    - indent: 是否使用两个空格缩进
+    - sort_keys: 是否按键排序
+    - default: 其余无法序列化的对象的转换函数，None则抛出TypeError
+    """
+    if default is not None:
+        fallback = default
+
+        def _encode(obj: Any) -> Any:
+            try:
+                return _default(obj)
+            except TypeError:
+                return fallback(obj)
+    else:
+        _encode = _default
+
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, default=_encode, option=option)
+
+    return json.dumps(
+        data,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        sort_keys=sort_keys,
+        default=_encode,
+    ).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """反序列化JSON字节串或字符串"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
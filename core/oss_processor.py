@@ -7,11 +7,20 @@ OSS处理模块
 """
 
 import os
+import mmap
+import time
+import hashlib
+import functools
 import logging
+import tempfile
+import threading
 import requests
 import uuid
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any, Union
+from typing import Dict, Any, Union, Optional, Tuple, List
 from io import BytesIO
 
 try:
@@ -20,6 +29,14 @@ try:
 except ImportError:
     OSS_AVAILABLE = False
 
+# oss2 通过 crcmod 计算 CRC64 校验，未编译C扩展时退化为纯Python实现，
+# 大文件上传会被校验计算拖慢，此时改用 hashlib 计算的 Content-MD5 由服务端校验
+try:
+    from crcmod import _crcfunext  # noqa: F401
+    CRC_ACCELERATED = True
+except ImportError:
+    CRC_ACCELERATED = False
+
 logger = logging.getLogger(__name__)
 
 # 复用main.py中的OSS配置
@@ -31,13 +48,117 @@ OSS_CONFIG = {
     "domain": "https://ggb-lzt.oss-cn-shenzhen.aliyuncs.com/"
 }
 
+# list_oss_files 结果缓存配置
+LIST_CACHE_MAXSIZE = 256
+LIST_CACHE_TTL = 30  # 秒
+
+# OSS单次列举请求允许的最大条目数
+LIST_PAGE_MAX_KEYS = 1000
+
+# OSS单次批量删除请求允许的最大文件数
+BATCH_DELETE_MAX_KEYS = 1000
+
+# URL下载配置
+DOWNLOAD_TIMEOUT = (5, 60)  # (连接超时, 读取超时) 秒
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def oss_boundary(log_message: str, error_message: str):
+    """
+    OSS操作的统一异常边界
+    捕获被装饰函数抛出的异常，记录日志并返回 {"error": ...} 字典
+    """
+    def decorator(func):
+        func_logger = logging.getLogger(func.__module__)
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                func_logger.error(f"{log_message}: {e}")
+                return {"error": f"{error_message}: {str(e)}"}
+        return wrapper
+    return decorator
+
+
+def _copy_list_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """复制文件列表结果，连同files中的每项及其user_meta，调用方修改返回值不会影响缓存"""
+    files = []
+    for file_info in result["files"]:
+        file_info = dict(file_info)
+        if "user_meta" in file_info:
+            file_info["user_meta"] = dict(file_info["user_meta"])
+        files.append(file_info)
+    return {**result, "files": files}
+
+
+class _ListResultCache:
+    """带过期时间的LRU缓存，用于缓存OSS文件列表结果"""
+    
+    def __init__(self, maxsize: int = LIST_CACHE_MAXSIZE, ttl: float = LIST_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """获取未过期的缓存结果"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: Tuple, value: Dict[str, Any]):
+        """写入缓存结果，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, filename: str):
+        """使前缀能匹配到指定文件名的缓存条目失效"""
+        with self._lock:
+            for key in [k for k in self._entries if filename.startswith(k[0])]:
+                del self._entries[key]
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+
 class OSSProcessor:
     """OSS处理器，提供云存储上传下载功能"""
     
     def __init__(self):
         """初始化OSS处理器"""
+        self._list_cache = _ListResultCache()
+        self._http = self._create_http_session()
         if not OSS_AVAILABLE:
             logger.warning("OSS2 library not available. OSS features will be disabled.")
+        elif not CRC_ACCELERATED:
+            logger.warning("crcmod C extension not available. Using Content-MD5 instead of CRC64 for uploads.")
+    
+    @staticmethod
+    def _create_http_session() -> requests.Session:
+        """创建带连接池和重试的HTTP会话，跨调用复用TCP/TLS连接"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=1)
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
     
     def get_oss_bucket(self):
         """获取OSS bucket对象"""
@@ -45,46 +166,72 @@ class OSSProcessor:
             raise Exception("OSS2 library not installed. Please install with: pip install oss2")
         
         auth = oss2.Auth(OSS_CONFIG["access_key"], OSS_CONFIG["secret_key"])
-        bucket = oss2.Bucket(auth, OSS_CONFIG["endpoint"], OSS_CONFIG["bucket_name"])
+        bucket = oss2.Bucket(
+            auth, OSS_CONFIG["endpoint"], OSS_CONFIG["bucket_name"], enable_crc=CRC_ACCELERATED
+        )
         return bucket
     
-    def upload_file_to_oss(self, file_path: str, custom_filename: str = None) -> Dict[str, Any]:
+    def generate_filename(self, file_ext: str = ".docx") -> str:
+        """生成带时间戳和随机后缀的OSS文件名"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        unique_id = str(uuid.uuid4())[:8]
+        return f"document_{timestamp}_{unique_id}{file_ext}"
+    
+    def get_download_url(self, filename: str) -> str:
+        """获取OSS文件的访问链接"""
+        return f"{OSS_CONFIG['domain']}{filename}"
+    
+    @oss_boundary("Upload file to OSS failed", "上传文件失败")
+    def upload_file_to_oss(self, file_path: str, custom_filename: str = None,
+                           content_addressed: bool = False) -> Dict[str, Any]:
         """
         上传本地文件到OSS
         
         Parameters:
         - file_path: 本地文件路径
         - custom_filename: 自定义文件名，None则自动生成
+        - content_addressed: 未指定文件名时按内容SHA256命名（sha256/<hex><扩展名>），
+          OSS中已存在相同内容时跳过上传
         
         Returns:
-        - 包含上传结果的字典
+        - 包含上传结果的字典，跳过上传时 deduplicated 为 True
         """
-        try:
-            if not OSS_AVAILABLE:
-                return {"error": "OSS功能不可用，请安装oss2库: pip install oss2"}
-            
-            if not os.path.exists(file_path):
-                return {"error": f"文件不存在: {file_path}"}
-            
+        if not OSS_AVAILABLE:
+            return {"error": "OSS功能不可用，请安装oss2库: pip install oss2"}
+        
+        if not os.path.exists(file_path):
+            return {"error": f"文件不存在: {file_path}"}
+        
+        file_ext = os.path.splitext(file_path)[1]
+        
+        # 通过内存映射读取文件，哈希与上传直接使用映射缓冲区，不复制整个文件
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return self._upload_file_bytes(b"", file_ext, custom_filename, content_addressed)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as file_bytes:
+                return self._upload_file_bytes(file_bytes, file_ext, custom_filename, content_addressed)
+    
+    def _upload_file_bytes(self, file_bytes, file_ext: str, custom_filename: Optional[str],
+                           content_addressed: bool) -> Dict[str, Any]:
+        """上传文件内容，file_bytes 可以是 bytes 或 mmap"""
+        if content_addressed and not custom_filename:
+            filename = f"sha256/{hashlib.sha256(file_bytes).hexdigest()}{file_ext}"
+            if self.get_oss_bucket().object_exists(filename):
+                return {
+                    "success": True,
+                    "filename": filename,
+                    "download_url": self.get_download_url(filename),
+                    "file_size": len(file_bytes),
+                    "deduplicated": True,
+                    "message": "OSS中已存在相同内容的文档，已跳过上传"
+                }
+        else:
             # 生成文件名
-            if custom_filename:
-                filename = custom_filename
-            else:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                unique_id = str(uuid.uuid4())[:8]
-                file_ext = os.path.splitext(file_path)[1]
-                filename = f"document_{timestamp}_{unique_id}{file_ext}"
-            
-            # 读取文件
-            with open(file_path, 'rb') as f:
-                file_bytes = f.read()
-            
-            return self._upload_bytes_to_oss(file_bytes, filename)
-            
-        except Exception as e:
-            logger.error(f"Upload file to OSS failed: {e}")
-            return {"error": f"上传文件失败: {str(e)}"}
+            filename = custom_filename or self.generate_filename(file_ext)
+        
+        return self._upload_bytes_to_oss(file_bytes, filename)
     
+    @oss_boundary("Upload bytes to OSS failed", "上传数据失败")
     def upload_bytes_to_oss(self, file_bytes: bytes, filename: str = None) -> Dict[str, Any]:
         """
         上传字节数据到OSS
@@ -96,21 +243,14 @@ class OSSProcessor:
         Returns:
         - 包含上传结果的字典
         """
-        try:
-            if not OSS_AVAILABLE:
-                return {"error": "OSS功能不可用，请安装oss2库: pip install oss2"}
-            
-            # 生成文件名
-            if not filename:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                unique_id = str(uuid.uuid4())[:8]
-                filename = f"document_{timestamp}_{unique_id}.docx"
-            
-            return self._upload_bytes_to_oss(file_bytes, filename)
-            
-        except Exception as e:
-            logger.error(f"Upload bytes to OSS failed: {e}")
-            return {"error": f"上传数据失败: {str(e)}"}
+        if not OSS_AVAILABLE:
+            return {"error": "OSS功能不可用，请安装oss2库: pip install oss2"}
+        
+        # 生成文件名
+        if not filename:
+            filename = self.generate_filename()
+        
+        return self._upload_bytes_to_oss(file_bytes, filename)
     
     def _upload_bytes_to_oss(self, file_bytes: bytes, filename: str) -> Dict[str, Any]:
         """
@@ -127,11 +267,17 @@ class OSSProcessor:
             # 获取OSS bucket
             bucket = self.get_oss_bucket()
             
-            # 上传文件到OSS
-            result = bucket.put_object(filename, file_bytes)
+            # 上传文件到OSS，无法使用加速CRC64时由服务端校验Content-MD5
+            headers = None
+            if not CRC_ACCELERATED:
+                headers = {"Content-MD5": oss2.utils.content_md5(file_bytes)}
+            result = bucket.put_object(filename, file_bytes, headers=headers)
+            
+            # 新对象会改变列表结果
+            self._list_cache.invalidate(filename)
             
             # 构建访问链接
-            download_url = f"{OSS_CONFIG['domain']}{filename}"
+            download_url = self.get_download_url(filename)
             
             return {
                 "success": True,
@@ -172,7 +318,6 @@ class OSSProcessor:
             
             # 确定本地保存路径
             if not local_path:
-                import tempfile
                 local_path = os.path.join(tempfile.gettempdir(), filename)
             
             # 获取OSS bucket
@@ -223,22 +368,22 @@ class OSSProcessor:
             
             # 确定本地保存路径
             if not local_path:
-                import tempfile
                 local_path = os.path.join(tempfile.gettempdir(), filename)
             
-            # 下载文件
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            # 保存到本地
-            with open(local_path, 'wb') as f:
-                f.write(response.content)
+            # 下载文件并分块写入本地
+            file_size = 0
+            with self._http.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                with open(local_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        file_size += len(chunk)
             
             return {
                 "success": True,
                 "url": url,
                 "local_path": local_path,
-                "file_size": len(response.content),
+                "file_size": file_size,
                 "message": f"文件已从URL下载到: {local_path}"
             }
             
@@ -249,45 +394,93 @@ class OSSProcessor:
             logger.error(f"Download from URL failed: {e}")
             return {"error": f"下载文件失败: {str(e)}"}
     
-    def list_oss_files(self, prefix: str = "", max_keys: int = 100) -> Dict[str, Any]:
+    @oss_boundary("List OSS files failed", "列出文件失败")
+    def list_oss_files(self, prefix: str = "", max_keys: int = 100, use_cache: bool = True,
+                       fetch_metadata: bool = False,
+                       continuation_token: Optional[str] = None) -> Dict[str, Any]:
         """
         列出OSS中的文件
         
         Parameters:
         - prefix: 文件名前缀过滤
-        - max_keys: 最大返回数量
+        - max_keys: 最大返回数量，取满后立即停止翻页
+        - use_cache: 是否使用短期缓存（默认30秒），需要强一致结果时传False
+        - fetch_metadata: 是否逐个获取对象的自定义元数据（每个文件额外一次HEAD请求）
+        - continuation_token: 上一次调用返回的 next_continuation_token，用于继续翻页
         
         Returns:
-        - 包含文件列表的字典
+        - 包含文件列表的字典，files中每项包含:
+          filename, size, last_modified, etag, storage_class, download_url；
+          fetch_metadata=True时另含 content_type 和 user_meta。
+          is_truncated 表示是否还有更多文件，next_continuation_token 用于获取下一页
         """
-        try:
-            if not OSS_AVAILABLE:
-                return {"error": "OSS功能不可用，请安装oss2库: pip install oss2"}
-            
-            # 获取OSS bucket
-            bucket = self.get_oss_bucket()
-            
-            # 列出文件
-            files = []
-            for obj in oss2.ObjectIterator(bucket, prefix=prefix, max_keys=max_keys):
-                files.append({
+        if not OSS_AVAILABLE:
+            return {"error": "OSS功能不可用，请安装oss2库: pip install oss2"}
+        
+        cache_key = (prefix, max_keys, fetch_metadata, continuation_token)
+        if use_cache:
+            cached = self._list_cache.get(cache_key)
+            if cached is not None:
+                return _copy_list_result(cached)
+        
+        # 获取OSS bucket
+        bucket = self.get_oss_bucket()
+        
+        # 按页列出文件，取满max_keys后立即停止，不再遍历整个前缀
+        # 大小/ETag等信息直接取自列举结果，无需逐个HEAD
+        files = []
+        token = continuation_token or ""
+        is_truncated = False
+        while len(files) < max_keys:
+            page = bucket.list_objects_v2(
+                prefix=prefix,
+                continuation_token=token,
+                max_keys=min(max_keys - len(files), LIST_PAGE_MAX_KEYS)
+            )
+            for obj in page.object_list:
+                file_info = {
                     "filename": obj.key,
                     "size": obj.size,
                     "last_modified": obj.last_modified,
-                    "download_url": f"{OSS_CONFIG['domain']}{obj.key}"
-                })
-            
-            return {
-                "success": True,
-                "files": files,
-                "count": len(files),
-                "message": f"找到 {len(files)} 个文件"
-            }
+                    "etag": obj.etag,
+                    "storage_class": obj.storage_class,
+                    "download_url": self.get_download_url(obj.key)
+                }
+                if fetch_metadata:
+                    file_info.update(self._head_object_metadata(bucket, obj.key))
+                files.append(file_info)
             
-        except Exception as e:
-            logger.error(f"List OSS files failed: {e}")
-            return {"error": f"列出文件失败: {str(e)}"}
+            is_truncated = page.is_truncated
+            token = page.next_continuation_token
+            if not is_truncated:
+                break
+        
+        result = {
+            "success": True,
+            "files": files,
+            "count": len(files),
+            "is_truncated": is_truncated,
+            "next_continuation_token": token if is_truncated else None,
+            "message": f"找到 {len(files)} 个文件"
+        }
+        self._list_cache.set(cache_key, result)
+        
+        return _copy_list_result(result)
     
+    def _head_object_metadata(self, bucket, key: str) -> Dict[str, Any]:
+        """通过HEAD请求获取对象的内容类型和自定义元数据"""
+        head = bucket.head_object(key)
+        user_meta = {
+            name[len("x-oss-meta-"):]: value
+            for name, value in head.headers.items()
+            if name.lower().startswith("x-oss-meta-")
+        }
+        return {
+            "content_type": head.content_type,
+            "user_meta": user_meta
+        }
+    
+    @oss_boundary("Delete OSS file failed", "删除文件失败")
     def delete_oss_file(self, filename: str) -> Dict[str, Any]:
         """
         删除OSS中的文件
@@ -298,22 +491,57 @@ class OSSProcessor:
         Returns:
         - 包含删除结果的字典
         """
-        try:
-            if not OSS_AVAILABLE:
-                return {"error": "OSS功能不可用，请安装oss2库: pip install oss2"}
-            
-            # 获取OSS bucket
-            bucket = self.get_oss_bucket()
-            
-            # 删除文件
-            bucket.delete_object(filename)
-            
-            return {
-                "success": True,
-                "filename": filename,
-                "message": f"文件已删除: {filename}"
-            }
+        if not OSS_AVAILABLE:
+            return {"error": "OSS功能不可用，请安装oss2库: pip install oss2"}
+        
+        # 获取OSS bucket
+        bucket = self.get_oss_bucket()
+        
+        # 删除文件
+        bucket.delete_object(filename)
+        self._list_cache.invalidate(filename)
+        
+        return {
+            "success": True,
+            "filename": filename,
+            "message": f"文件已删除: {filename}"
+        }
+    
+    @oss_boundary("Delete OSS files failed", "批量删除文件失败")
+    def delete_oss_files(self, filenames: List[str]) -> Dict[str, Any]:
+        """
+        批量删除OSS中的文件，每1000个文件合并为一次请求
+        
+        Parameters:
+        - filenames: 要删除的文件名列表
+        
+        Returns:
+        - 包含删除结果的字典，deleted 为已删除的文件名，errors 为删除失败的文件及原因
+        """
+        if not OSS_AVAILABLE:
+            return {"error": "OSS功能不可用，请安装oss2库: pip install oss2"}
+        
+        # 获取OSS bucket
+        bucket = self.get_oss_bucket()
+        
+        deleted = []
+        errors = []
+        for start in range(0, len(filenames), BATCH_DELETE_MAX_KEYS):
+            chunk = filenames[start:start + BATCH_DELETE_MAX_KEYS]
+            try:
+                result = bucket.batch_delete_objects(chunk)
+            except Exception as e:
+                logger.error(f"Batch delete OSS files failed: {e}")
+                errors.extend({"filename": filename, "error": str(e)} for filename in chunk)
+                continue
             
-        except Exception as e:
-            logger.error(f"Delete OSS file failed: {e}")
-            return {"error": f"删除文件失败: {str(e)}"}
+            deleted.extend(result.deleted_keys)
+            for filename in result.deleted_keys:
+                self._list_cache.invalidate(filename)
+        
+        return {
+            "success": not errors,
+            "deleted": deleted,
+            "errors": errors,
+            "message": f"已删除 {len(deleted)} 个文件，失败 {len(errors)} 个"
+        }
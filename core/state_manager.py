@@ -9,6 +9,8 @@
 import os
 import tempfile
 import logging
+import threading
+from contextlib import contextmanager
 from typing import Optional, Dict, Any
 from docx import Document
 
@@ -22,6 +24,14 @@ class StateManager:
         self.current_document: Optional[Document] = None
         self.current_file_path: Optional[str] = None
         self.documents: Dict[str, Document] = {}
+        # 批量修改期间保存会重入，因此使用可重入锁
+        self._lock = threading.RLock()
+        # 当前文档是否有未保存的修改
+        self._dirty = False
+        # 修改计数，后台保存据此判断序列化之后是否又有修改
+        self._edit_generation = 0
+        # 最近一次加载/保存时磁盘文件的 (修改时间, 大小)
+        self._disk_state: Optional[tuple] = None
         
         # 尝试加载之前的状态
         self._load_current_document()
@@ -40,6 +50,7 @@ class StateManager:
                     self.current_file_path = file_path
                     self.current_document = Document(file_path)
                     self.documents[file_path] = self.current_document
+                    self._record_disk_state()
                     logger.info(f"Successfully loaded document from {file_path}")
                     return True
                 except Exception as e:
@@ -76,12 +87,90 @@ class StateManager:
             logger.error(f"Failed to save current document path: {e}")
             return False
     
-    def set_current_document(self, file_path: str, document: Document):
-        """设置当前文档"""
-        self.current_file_path = file_path
-        self.current_document = document
-        self.documents[file_path] = document
-        self._save_current_document_state()
+    def set_current_document(self, file_path: str, document: Document,
+                             sync_state: Optional[tuple] = None):
+        """
+        设置当前文档
+        :param sync_state: get_sync_state 取得的 (是否有未保存修改, 磁盘文件状态)，
+                           恢复之前的文档时传入；为None时视为刚从磁盘加载或保存
+        """
+        with self._lock:
+            self.current_file_path = file_path
+            self.current_document = document
+            self.documents[file_path] = document
+            if sync_state is None:
+                self._dirty = False
+                self._record_disk_state()
+            else:
+                self._dirty, self._disk_state = sync_state
+            self._save_current_document_state()
+    
+    def get_sync_state(self) -> tuple:
+        """获取当前文档的 (是否有未保存修改, 磁盘文件状态)，用于切换文档后恢复"""
+        return (self._dirty, self._disk_state)
+    
+    def mark_dirty(self):
+        """标记当前文档有未保存的修改"""
+        self._dirty = True
+        self._edit_generation += 1
+    
+    def mark_clean(self):
+        """标记当前文档已与磁盘文件一致"""
+        self._dirty = False
+        self._record_disk_state()
+    
+    def get_edit_generation(self) -> int:
+        """获取当前的修改计数，序列化文档时记录，供 mark_clean_if_unchanged 使用"""
+        return self._edit_generation
+    
+    def mark_clean_if_unchanged(self, file_path: str, document: Document, generation: int) -> bool:
+        """
+        后台保存写盘完成后调用：仍是同一路径下的同一文档，且序列化之后没有新的修改时才标记为已保存
+        
+        锁被占用时不等待直接放弃：持有锁的一方可能正在等待保存线程写盘，
+        而它本身是同步保存或修改，完成后会自行更新保存状态
+        
+        Returns:
+        - 是否已标记为已保存
+        """
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if (self.current_file_path != file_path or self.current_document is not document
+                    or self._edit_generation != generation):
+                return False
+            self.mark_clean()
+            return True
+        finally:
+            self._lock.release()
+    
+    def is_dirty(self) -> bool:
+        """检查当前文档是否有未保存的修改"""
+        return self._dirty
+    
+    def is_in_sync_with_disk(self) -> bool:
+        """检查当前文档没有未保存的修改，且磁盘文件自上次加载/保存后未被改动"""
+        if self._dirty or self._disk_state is None:
+            return False
+        return self._stat_current_file() == self._disk_state
+    
+    def _stat_current_file(self) -> Optional[tuple]:
+        """获取当前文档磁盘文件的 (修改时间, 大小)"""
+        try:
+            stat = os.stat(self.current_file_path)
+        except (OSError, TypeError):
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def _record_disk_state(self):
+        """记录当前文档磁盘文件的状态"""
+        self._disk_state = self._stat_current_file()
+    
+    @contextmanager
+    def batch(self):
+        """批量修改上下文，整个修改集合只获取一次文档锁"""
+        with self._lock:
+            yield self.current_document
     
     def get_current_document(self) -> Optional[Document]:
         """获取当前文档"""
@@ -93,19 +182,24 @@ class StateManager:
     
     def save_current_document(self):
         """保存当前文档"""
-        if self.current_document and self.current_file_path:
-            try:
-                self.current_document.save(self.current_file_path)
-                self._save_current_document_state()
-                logger.info(f"Document saved to {self.current_file_path}")
-            except Exception as e:
-                logger.error(f"Failed to save current document: {e}")
-                raise
+        with self._lock:
+            if self.current_document and self.current_file_path:
+                try:
+                    self.current_document.save(self.current_file_path)
+                    self._dirty = False
+                    self._record_disk_state()
+                    self._save_current_document_state()
+                    logger.info(f"Document saved to {self.current_file_path}")
+                except Exception as e:
+                    logger.error(f"Failed to save current document: {e}")
+                    raise
     
     def clear_state(self):
         """清除状态"""
         self.current_document = None
         self.current_file_path = None
+        self._dirty = False
+        self._disk_state = None
         self.documents.clear()
         self._remove_invalid_state_file()
     
@@ -124,5 +218,5 @@ class StateManager:
             "sections_count": len(doc.sections),
             "paragraphs_count": len(doc.paragraphs),
             "tables_count": len(doc.tables),
-            "has_changes": True  # 简化实现，实际可以跟踪变更状态
+            "has_changes": self._dirty
         }
@@ -5,11 +5,11 @@
 支持任意格式的Word表格智能填充
 """
 
-import json
 import logging
 from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
 from docx import Document
+from . import json_utils
 from .intelligent_table_analyzer import IntelligentTableAnalyzer
 
 logger = logging.getLogger(__name__)
@@ -42,7 +42,7 @@ class UniversalTableFiller:
             logger.info("创建坐标映射信息")
             coordinate_mapping = self.analyzer.create_coordinate_mapping(analysis_result)
             
-            return json.dumps(coordinate_mapping, ensure_ascii=False, indent=2)
+            return json_utils.dumps(coordinate_mapping, indent=True).decode('utf-8')
             
         except Exception as e:
             logger.error(f"坐标分析失败: {e}")
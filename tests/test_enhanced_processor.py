@@ -8,10 +8,15 @@ Enhanced DOCX Processor Tests
 
 import os
 import tempfile
+import threading
 import unittest
 from pathlib import Path
+from unittest import mock
+
+from docx import Document
 
 from core.enhanced_docx_processor import EnhancedDocxProcessor
+from core.fixed_docx_processor import FixedDocxProcessor
 
 
 class TestEnhancedDocxProcessor(unittest.TestCase):
@@ -87,11 +92,238 @@ class TestEnhancedDocxProcessor(unittest.TestCase):
         result = self.processor.get_document_info()
         self.assertIn("文档路径", result)
     
+    def test_process_document_with_oss_upload_serializes_once(self):
+        """测试处理并上传文档时只序列化一次"""
+        self.processor.create_document(self.test_file)
+        upload = mock.MagicMock(return_value={"success": True})
+        
+        with mock.patch.object(self.processor.oss_processor, "upload_bytes_to_oss", upload), \
+                mock.patch.object(self.processor.oss_processor, "upload_file_to_oss") as upload_file:
+            result = self.processor.process_document_with_oss_upload(
+                [{"type": "add_paragraph", "text": "上传内容"}]
+            )
+        
+        self.assertTrue(result["success"])
+        upload_file.assert_not_called()
+        uploaded_bytes = upload.call_args[0][0]
+        with open(self.test_file, 'rb') as f:
+            self.assertEqual(f.read(), uploaded_bytes)
+    
+    def test_upload_current_document_to_oss_async(self):
+        """测试后台上传立即返回文件名并可收集结果"""
+        self.processor.create_document(self.test_file)
+        upload = mock.MagicMock(return_value={"success": True, "filename": "async.docx"})
+        
+        with mock.patch.object(self.processor.oss_processor, "upload_bytes_to_oss", upload):
+            submitted = self.processor.upload_current_document_to_oss_async("async.docx")
+            result = self.processor.wait_for_upload(submitted["upload_id"], timeout=10)
+        
+        self.assertEqual(submitted["filename"], "async.docx")
+        self.assertIn("async.docx", submitted["download_url"])
+        self.assertTrue(result["success"])
+        self.assertEqual(upload.call_args[0][1], "async.docx")
+        self.assertIn("error", self.processor.wait_for_upload(submitted["upload_id"]))
+    
+    def test_unclaimed_upload_results_are_capped(self):
+        """测试一直未取走的后台上传结果数量有上限，最新的结果仍可获取"""
+        self.processor.create_document(self.test_file)
+        upload = mock.MagicMock(return_value={"success": True})
+        
+        with mock.patch.object(self.processor.oss_processor, "upload_bytes_to_oss", upload), \
+                mock.patch("core.enhanced_docx_processor.UPLOAD_RESULTS_MAXSIZE", 2):
+            upload_ids = []
+            for i in range(4):
+                upload_ids.append(self.processor.upload_current_document_to_oss_async(f"{i}.docx")["upload_id"])
+                self.processor._pending_uploads[upload_ids[-1]].result(timeout=10)
+        
+        self.assertEqual(list(self.processor._pending_uploads), upload_ids[2:])
+        self.assertTrue(self.processor.wait_for_upload(upload_ids[-1])["success"])
+    
+    def test_dirty_tracking(self):
+        """测试修改后标记为未保存，保存后恢复"""
+        self.processor.create_document(self.test_file)
+        self.assertFalse(self.processor.state_manager.is_dirty())
+        
+        self.processor.search_text("测试")
+        self.assertFalse(self.processor.state_manager.is_dirty())
+        
+        self.processor.add_paragraph("测试段落")
+        self.assertTrue(self.processor.state_manager.is_dirty())
+        
+        self.processor.save_document()
+        self.assertFalse(self.processor.state_manager.is_dirty())
+    
+    def test_repeated_upload_of_unchanged_document(self):
+        """测试未修改的文档重复上传时复用上一次结果"""
+        self.processor.create_document(self.test_file)
+        upload = mock.MagicMock(return_value={"success": True, "filename": "same.docx"})
+        
+        with mock.patch.object(self.processor.oss_processor, "upload_file_to_oss", upload), \
+                mock.patch.object(self.processor.state_manager, "save_current_document") as save:
+            first = self.processor.upload_current_document_to_oss()
+            second = self.processor.upload_current_document_to_oss()
+        
+        self.assertEqual(first, second)
+        self.assertEqual(upload.call_count, 1)
+        save.assert_not_called()
+    
+    def test_failed_delete_keeps_upload_cache(self):
+        """测试OSS删除失败时保留上传结果缓存，删除成功后才清除"""
+        self.processor.create_document(self.test_file)
+        upload = mock.MagicMock(return_value={"success": True, "filename": "same.docx"})
+        
+        with mock.patch.object(self.processor.oss_processor, "upload_file_to_oss", upload):
+            self.processor.upload_current_document_to_oss()
+            with mock.patch.object(self.processor, "_oss_delete", return_value={"error": "删除失败"}):
+                self.processor.delete_oss_file("same.docx")
+            self.processor.upload_current_document_to_oss()
+            self.assertEqual(upload.call_count, 1)
+            
+            with mock.patch.object(self.processor, "_oss_delete", return_value={"success": True}):
+                self.processor.delete_oss_file("same.docx")
+            self.processor.upload_current_document_to_oss()
+            self.assertEqual(upload.call_count, 2)
+    
+    def test_upload_resaves_when_file_changed_on_disk(self):
+        """测试磁盘文件被外部改动后上传前重新保存"""
+        self.processor.create_document(self.test_file)
+        self.assertTrue(self.processor.state_manager.is_in_sync_with_disk())
+        
+        with open(self.test_file, "ab") as f:
+            f.write(b"\0")
+        self.assertFalse(self.processor.state_manager.is_in_sync_with_disk())
+        
+        upload = mock.MagicMock(return_value={"success": True, "filename": "same.docx"})
+        with mock.patch.object(self.processor.oss_processor, "upload_file_to_oss", upload), \
+                mock.patch.object(self.processor.state_manager, "save_current_document") as save:
+            self.processor.upload_current_document_to_oss()
+        
+        save.assert_called_once()
+    
+    def test_document_context_keeps_unsaved_edits(self):
+        """测试临时切换到其他文档后恢复原文档，未保存的修改在上传前仍会保存"""
+        self.processor.create_document(self.test_file)
+        self.processor.add_paragraph("未保存的段落")
+        other_file = os.path.join(self.temp_dir, "other.docx")
+        
+        with self.processor.document_context(other_file, create_if_not_exists=True):
+            pass
+        
+        state_manager = self.processor.state_manager
+        self.assertTrue(state_manager.is_dirty())
+        self.assertFalse(state_manager.is_in_sync_with_disk())
+        
+        upload = mock.MagicMock(return_value={"success": True, "filename": "test.docx"})
+        with mock.patch.object(self.processor.oss_processor, "upload_file_to_oss", upload):
+            self.processor.upload_current_document_to_oss()
+        
+        self.assertFalse(state_manager.is_dirty())
+        self.assertIn("未保存的段落", [p.text for p in Document(self.test_file).paragraphs])
+    
+    def test_render_template_document(self):
+        """测试按区块类型渲染模板，未知类型忽略"""
+        structure = {"sections": [
+            {"section_type": "heading", "content": {"text": "标题", "level": 1}},
+            {"section_type": "paragraph", "content": {"text": "正文", "alignment": "center"}},
+            {"section_type": "table", "content": {"rows": 1, "columns": 2,
+                                                   "data": [{"row": 0, "cells": [{"text": "甲"}, {"text": "乙"}]}]}},
+            {"section_type": "unknown", "content": {}},
+        ]}
+        valid = mock.MagicMock(is_valid=True)
+        with mock.patch.object(self.processor.template_engine, "validate_template_data", return_value=valid), \
+                mock.patch.object(self.processor.template_renderer, "render_template_to_document", return_value=structure):
+            result = self.processor.render_template_document("report", {}, self.test_file)
+        
+        self.assertEqual(result, f"模板文档创建成功: {self.test_file}")
+        document = Document(self.test_file)
+        self.assertEqual([p.text for p in document.paragraphs], ["标题", "正文"])
+        self.assertEqual([c.text for c in document.tables[0].rows[0].cells], ["甲", "乙"])
+    
     def test_no_document_error(self):
         """测试没有打开文档时的错误处理"""
         result = self.processor.add_paragraph("测试")
         self.assertIn("没有打开的文档", result)
 
 
+class TestFixedDocxProcessorSave(unittest.TestCase):
+    """修复版处理器的同步与后台保存测试"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.processor = FixedDocxProcessor()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.test_file = os.path.join(self.temp_dir.name, "test.docx")
+        self.processor.create_document(self.test_file)
+        self.state_manager = self.processor.state_manager
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.state_manager.clear_state()
+        self.temp_dir.cleanup()
+    
+    def _block_first_write(self):
+        """让保存线程的第一次写入等待放行，返回(开始写入事件, 放行事件, 写入记录)"""
+        started, release = threading.Event(), threading.Event()
+        writes = []
+        write_bytes = self.processor._write_bytes
+        
+        def blocking_write(path, data):
+            writes.append(threading.current_thread().name)
+            if len(writes) == 1:
+                started.set()
+                release.wait(10)
+            return write_bytes(path, data)
+        
+        patcher = mock.patch.object(self.processor, "_write_bytes", blocking_write)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return started, release, writes
+    
+    def test_async_save_marks_clean(self):
+        """测试后台保存完成后标记为已保存，上传时不再重新保存"""
+        self.processor.add_paragraph("段落")
+        self.assertTrue(self.state_manager.is_dirty())
+        
+        self.assertTrue(self.processor.save_document_async().result(timeout=10).startswith("文档保存成功"))
+        
+        self.assertFalse(self.state_manager.is_dirty())
+        self.assertTrue(self.state_manager.is_in_sync_with_disk())
+    
+    def test_edit_during_async_save_stays_dirty(self):
+        """测试序列化之后又有修改时，后台保存完成后仍标记为未保存"""
+        started, release, _ = self._block_first_write()
+        self.processor.add_paragraph("第一段")
+        future = self.processor.save_document_async()
+        self.assertTrue(started.wait(10))
+        
+        self.processor.add_paragraph("第二段")
+        release.set()
+        future.result(timeout=10)
+        
+        self.assertTrue(self.state_manager.is_dirty())
+    
+    def test_sync_save_waits_for_async_save(self):
+        """测试同步保存排在未完成的后台保存之后写入，文件为最新内容"""
+        started, release, writes = self._block_first_write()
+        self.processor.add_paragraph("第一段")
+        future = self.processor.save_document_async()
+        self.assertTrue(started.wait(10))
+        
+        self.processor.add_paragraph("第二段")
+        saver = threading.Thread(target=self.processor.save_document)
+        saver.start()
+        saver.join(0.2)
+        self.assertEqual(len(writes), 1)
+        
+        release.set()
+        future.result(timeout=10)
+        saver.join(10)
+        
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(len(set(writes)), 1)
+        self.assertEqual([p.text for p in Document(self.test_file).paragraphs], ["第一段", "第二段"])
+        self.assertFalse(self.state_manager.is_dirty())
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Image Processor Tests
+图片处理器测试
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from docx import Document
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+
+from core import image_processor
+from core.image_processor import ImageProcessor
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images")
+PNG_PATH = os.path.join(IMAGES_DIR, "test_image.png")
+JPG_PATH = os.path.join(IMAGES_DIR, "test_image.jpg")
+
+
+class TestImageScan(unittest.TestCase):
+    """测试图片查找与按索引操作"""
+
+    def setUp(self):
+        """测试前准备：正文两张图片，表格中一张图片"""
+        self.document = Document()
+        self.document.add_paragraph("开头")
+        ImageProcessor.add_image(self.document, JPG_PATH, width="1in")
+        self.document.add_paragraph("中间")
+        ImageProcessor.add_image(self.document, PNG_PATH, width="2in")
+        cell = self.document.add_table(rows=1, cols=1).cell(0, 0)
+        cell.paragraphs[0].add_run().add_picture(PNG_PATH)
+
+    def test_list_images_counts_body_images_only(self):
+        """测试只列出正文段落中的图片，段落序号与document.paragraphs一致"""
+        result = ImageProcessor.list_images(self.document)
+
+        self.assertIn("共有 2 张图片", result)
+        self.assertIn("图片 0: 段落 1", result)
+        self.assertIn("图片 1: 段落 3", result)
+
+    def test_list_images_lazy_and_count(self):
+        """测试逐条生成图片信息与图片计数"""
+        lazy = ImageProcessor.list_images_lazy(self.document)
+
+        self.assertTrue(next(lazy).startswith("图片 0: 段落 1, 尺寸 1.00\""))
+        self.assertTrue(next(lazy).startswith("图片 1: 段落 3, 尺寸 2.00\""))
+        self.assertIsNone(next(lazy, None))
+        self.assertEqual(ImageProcessor.count_images(self.document), 2)
+        self.assertEqual(ImageProcessor.count_images(Document()), 0)
+
+    def test_delete_image_removes_empty_paragraph(self):
+        """测试删除图片后空段落一并删除"""
+        result = ImageProcessor.delete_image(self.document, 0)
+
+        self.assertEqual(result, "图片 0 已删除")
+        self.assertEqual([p.text for p in self.document.paragraphs], ["开头", "中间", ""])
+        self.assertIn("共有 1 张图片", ImageProcessor.list_images(self.document))
+
+    def test_delete_images_in_one_scan(self):
+        """测试批量删除按删除前的索引删除，越界索引单独报告"""
+        ImageProcessor.add_image(self.document, JPG_PATH, width="3in")
+        xpath = mock.MagicMock(side_effect=image_processor._IMAGE_RUNS_XPATH)
+        with mock.patch.object(image_processor, "_IMAGE_RUNS_XPATH", xpath):
+            result = ImageProcessor.delete_images(self.document, [2, 0, 7, 0])
+
+        self.assertEqual(result, "已删除 2 张图片，以下索引超出范围: 7")
+        self.assertEqual(xpath.call_count, 1)
+        self.assertEqual([p.text for p in self.document.paragraphs], ["开头", "中间", ""])
+        self.assertIn("图片 0: 段落 2, 尺寸 2.00\"", ImageProcessor.list_images(self.document))
+
+    def test_add_image_at_paragraph_index(self):
+        """测试在指定段落前插入图片，以及插入到末尾和越界的情况"""
+        result = ImageProcessor.add_image(self.document, PNG_PATH, alignment="center", paragraph_index=2)
+
+        self.assertEqual(result, "图片已添加: test_image.png")
+        self.assertEqual([p.text for p in self.document.paragraphs][:4], ["开头", "", "", "中间"])
+        self.assertIn("图片 1: 段落 2", ImageProcessor.list_images(self.document))
+        self.assertEqual(self.document.paragraphs[2].alignment, WD_PARAGRAPH_ALIGNMENT.CENTER)
+
+        count = len(self.document.paragraphs)
+        ImageProcessor.add_image(self.document, PNG_PATH, paragraph_index=count)
+        self.assertIn(f"图片 3: 段落 {count}", ImageProcessor.list_images(self.document))
+        self.assertIn("段落索引超出范围", ImageProcessor.add_image(self.document, PNG_PATH, paragraph_index=count + 2))
+
+    def test_add_image_rejects_empty_file(self):
+        """测试空图片文件直接返回错误，不修改文档"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            empty_path = os.path.join(temp_dir, "empty.png")
+            open(empty_path, "wb").close()
+            count = len(self.document.paragraphs)
+
+            self.assertEqual(ImageProcessor.add_image(self.document, empty_path), f"图片文件为空: {empty_path}")
+            self.assertEqual(ImageProcessor.add_images(self.document, [{"image_path": empty_path}]),
+                             [f"图片文件为空: {empty_path}"])
+            self.assertEqual(len(self.document.paragraphs), count)
+
+    def test_resize_converts_units_exactly(self):
+        """测试各单位的尺寸换算为精确的EMU整数"""
+        for size, emu in (("3cm", 1080000), ("72pt", 914400), ("96px", 914400), ('2"', 1828800), (1.5, 1371600)):
+            ImageProcessor.resize_image(self.document, 0, width=size, height=size)
+            shape = self.document.inline_shapes[0]
+            self.assertEqual((shape.width, shape.height), (emu, emu))
+
+    def test_resize_keeps_aspect_ratio_with_integer_arithmetic(self):
+        """测试保持宽高比时按整数运算换算另一边，不受浮点舍入影响"""
+        shape = self.document.inline_shapes[0]
+        shape.width, shape.height = 182612, 2873567
+
+        ImageProcessor.resize_image(self.document, 0, width="71pt")
+
+        self.assertEqual((shape.width, shape.height), (901700, 901700 * 2873567 // 182612))
+
+    def test_index_out_of_range(self):
+        """测试图片索引越界"""
+        result = ImageProcessor.resize_image(self.document, 5, width="1in")
+
+        self.assertIn("图片索引超出范围: 5", result)
+
+    def test_scan_cached_until_images_change(self):
+        """测试连续操作复用图片扫描结果，增删图片后重新扫描"""
+        xpath = mock.MagicMock(side_effect=image_processor._IMAGE_RUNS_XPATH)
+        with mock.patch.object(image_processor, "_IMAGE_RUNS_XPATH", xpath):
+            ImageProcessor.resize_image(self.document, 0, width="2in")
+            ImageProcessor.set_image_position(self.document, 1, horizontal_position="center")
+            ImageProcessor.resize_image(self.document, 1, height="1in")
+            self.assertEqual(xpath.call_count, 1)
+
+            ImageProcessor.add_image(self.document, PNG_PATH)
+            self.assertEqual(ImageProcessor.delete_image(self.document, 2), "图片 2 已删除")
+            self.assertIn("图片索引超出范围: 2", ImageProcessor.delete_image(self.document, 2))
+            self.assertEqual(xpath.call_count, 3)
+
+    def test_scan_refreshed_after_body_changes(self):
+        """测试其他途径修改正文后不使用过期的扫描结果"""
+        ImageProcessor.list_images(self.document)
+        body = self.document.element.body
+        body.remove(self.document.paragraphs[1]._p)
+        self.document.add_paragraph("结尾")
+
+        self.assertIn("共有 1 张图片", ImageProcessor.list_images(self.document))
+
+    def test_extract_all_writes_each_distinct_image_once(self):
+        """测试批量提取时每个不同的图片只写出一次"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = ImageProcessor.extract_all_images_to_local(self.document, output_dir)
+
+            self.assertEqual(result, f"成功提取 2 张图片到: {output_dir}")
+            self.assertEqual(
+                sorted(os.listdir(output_dir)), ["extracted_image_0.jpg", "extracted_image_1.png"]
+            )
+            with open(os.path.join(output_dir, "extracted_image_1.png"), "rb") as f, \
+                    open(PNG_PATH, "rb") as expected:
+                self.assertEqual(f.read(), expected.read())
+
+    def test_extract_all_skips_deleted_images(self):
+        """测试删除图片后批量提取不再写出已删除的图片，文件序号与图片索引一致"""
+        ImageProcessor.delete_image(self.document, 0)
+        ImageProcessor.add_image(self.document, PNG_PATH)
+        
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = ImageProcessor.extract_all_images_to_local(self.document, output_dir)
+            
+            self.assertEqual(result, f"成功提取 1 张图片到: {output_dir}")
+            self.assertEqual(os.listdir(output_dir), ["extracted_image_0.png"])
+
+
+class TestAddImages(unittest.TestCase):
+    """测试批量添加图片"""
+
+    def test_add_images_matches_single_adds(self):
+        """测试批量添加与逐张添加得到相同的图片，且每张图片的形状ID唯一"""
+        entries = [
+            {"image_path": PNG_PATH, "width": "2in"},
+            {"image_path": "不存在.png"},
+            {"image_path": JPG_PATH, "height": "3cm", "alignment": "center"},
+            {"image_path": PNG_PATH, "alignment": "right"},
+        ]
+        batch = Document()
+        batch.add_paragraph("开头")
+        results = ImageProcessor.add_images(batch, entries)
+
+        single = Document()
+        single.add_paragraph("开头")
+        for entry in entries:
+            ImageProcessor.add_image(single, **entry)
+
+        self.assertEqual(results[1], "图片文件不存在: 不存在.png")
+        self.assertEqual(results.count("图片已添加: test_image.png"), 2)
+        self.assertEqual(ImageProcessor.list_images(batch), ImageProcessor.list_images(single))
+        self.assertEqual(
+            [p.alignment for p in batch.paragraphs], [p.alignment for p in single.paragraphs]
+        )
+        shape_ids = [shape._inline.docPr.id for shape in batch.inline_shapes]
+        self.assertEqual(len(set(shape_ids)), 3)
+        self.assertIs(batch.element.body[-1], batch.element.body.sectPr)
+
+    def test_repeated_file_read_once(self):
+        """测试同一文件重复添加时只读取一次，且只保存一份图片数据"""
+        document = Document()
+        from_file = mock.MagicMock(side_effect=image_processor.Image.from_file)
+        with mock.patch.object(image_processor.Image, "from_file", from_file):
+            ImageProcessor.add_images(document, [{"image_path": PNG_PATH}] * 3)
+            ImageProcessor.add_image(document, PNG_PATH)
+
+        self.assertEqual(from_file.call_count, 1)
+        self.assertEqual(ImageProcessor.count_images(document), 4)
+        self.assertEqual(len(list(document.part.package.image_parts)), 1)
+
+
+class TestImageCopy(unittest.TestCase):
+    """测试图片跨文档复制"""
+
+    def test_repeated_copy_shares_image_part(self):
+        """测试同一图片多次复制到目标文档时只保存一份图片数据"""
+        source = Document()
+        ImageProcessor.add_image(source, PNG_PATH)
+        target = Document()
+        ImageProcessor.add_image(target, PNG_PATH)
+
+        for _ in range(3):
+            result = ImageProcessor.copy_image_to_another_document(source, target, 0)
+            self.assertTrue(result.startswith("图片复制成功"), result)
+
+        image_rels = [rel for rel in target.part.rels.values() if rel.reltype == RT.IMAGE]
+        self.assertIn("共有 4 张图片", ImageProcessor.list_images(target))
+        self.assertEqual(len(image_rels), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Intelligent Table Analyzer Tests
+智能表格分析器测试
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from docx import Document
+from docx.document import Document as DocumentObject
+from docx.table import Table
+
+from core import intelligent_table_analyzer
+from core.intelligent_table_analyzer import IntelligentTableAnalyzer
+from core.universal_table_filler import UniversalTableFiller
+
+
+def _build_document():
+    """构造测试文档：第一个表格含横向和纵向合并单元格"""
+    document = Document()
+    table = document.add_table(rows=4, cols=4)
+    data = [
+        ["姓名", "", "学号", ""],
+        ["学院", "计算机学院", "专业班别", ""],
+        ["实习单位", "", "", "指导老师"],
+        ["联系电话", "", "备注", ""],
+    ]
+    for row_idx, row in enumerate(data):
+        for col_idx, text in enumerate(row):
+            table.cell(row_idx, col_idx).text = text
+    table.cell(2, 1).merge(table.cell(2, 2))
+    table.cell(3, 2).merge(table.cell(3, 3))
+    return document
+
+
+class TestAnalyzeTable(unittest.TestCase):
+    """测试单个表格分析"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.analyzer = IntelligentTableAnalyzer()
+        self.document = _build_document()
+
+    def test_cells_follow_grid_with_merged_cells(self):
+        """测试合并单元格在其覆盖的每个网格位置上都给出相同文本，且不逐格调用table.cell"""
+        with mock.patch.object(Table, "cell", side_effect=AssertionError("table.cell")):
+            result = self.analyzer.analyze_table(self.document.tables[0], 0)
+
+        self.assertEqual((result.rows, result.columns), (4, 4))
+        texts = [[cell.text for cell in row] for row in result.cells]
+        self.assertEqual(texts[2], ["实习单位", "", "", "指导老师"])
+        self.assertEqual(texts[3], ["联系电话", "", "备注", "备注"])
+        position = result.cells[1][3].position
+        self.assertIs(position.to_tuple(), position)
+        self.assertEqual(position, (0, 1, 3))
+        self.assertEqual(str(position), "(表格0, 行1, 列3)")
+
+    def test_cell_texts_match_python_docx(self):
+        """测试直接从XML提取的单元格文本与python-docx的cell.text一致"""
+        table = self.document.tables[0]
+        cell = table.cell(1, 3)
+        cell.paragraphs[0].add_run("第一行\t制表")
+        cell.paragraphs[0].add_run().add_break()
+        cell.add_paragraph("第二段")
+        table.cell(0, 3).merge(cell)
+
+        expected = [cell.text.strip() for cell in table._cells]
+        self.assertEqual(intelligent_table_analyzer._table_cell_texts(table._tbl, 4), expected)
+
+    def test_fillable_checks_all_neighbors(self):
+        """测试空单元格右侧和下方的字段名也计入相邻字段，字段名右侧的空位优先填充"""
+        result = self.analyzer.analyze_table(self.document.tables[0], 0)
+
+        self.assertTrue(result.cells[0][1].is_fillable)
+        self.assertEqual(result.cells[0][1].adjacent_fields, ["姓名", "学号", "计算机学院"])
+        self.assertEqual(result.cells[1][3].adjacent_fields, ["专业班别", "指导老师"])
+        self.assertIn(result.cells[0][3].position, result.empty_positions)
+        rule = next(rule for rule in result.fill_rules if rule['field_name'] == "姓名")
+        self.assertEqual((rule['rule_type'], rule['fill_position']), ('field_right', (0, 0, 1)))
+
+
+class TestAnalyzeDocument(unittest.TestCase):
+    """测试整个文档的分析结果"""
+
+    def setUp(self):
+        """测试前准备：保存测试文档"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "form.docx")
+        _build_document().save(self.file_path)
+
+    def tearDown(self):
+        """测试后清理"""
+        self.temp_dir.cleanup()
+
+    def test_ai_friendly_format(self):
+        """测试AI友好格式的内容，修改返回的填写说明不影响之后的分析"""
+        analyzer = IntelligentTableAnalyzer()
+        result = analyzer.analyze_document(self.file_path)
+        result['ai_instructions']['usage_rules'].clear()
+        result['ai_instructions']['example_format']['李四'] = (0, 0, 0)
+
+        result = analyzer.analyze_document(self.file_path)
+        self.assertEqual(len(result['ai_instructions']['usage_rules']), 5)
+        self.assertEqual(result['ai_instructions']['example_format']['张三'], (1, 1, 3))
+        self.assertNotIn('李四', result['ai_instructions']['example_format'])
+        self.assertEqual(result['field_positions']["姓名"], (0, 0, 0))
+        self.assertIn((0, 0, 1), result['empty_positions'])
+        rule = next(rule for rule in result['fill_rules'] if rule['field'] == "姓名")
+        self.assertEqual((rule['rule_type'], rule['fill_position']), ('field_right', (0, 0, 1)))
+
+    def test_tables_scanned_once(self):
+        """测试整个文档分析只读取一次doc.tables，表格对象直接传给analyze_table"""
+        tables = mock.MagicMock(side_effect=DocumentObject.tables.fget)
+        analyzer = IntelligentTableAnalyzer()
+        with mock.patch.object(DocumentObject, "tables", property(tables)), \
+                mock.patch.object(analyzer, "analyze_table", wraps=analyzer.analyze_table) as analyze_table:
+            result = analyzer.analyze_document(self.file_path)
+
+        self.assertEqual(result['document_info']['total_tables'], 1)
+        self.assertEqual(tables.call_count, 1)
+        self.assertIsInstance(analyze_table.call_args.args[0], Table)
+
+    def test_coordinates_serialized_as_arrays(self):
+        """测试坐标信息序列化为JSON时位置输出为数组"""
+        data = json.loads(UniversalTableFiller().analyze_and_get_coordinates(self.file_path))
+
+        self.assertEqual(data['field_coordinates']["姓名"], [0, 0, 0])
+        self.assertIn([0, 0, 1], [entry['position'] for entry in data['empty_positions']])
+
+
+class TestFieldIdentification(unittest.TestCase):
+    """测试字段类型识别"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.analyzer = IntelligentTableAnalyzer()
+
+    def test_earlier_field_type_wins(self):
+        """测试多个字段类型同时匹配时取field_patterns中靠前的类型"""
+        # "班别"与班级完全匹配，但也是专业的模式"专业班别"的子串，专业排在前面
+        self.assertEqual(self.analyzer._identify_field_type("班别"), "专业")
+        # "时间"同时属于实习时间和日期
+        self.assertEqual(self.analyzer._identify_field_type("时间"), "实习时间")
+        self.assertEqual(self.analyzer._identify_field_type("学生姓名\n"), "姓名")
+        self.assertEqual(self.analyzer._identify_field_type("请填写联系电话"), "联系方式")
+
+    def test_classify_matches_separate_calls(self):
+        """测试一次匹配得到的字段类型和置信度与分别调用识别和置信度计算相同"""
+        self.assertEqual(self.analyzer._classify("姓名"), ("姓名", 1.0))
+        self.assertEqual(self.analyzer._classify("学生姓名"), ("姓名", 0.9))
+        self.assertEqual(self.analyzer._classify("  "), (None, 0.0))
+        for text in ("班别", "学号码", "superviser", "departmemt", "phome", "评价内容\n"):
+            field_type = self.analyzer._identify_field_type(text)
+            confidence = self.analyzer._calculate_field_confidence(text, field_type) if field_type else 0.0
+            self.assertEqual(self.analyzer._classify(text), (field_type, confidence), text)
+
+    def test_repeated_text_identified_once(self):
+        """测试相同文本只做一次模式匹配，清理前的空白不影响缓存"""
+        intelligent_table_analyzer._classify_clean_text.cache_clear()
+        for text in ("实习单位", " 实习单位\n", "实习单位"):
+            self.assertEqual(self.analyzer._identify_field_type(text), "实习单位")
+
+        info = intelligent_table_analyzer._classify_clean_text.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 2))
+
+    def test_fuzzy_match_skips_patterns_by_length(self):
+        """测试长度相差悬殊的模式不构造SequenceMatcher，相似度匹配结果不变"""
+        intelligent_table_analyzer._classify_clean_text.cache_clear()
+        matcher = mock.MagicMock(side_effect=intelligent_table_analyzer.difflib.SequenceMatcher)
+        with mock.patch.object(intelligent_table_analyzer, "RAPIDFUZZ_AVAILABLE", False), \
+                mock.patch.object(intelligent_table_analyzer.difflib, "SequenceMatcher", matcher):
+            self.assertEqual(self.analyzer._classify("本人承诺以上所填写的全部信息真实有效，如有虚假愿意承担相应责任"), (None, 0.0))
+            self.assertEqual(matcher.call_count, 0)
+            self.assertEqual(self.analyzer._identify_field_type("superviser"), "指导教师")
+
+        compared = {call.args[2] for call in matcher.call_args_list}
+        self.assertIn("supervisor", compared)
+        self.assertNotIn("姓名", compared)
+
+    def test_unmatched_text(self):
+        """测试空文本和无关文本"""
+        self.assertIsNone(self.analyzer._identify_field_type(""))
+        self.assertIsNone(self.analyzer._identify_field_type("备注"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,11 +7,12 @@ MCP增强功能测试
 """
 
 import unittest
+import unittest.mock
 import tempfile
 import os
 import json
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 
 # 添加项目根目录到路径
@@ -20,7 +21,7 @@ sys.path.insert(0, str(project_root))
 
 # 导入新增的模块
 from core.workflow_engine import WorkflowEngine, WorkflowStatus, StepStatus
-from core.enhanced_state_manager import EnhancedStateManager, OperationType, OperationStatus
+from core.enhanced_state_manager import EnhancedStateManager, OperationType, OperationStatus, DictPool
 from core.smart_suggestion_engine import SmartSuggestionEngine, SuggestionType, SuggestionPriority
 from core.ai_guidance_enhancer import AIGuidanceEnhancer
 from core.json_validation_engine import JSONValidationEngine, ValidationResult
@@ -160,6 +161,27 @@ class TestEnhancedStateManager(unittest.TestCase):
         create_ops = self.state_manager.get_operation_history(operation_type=OperationType.CREATE_DOCUMENT)
         self.assertGreaterEqual(len(create_ops), 1)
     
+    def test_operation_history_order_and_limit(self):
+        """测试操作历史按时间倒序返回并限制数量"""
+        self.state_manager.set_current_document("test.docx", "doc_123")
+        op_ids = []
+        for i in range(4):
+            op_id = self.state_manager.record_operation(OperationType.ADD_PARAGRAPH, {"index": i})
+            self.state_manager.add_operation_to_document("doc_123", op_id)
+            op_ids.append(op_id)
+        
+        history = self.state_manager.get_operation_history(limit=3)
+        self.assertEqual([op.operation_id for op in history], op_ids[:0:-1])
+        
+        history = self.state_manager.get_operation_history(document_id="doc_123", limit=2)
+        self.assertEqual([op.operation_id for op in history], op_ids[:1:-1])
+        
+        table_op = self.state_manager.record_operation(OperationType.ADD_TABLE, {"rows": 2})
+        history = self.state_manager.get_operation_history(operation_type=OperationType.ADD_PARAGRAPH, limit=2)
+        self.assertEqual([op.operation_id for op in history], op_ids[:1:-1])
+        history = self.state_manager.get_operation_history(operation_type=OperationType.ADD_TABLE)
+        self.assertEqual([op.operation_id for op in history], [table_op])
+    
     def test_state_snapshots(self):
         """测试状态快照"""
         # 记录一些操作
@@ -174,6 +196,156 @@ class TestEnhancedStateManager(unittest.TestCase):
         snapshots = self.state_manager.get_available_snapshots()
         self.assertGreater(len(snapshots), 0)
     
+    def test_persisted_state_round_trip(self):
+        """测试状态持久化后重新加载与快照恢复"""
+        op_id = self.state_manager.record_operation(OperationType.ADD_PARAGRAPH, {"text": "段落内容"})
+        self.state_manager.update_operation_status(op_id, OperationStatus.COMPLETED, {"count": 1})
+        snapshot_id = self.state_manager.create_state_snapshot()
+        self.state_manager._persist_state()
+        
+        reloaded = EnhancedStateManager(self.temp_dir)
+        self.assertEqual(reloaded.operation_records[op_id], self.state_manager.operation_records[op_id])
+        self.assertEqual(reloaded.current_session.start_time, self.state_manager.current_session.start_time)
+        self.assertTrue(reloaded.restore_from_snapshot(snapshot_id))
+    
+    def test_snapshot_checksum_independent_of_json_backend(self):
+        """测试快照校验和不依赖orjson是否可用，旧版本的md5校验和仍可验证"""
+        from core import json_utils
+        op_id = self.state_manager.record_operation(OperationType.ADD_PARAGRAPH, {"text": "段落内容"})
+        self.state_manager.update_operation_status(op_id, OperationStatus.COMPLETED, {"count": 1})
+        snapshot_id = self.state_manager.create_state_snapshot()
+        snapshot = self.state_manager.state_snapshots[snapshot_id]
+        
+        backends = (False, True) if json_utils.ORJSON_AVAILABLE else (False,)
+        for orjson_available in backends:
+            with unittest.mock.patch.object(json_utils, "ORJSON_AVAILABLE", orjson_available), \
+                    unittest.mock.patch.object(json_utils, "dumps", side_effect=AssertionError("json_utils.dumps")):
+                self.assertEqual(self.state_manager._calculate_snapshot_checksum(snapshot), snapshot.checksum)
+                self.assertTrue(self.state_manager._verify_snapshot_checksum(snapshot))
+        
+        snapshot.checksum = self.state_manager._calculate_legacy_snapshot_checksum(snapshot)
+        self.assertTrue(self.state_manager._verify_snapshot_checksum(snapshot))
+    
+    def test_operation_log_append_and_compact(self):
+        """测试操作记录追加写入日志并在压缩后保留最新状态"""
+        op_id = self.state_manager.record_operation(OperationType.ADD_TABLE, {"rows": 2})
+        self.state_manager.update_operation_status(op_id, OperationStatus.FAILED, error_message="失败")
+        self.state_manager._persist_state()
+        
+        log_file = Path(self.temp_dir) / "operations.ndjson"
+        self.assertEqual(len(log_file.read_bytes().splitlines()), 2)
+        self.assertFalse((Path(self.temp_dir) / "operation_records.json").exists())
+        
+        self.state_manager.compact_log()
+        self.assertEqual(len(log_file.read_bytes().splitlines()), 1)
+        
+        reloaded = EnhancedStateManager(self.temp_dir)
+        self.assertEqual(reloaded.operation_records[op_id].status, OperationStatus.FAILED)
+        self.assertEqual(reloaded.operation_records[op_id].error_message, "失败")
+    
+    def test_history_size_limit(self):
+        """测试操作记录和文档历史超出上限时丢弃最旧的记录"""
+        self.state_manager.max_history_size = 3
+        self.state_manager.set_current_document("test.docx", "doc_123")
+        op_ids = [
+            self.state_manager.record_operation(OperationType.ADD_PARAGRAPH, {"index": i})
+            for i in range(5)
+        ]
+        for op_id in op_ids:
+            self.state_manager.add_operation_to_document("doc_123", op_id)
+        
+        self.assertEqual(list(self.state_manager.operation_records), op_ids[2:])
+        self.assertEqual(list(self.state_manager.get_document_state("doc_123").operation_history), op_ids[2:])
+    
+    def test_file_analysis_cached_until_file_changes(self):
+        """测试文件未变化时复用哈希与结构信息"""
+        from docx import Document
+        file_path = os.path.join(self.temp_dir, "cached.docx")
+        Document().save(file_path)
+        
+        self.state_manager.set_current_document(file_path, "doc_cached")
+        with unittest.mock.patch("docx.Document") as document_cls:
+            self.state_manager.set_current_document(file_path, "doc_cached")
+            document_cls.assert_not_called()
+        
+        doc = Document(file_path)
+        doc.add_paragraph("新段落")
+        doc.save(file_path)
+        os.utime(file_path, ns=(0, 0))
+        
+        self.state_manager.set_current_document(file_path, "doc_cached")
+        self.assertEqual(self.state_manager.get_document_state("doc_cached").structure_info["paragraphs_count"], 1)
+    
+    def test_delta_snapshots_round_trip(self):
+        """测试增量快照重新加载后按需还原出各自的操作记录"""
+        class SteppingDatetime(datetime):
+            current = datetime(2026, 1, 1)
+            
+            @classmethod
+            def now(cls):
+                cls.current += timedelta(seconds=1)
+                return cls.current
+        
+        with unittest.mock.patch("core.enhanced_state_manager.datetime", SteppingDatetime):
+            first_op = self.state_manager.record_operation(OperationType.ADD_TABLE, {"rows": 2})
+            first_snapshot = self.state_manager.create_state_snapshot()
+            self.state_manager.update_operation_status(first_op, OperationStatus.COMPLETED)
+            self.state_manager.record_operation(OperationType.ADD_PARAGRAPH, {"text": "段落"})
+            second_snapshot = self.state_manager.create_state_snapshot()
+        self.state_manager._persist_state()
+        
+        self.assertEqual(self.state_manager._snapshot_bases[second_snapshot], first_snapshot)
+        
+        reloaded = EnhancedStateManager(self.temp_dir)
+        self.assertEqual(reloaded.state_snapshots, {})
+        self.assertEqual(len(reloaded.get_available_snapshots()), 2)
+        first = reloaded.get_snapshot(first_snapshot)
+        second = reloaded.get_snapshot(second_snapshot)
+        self.assertEqual(first.operation_records[first_op].status, OperationStatus.PENDING)
+        self.assertEqual(second.operation_records[first_op].status, OperationStatus.COMPLETED)
+        self.assertEqual(len(second.operation_records), 2)
+        self.assertTrue(reloaded.restore_from_snapshot(second_snapshot))
+    
+    def test_changes_flushed_in_batches(self):
+        """测试状态变更只做标记，flush时统一写入"""
+        session_file = Path(self.temp_dir) / "current_session.json"
+        self.state_manager.record_operation(OperationType.ADD_PARAGRAPH, {"text": "段落"})
+        self.assertTrue(self.state_manager._dirty.is_set())
+        self.assertFalse(session_file.exists())
+        
+        self.state_manager.flush()
+        self.assertFalse(self.state_manager._dirty.is_set())
+        self.assertEqual(len(json.loads(session_file.read_text(encoding="utf-8"))["active_operations"]), 1)
+        
+        self.state_manager.close()
+        self.state_manager._flusher.join(timeout=1)
+        self.assertFalse(self.state_manager._flusher.is_alive())
+    
+    def test_dict_pool_reuse(self):
+        """测试字典对象池归还后清空并复用"""
+        pool = DictPool(max_size=1)
+        with pool.borrowing() as borrow:
+            first = borrow()
+            first["key"] = "value"
+            borrow()
+        
+        reused = pool.get()
+        self.assertIs(reused, first)
+        self.assertEqual(reused, {})
+        self.assertIsNot(pool.get(), first)
+    
+    def test_snapshot_copy_on_write(self):
+        """测试快照共用当前字典，之后的修改不影响快照"""
+        first_op = self.state_manager.record_operation(OperationType.CREATE_DOCUMENT, {"filename": "test.docx"})
+        snapshot_id = self.state_manager.create_state_snapshot()
+        snapshot = self.state_manager.state_snapshots[snapshot_id]
+        self.assertIs(snapshot.operation_records, self.state_manager.operation_records)
+        
+        self.state_manager.record_operation(OperationType.ADD_PARAGRAPH, {"text": "段落"})
+        self.state_manager.set_current_document("test.docx", "doc_123")
+        self.assertEqual(list(snapshot.operation_records), [first_op])
+        self.assertEqual(snapshot.document_states, {})
+    
     def test_session_info(self):
         """测试会话信息"""
         session_info = self.state_manager.get_current_session_info()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+OSS Processor Tests
+OSS处理器测试（使用模拟bucket，不访问真实OSS）
+"""
+
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from core import oss_processor
+from core.oss_processor import OSSProcessor
+
+
+def _make_object(key, size=1024):
+    """构造模拟的OSS对象信息"""
+    return SimpleNamespace(
+        key=key, size=size, last_modified=1700000000, etag=f"etag-{key}", storage_class="Standard"
+    )
+
+
+def _make_lister(objects):
+    """构造按continuation_token分页的模拟list_objects_v2"""
+    def list_objects_v2(prefix="", continuation_token="", max_keys=100, **kwargs):
+        start = int(continuation_token or 0)
+        end = start + max_keys
+        is_truncated = end < len(objects)
+        return SimpleNamespace(
+            object_list=objects[start:end],
+            is_truncated=is_truncated,
+            next_continuation_token=str(end) if is_truncated else ""
+        )
+    return mock.MagicMock(side_effect=list_objects_v2)
+
+
+@unittest.skipUnless(oss_processor.OSS_AVAILABLE, "oss2 未安装")
+class TestOSSListCache(unittest.TestCase):
+    """测试list_oss_files结果缓存"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.processor = OSSProcessor()
+        self.bucket = mock.MagicMock()
+        self.bucket.put_object.return_value = SimpleNamespace(etag="etag", request_id="req")
+        self.bucket.list_objects_v2 = _make_lister(
+            [_make_object("docs/a.docx"), _make_object("docs/b.docx")]
+        )
+        self.lister = self.bucket.list_objects_v2
+
+        patcher = mock.patch.object(self.processor, "get_oss_bucket", return_value=self.bucket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_list_uses_cache(self):
+        """测试相同参数的重复列举只访问一次OSS"""
+        first = self.processor.list_oss_files("docs/", 10)
+        second = self.processor.list_oss_files("docs/", 10)
+
+        self.assertEqual(first["count"], 2)
+        self.assertEqual(first, second)
+        self.assertEqual(self.lister.call_count, 1)
+
+    def test_modifying_result_does_not_change_cache(self):
+        """测试调用方原地修改返回的文件列表不影响之后命中缓存的结果"""
+        self.bucket.head_object.return_value = SimpleNamespace(
+            content_type="application/octet-stream", headers={"x-oss-meta-author": "cj"}
+        )
+        first = self.processor.list_oss_files("docs/", 10, fetch_metadata=True)
+        first["files"].reverse()
+        first["files"][0]["note"] = "已处理"
+        first["files"][0]["user_meta"]["author"] = "other"
+        second = self.processor.list_oss_files("docs/", 10, fetch_metadata=True)
+        second["files"].clear()
+
+        third = self.processor.list_oss_files("docs/", 10, fetch_metadata=True)
+        self.assertEqual([f["filename"] for f in third["files"]], ["docs/a.docx", "docs/b.docx"])
+        self.assertNotIn("note", third["files"][1])
+        self.assertEqual(third["files"][1]["user_meta"], {"author": "cj"})
+        self.assertEqual(self.lister.call_count, 1)
+
+    def test_bypass_cache(self):
+        """测试use_cache=False时总是访问OSS"""
+        self.processor.list_oss_files("docs/", 10)
+        self.processor.list_oss_files("docs/", 10, use_cache=False)
+        self.assertEqual(self.lister.call_count, 2)
+
+    def test_delete_invalidates_matching_prefix(self):
+        """测试删除文件后使匹配前缀的缓存失效"""
+        self.processor.list_oss_files("docs/", 10)
+        self.processor.list_oss_files("other/", 10)
+
+        self.processor.delete_oss_file("docs/a.docx")
+        self.processor.list_oss_files("docs/", 10)
+        self.processor.list_oss_files("other/", 10)
+
+        self.assertEqual(self.lister.call_count, 3)
+
+    def test_upload_invalidates_matching_prefix(self):
+        """测试上传文件后使匹配前缀的缓存失效"""
+        self.processor.list_oss_files("docs/", 10)
+        self.processor.upload_bytes_to_oss(b"data", "docs/c.docx")
+        self.processor.list_oss_files("docs/", 10)
+        self.assertEqual(self.lister.call_count, 2)
+
+    def test_failure_returns_error_dict(self):
+        """测试OSS异常被转换为错误字典"""
+        self.bucket.delete_object.side_effect = RuntimeError("boom")
+        result = self.processor.delete_oss_file("docs/a.docx")
+        self.assertEqual(result, {"error": "删除文件失败: boom"})
+
+
+@unittest.skipUnless(oss_processor.OSS_AVAILABLE, "oss2 未安装")
+class TestOSSBatchDelete(unittest.TestCase):
+    """测试批量删除OSS文件"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.processor = OSSProcessor()
+        self.bucket = mock.MagicMock()
+        self.bucket.batch_delete_objects.side_effect = (
+            lambda keys: SimpleNamespace(deleted_keys=list(keys))
+        )
+
+        patcher = mock.patch.object(self.processor, "get_oss_bucket", return_value=self.bucket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_chunks_requests(self):
+        """测试按每1000个文件分批删除"""
+        filenames = [f"docs/{i}.docx" for i in range(2500)]
+        result = self.processor.delete_oss_files(filenames)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["deleted"], filenames)
+        self.assertEqual(self.bucket.batch_delete_objects.call_count, 3)
+
+    def test_failed_chunk_reported(self):
+        """测试单批失败时记录错误并继续删除其余批次"""
+        self.bucket.batch_delete_objects.side_effect = [
+            RuntimeError("denied"), SimpleNamespace(deleted_keys=["docs/1000.docx"])
+        ]
+        filenames = [f"docs/{i}.docx" for i in range(1001)]
+        result = self.processor.delete_oss_files(filenames)
+
+        self.assertFalse(result["success"])
+        self.assertEqual(result["deleted"], ["docs/1000.docx"])
+        self.assertEqual(len(result["errors"]), 1000)
+
+
+@unittest.skipUnless(oss_processor.OSS_AVAILABLE, "oss2 未安装")
+class TestOSSListMetadata(unittest.TestCase):
+    """测试list_oss_files返回的对象元数据"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.processor = OSSProcessor()
+        self.bucket = mock.MagicMock()
+        self.bucket.head_object.return_value = SimpleNamespace(
+            content_type="application/octet-stream",
+            headers={"Content-Type": "application/octet-stream", "x-oss-meta-author": "cj"}
+        )
+
+        self.bucket.list_objects_v2 = _make_lister([_make_object("docs/a.docx", 10)])
+
+        patcher = mock.patch.object(self.processor, "get_oss_bucket", return_value=self.bucket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_inline_metadata_without_head(self):
+        """测试默认情况下直接从列举结果返回元数据，不发起HEAD请求"""
+        result = self.processor.list_oss_files("docs/")
+        file_info = result["files"][0]
+
+        self.assertEqual(file_info["size"], 10)
+        self.assertEqual(file_info["etag"], "etag-docs/a.docx")
+        self.assertEqual(file_info["storage_class"], "Standard")
+        self.bucket.head_object.assert_not_called()
+
+    def test_fetch_metadata(self):
+        """测试fetch_metadata=True时获取自定义元数据"""
+        result = self.processor.list_oss_files("docs/", fetch_metadata=True)
+        file_info = result["files"][0]
+
+        self.assertEqual(file_info["user_meta"], {"author": "cj"})
+        self.assertEqual(file_info["content_type"], "application/octet-stream")
+        self.bucket.head_object.assert_called_once_with("docs/a.docx")
+
+
+@unittest.skipUnless(oss_processor.OSS_AVAILABLE, "oss2 未安装")
+class TestOSSListPagination(unittest.TestCase):
+    """测试list_oss_files分页与提前终止"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.processor = OSSProcessor()
+        self.bucket = mock.MagicMock()
+        self.bucket.list_objects_v2 = _make_lister(
+            [_make_object(f"docs/{i:04d}.docx") for i in range(2500)]
+        )
+
+        patcher = mock.patch.object(self.processor, "get_oss_bucket", return_value=self.bucket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stops_after_max_keys(self):
+        """测试取满max_keys后不再继续翻页"""
+        result = self.processor.list_oss_files("docs/", 10)
+
+        self.assertEqual(result["count"], 10)
+        self.assertTrue(result["is_truncated"])
+        self.assertEqual(self.bucket.list_objects_v2.call_count, 1)
+
+    def test_large_max_keys_spans_pages(self):
+        """测试超过单页上限时跨页列举"""
+        result = self.processor.list_oss_files("docs/", 1500)
+
+        self.assertEqual(result["count"], 1500)
+        self.assertEqual(self.bucket.list_objects_v2.call_count, 2)
+
+    def test_resume_with_continuation_token(self):
+        """测试使用continuation_token继续列举"""
+        first = self.processor.list_oss_files("docs/", 2000)
+        second = self.processor.list_oss_files(
+            "docs/", 2000, continuation_token=first["next_continuation_token"]
+        )
+
+        self.assertEqual(second["count"], 500)
+        self.assertEqual(second["files"][0]["filename"], "docs/2000.docx")
+        self.assertFalse(second["is_truncated"])
+        self.assertIsNone(second["next_continuation_token"])
+
+
+@unittest.skipUnless(oss_processor.OSS_AVAILABLE, "oss2 未安装")
+class TestOSSUploadChecksum(unittest.TestCase):
+    """测试上传时的完整性校验方式"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.processor = OSSProcessor()
+        self.bucket = mock.MagicMock()
+        self.bucket.put_object.return_value = SimpleNamespace(etag="etag", request_id="req")
+
+        patcher = mock.patch.object(self.processor, "get_oss_bucket", return_value=self.bucket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_crc64_used_when_accelerated(self):
+        """测试CRC64可加速时不额外计算Content-MD5"""
+        with mock.patch.object(oss_processor, "CRC_ACCELERATED", True):
+            self.processor.upload_bytes_to_oss(b"data", "a.docx")
+        self.assertIsNone(self.bucket.put_object.call_args.kwargs["headers"])
+
+    def test_content_md5_fallback(self):
+        """测试CRC64无法加速时使用Content-MD5"""
+        with mock.patch.object(oss_processor, "CRC_ACCELERATED", False):
+            self.processor.upload_bytes_to_oss(b"data", "a.docx")
+        headers = self.bucket.put_object.call_args.kwargs["headers"]
+        self.assertEqual(headers["Content-MD5"], "jXd/OF09/siBXSD3SWAm3A==")
+
+
+@unittest.skipUnless(oss_processor.OSS_AVAILABLE, "oss2 未安装")
+class TestOSSContentAddressedUpload(unittest.TestCase):
+    """测试按内容寻址的去重上传"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.processor = OSSProcessor()
+        self.bucket = mock.MagicMock()
+        self.bucket.put_object.return_value = SimpleNamespace(etag="etag", request_id="req")
+
+        patcher = mock.patch.object(self.processor, "get_oss_bucket", return_value=self.bucket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        fd, self.file_path = tempfile.mkstemp(suffix=".docx")
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"data")
+        self.addCleanup(os.remove, self.file_path)
+
+    def test_skip_existing_object(self):
+        """测试相同内容已存在时跳过上传"""
+        self.bucket.object_exists.return_value = True
+        result = self.processor.upload_file_to_oss(self.file_path, content_addressed=True)
+
+        self.assertTrue(result["deduplicated"])
+        self.assertEqual(
+            result["filename"],
+            "sha256/3a6eb0790f39ac87c94f3856b2dd2c5d110e6811602261a9a923d3bb23adc8b7.docx"
+        )
+        self.bucket.put_object.assert_not_called()
+
+    def test_upload_new_object(self):
+        """测试内容不存在时按哈希命名上传"""
+        self.bucket.object_exists.return_value = False
+        result = self.processor.upload_file_to_oss(self.file_path, content_addressed=True)
+
+        self.assertTrue(result["success"])
+        self.assertTrue(result["filename"].startswith("sha256/"))
+        self.bucket.put_object.assert_called_once()
+
+
+class TestDownloadFromURL(unittest.TestCase):
+    """测试从URL下载文件"""
+
+    def test_download_reuses_session(self):
+        """测试下载通过共享会话分块写入文件"""
+        processor = OSSProcessor()
+        response = mock.MagicMock()
+        response.__enter__.return_value = response
+        response.iter_content.return_value = [b"ab", b"cd"]
+
+        fd, local_path = tempfile.mkstemp(suffix=".docx")
+        os.close(fd)
+        self.addCleanup(os.remove, local_path)
+
+        with mock.patch.object(processor._http, "get", return_value=response) as get:
+            first = processor.download_file_from_url("https://example.com/a.docx", local_path)
+            processor.download_file_from_url("https://example.com/a.docx", local_path)
+
+        self.assertEqual(first["file_size"], 4)
+        self.assertEqual(get.call_count, 2)
+        self.assertTrue(get.call_args.kwargs["stream"])
+        with open(local_path, "rb") as f:
+            self.assertEqual(f.read(), b"abcd")
+
+
+if __name__ == "__main__":
+    unittest.main()